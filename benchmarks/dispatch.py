@@ -0,0 +1,109 @@
+"""
+Microbenchmark for intent dispatch in on_message.
+
+Compares the original chain of topic comparisons against the dispatch
+table built by ollie.dispatch.makeIntentTable. Only the topic -> handler
+selection is timed; handlers are no-ops.
+
+Run from the repository root:
+    python -m benchmarks.dispatch
+"""
+
+import timeit
+
+from ollie import dispatch
+from ollie import keysight
+
+
+class NullScope:
+    """Vendor module stand-in whose handlers do nothing."""
+    def __getattr__(self, name):
+        return lambda client, device, payload: None
+
+
+def chain(scope, topic):
+    # Shape of on_message before the dispatch table: every comparison is
+    # evaluated for every message, even after a match.
+    if topic == "hermes/intent/jmwilson:runCapture":
+        scope.onRunCapture(None, None, None)
+    if topic == "hermes/intent/jmwilson:stopCapture":
+        scope.onStopCapture(None, None, None)
+    if topic == "hermes/intent/jmwilson:singleCapture":
+        scope.onSingleCapture(None, None, None)
+    if topic == "hermes/intent/jmwilson:showChannel":
+        scope.onShowChannel(None, None, None)
+    if topic == "hermes/intent/jmwilson:hideChannel":
+        scope.onHideChannel(None, None, None)
+    if topic == "hermes/intent/jmwilson:setTimeBaseScale":
+        scope.onSetTimebaseScale(None, None, None)
+    if topic == "hermes/intent/jmwilson:setTimebaseReference":
+        scope.onSetTimebaseReference(None, None, None)
+    if topic == "hermes/intent/jmwilson:setChannelVerticalScale":
+        scope.onSetChannelVerticalScale(None, None, None)
+    if topic == "hermes/intent/jmwilson:measure":
+        scope.onMeasure(None, None, None)
+    if topic == "hermes/intent/jmwilson:clearAllMeasurements":
+        scope.onClearAllMeasurements(None, None, None)
+    if topic == "hermes/intent/jmwilson:setTriggerSource":
+        scope.onSetTriggerSource(None, None, None)
+    if topic == "hermes/intent/jmwilson:setTriggerSlope":
+        scope.onSetTriggerSlope(None, None, None)
+    if topic == "hermes/intent/jmwilson:saveImage":
+        scope.onSaveImage(None, None, None)
+    if topic == "hermes/intent/jmwilson:setProbeCoupling":
+        scope.onSetProbeCoupling(None, None, None)
+    if topic == "hermes/intent/jmwilson:setProbeAttenuation":
+        scope.onSetProbeAttenuation(None, None, None)
+    if topic == "hermes/intent/jmwilson:autoScale":
+        scope.onAutoScale(None, None, None)
+    if topic == "hermes/intent/jmwilson:defaultSetup":
+        scope.onDefaultSetup(None, None, None)
+    if topic == "hermes/intent/jmwilson:increaseTimebase":
+        scope.onIncreaseTimebase(None, None, None)
+    if topic == "hermes/intent/jmwilson:decreaseTimebase":
+        scope.onDecreaseTimebase(None, None, None)
+    if topic == "hermes/intent/jmwilson:increaseVerticalScale":
+        scope.onIncreaseVerticalScale(None, None, None)
+    if topic == "hermes/intent/jmwilson:decreaseVerticalScale":
+        scope.onDecreaseVerticalScale(None, None, None)
+    if topic == "hermes/intent/jmwilson:forceTrigger":
+        scope.onForceTrigger(None, None, None)
+    if topic == "hermes/intent/jmwilson:setTriggerLevel":
+        scope.onSetTriggerLevel(None, None, None)
+    if topic == "hermes/intent/jmwilson:autoTriggerLevels":
+        scope.onAutoTriggerLevels(None, None, None)
+    if topic == "hermes/intent/jmwilson:setTriggerCoupling":
+        scope.onSetTriggerCoupling(None, None, None)
+    if topic == "hermes/intent/jmwilson:setTriggerHoldoff":
+        scope.onSetTriggerHoldoff(None, None, None)
+    if topic == "hermes/intent/jmwilson:setTriggerSweepMode":
+        scope.onSetTriggerSweepMode(None, None, None)
+
+
+def table(intents, topic):
+    handler = intents.get(topic)
+    if handler is not None:
+        handler(None, None, None)
+
+
+def main(number=200000):
+    scope = NullScope()
+    intents = {
+        topic: getattr(scope, handler.__name__)
+        for topic, handler in dispatch.makeIntentTable(keysight).items()
+    }
+    topics = [
+        ("first intent", "hermes/intent/jmwilson:runCapture"),
+        ("last intent", "hermes/intent/jmwilson:setTriggerSweepMode"),
+        ("dialogue event", "hermes/dialogueManager/sessionEnded"),
+    ]
+    print("{:<16} {:>12} {:>12}".format("topic", "chain (ns)", "table (ns)"))
+    for label, topic in topics:
+        before = timeit.timeit(lambda: chain(scope, topic), number=number)
+        after = timeit.timeit(lambda: table(intents, topic), number=number)
+        print("{:<16} {:>12.0f} {:>12.0f}".format(
+            label, 1e9 * before / number, 1e9 * after / number))
+
+
+if __name__ == "__main__":
+    main()
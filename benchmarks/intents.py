@@ -0,0 +1,218 @@
+"""
+End-to-end intent latency and throughput.
+
+Delivers synthetic Snips intents through ollie's real MQTT callbacks
+(on_intent, the router, the device worker, the vendor handler and the
+link) to a simulated scope, one at a time, and reports the p50 and p99
+latency from delivery until the handler has finished and the scope has
+caught up with its commands (an *OPC? round trip), and the intents per
+second, for every handler of each vendor module:
+
+    python -m benchmarks.intents [--vendor keysight] [--latency 0.002]
+    python -m benchmarks.intents --json > after.json
+    python -m benchmarks.intents --compare before.json
+
+The broker is an in-process fake, so the numbers are ollie's own time
+plus the simulator's latency model, without network noise.
+"""
+
+import argparse
+import collections
+import json
+import logging
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from ollie import __main__ as ollie_main
+from ollie import dispatch
+from ollie import screenshot
+from ollie import simulator
+from ollie.instruments import Instrument, Router
+from ollie.metrics import metrics
+from ollie.transport import Transport
+
+from .transfers import samples
+
+# Intents without a sample utterance
+samples = dict(samples, saveImage={})
+
+
+class Message:
+    """What paho passes to the callbacks."""
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+        self.timestamp = time.monotonic()
+
+
+class FakeBroker:
+    """
+    Stands in for the paho client and the broker behind it. deliver()
+    hands a message to the callbacks ollie registered, on the calling
+    thread as paho's network thread would; what ollie publishes is only
+    counted.
+    """
+    def __init__(self):
+        self.on_message = None
+        self.callbacks = {}
+        self.published = collections.Counter()
+
+    def message_callback_add(self, topic, callback):
+        self.callbacks[topic] = callback
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        self.published[topic] += 1
+
+    def deliver(self, topic, payload):
+        callback = self.callbacks.get(topic, self.on_message)
+        callback(self, self.userdata, Message(topic, payload))
+
+
+class Finished:
+    """
+    Notes when the device worker is done with each intent: it commits
+    the link after every job, however the job was run or merged.
+    """
+    def __init__(self, link):
+        self.commit = link.commit
+        self.done = threading.Event()
+        link.commit = self
+
+    def __call__(self):
+        try:
+            self.commit()
+        finally:
+            self.done.set()
+
+
+def failures(intent, vendor):
+    _, _, series = metrics.families["ollie_intents_total"]
+    return sum(
+        series[labels].count
+        for labels in ((("intent", intent), ("outcome", outcome), ("vendor", vendor))
+                       for outcome in ("error", "timeout"))
+        if labels in series)
+
+
+def makePayload(intent, slots, session):
+    return json.dumps({
+        "intent": {"intentName": dispatch.intent_prefix + intent},
+        "slots": [
+            {"slotName": name, "value": {"value": value}}
+            for name, value in slots.items()
+        ],
+        "sessionId": "session-{n}".format(n=session),
+        "siteId": "default",
+    }).encode()
+
+
+def percentile(times, p):
+    times = sorted(times)
+    return times[min(len(times) - 1, int(p / 100. * len(times)))]
+
+
+def run(vendor, repeat, latency):
+    broker = FakeBroker()
+    router = Router()
+    broker.userdata = router
+    broker.on_message = ollie_main.on_message
+    for topic in dispatch.intent_topics:
+        broker.message_callback_add(topic, ollie_main.on_intent)
+
+    sim = simulator.Simulator(simulator.SimulatedScope(
+        vendor, simulator.Latency(command=latency, rate=1e6)))
+    dev = Transport(sim.socketpair())
+    instrument = Instrument(broker, "sim:" + vendor, dev, simulator.idents[vendor])
+    router.add(instrument)
+
+    finished = Finished(instrument.link)
+    results = collections.OrderedDict()
+    session = 0
+    try:
+        for intent in dispatch.intent_handlers:
+            topic = dispatch.intent_prefix + intent
+            failed = failures(intent, vendor)
+            times = []
+            start = time.monotonic()
+            for _ in range(repeat):
+                session += 1
+                finished.done.clear()
+                sent = time.monotonic()
+                broker.deliver(topic, makePayload(intent, samples[intent], session))
+                if not finished.done.wait(10):
+                    raise RuntimeError("{intent} did not finish".format(intent=intent))
+                # Commands are queued in the scope; wait for it to run them
+                print("*OPC?", file=instrument.link)
+                instrument.link.readline()
+                times.append(time.monotonic() - sent)
+            elapsed = time.monotonic() - start
+            results[intent] = {
+                "p50": percentile(times, 50),
+                "p99": percentile(times, 99),
+                "intents_per_second": repeat / elapsed,
+                "failed": failures(intent, vendor) - failed,
+            }
+    finally:
+        router.close()
+        sim.close()
+    return results
+
+
+def commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.intents")
+    parser.add_argument("--vendor", action="append", choices=sorted(simulator.idents),
+                        help="vendor module to run; default all")
+    parser.add_argument("--repeat", type=int, default=50, help="intents of each kind")
+    parser.add_argument("--latency", type=float, default=0.002, metavar="SECONDS",
+                        help="simulated time per SCPI command")
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    parser.add_argument("--compare", metavar="PATH",
+                        help="show the change in p50 from an earlier --json run")
+    args = parser.parse_args(argv)
+    # Unsupported intents are counted as failures instead
+    logging.getLogger("ollie").setLevel(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as directory:
+        screenshot.directory = directory
+        results = {
+            "commit": commit(),
+            "repeat": args.repeat,
+            "latency": args.latency,
+            "vendors": collections.OrderedDict(
+                (vendor, run(vendor, args.repeat, args.latency))
+                for vendor in args.vendor or sorted(simulator.idents)),
+        }
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+        return
+    before = {}
+    if args.compare:
+        with open(args.compare) as fd:
+            before = json.load(fd)["vendors"]
+    for vendor, intents in results["vendors"].items():
+        print("{:<26} {:>9} {:>9} {:>9} {:>8}".format(
+            vendor, "p50 (ms)", "p99 (ms)", "intent/s", "vs p50"))
+        for intent, result in intents.items():
+            old = before.get(vendor, {}).get(intent)
+            change = "{:+.0%}".format(result["p50"] / old["p50"] - 1) if old else ""
+            print("{:<26} {:>9.2f} {:>9.2f} {:>9.0f} {:>8}{}".format(
+                intent, 1e3 * result["p50"], 1e3 * result["p99"],
+                result["intents_per_second"], change,
+                "  ({n} failed)".format(n=result["failed"]) if result["failed"] else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Cold start benchmark.
+
+Measures how long it takes to import ollie, and with --broker, how long
+`python -m ollie` takes from exec to logging "ready in", i.e. subscribed
+to MQTT and done with the first device scan:
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --broker --devices '/dev/usbtmc*'
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+
+def timeImport(module, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.monotonic()
+        subprocess.check_call([sys.executable, "-c", "import " + module])
+        times.append(time.monotonic() - start)
+    return times
+
+
+def timeReady(extra, repeat, timeout=30.):
+    times = []
+    for _ in range(repeat):
+        start = time.monotonic()
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "ollie", "--log-level", "INFO"] + extra,
+            stderr=subprocess.PIPE, universal_newlines=True)
+        try:
+            for line in proc.stderr:
+                if "ready in" in line:
+                    times.append(time.monotonic() - start)
+                    break
+                if time.monotonic() - start > timeout:
+                    raise RuntimeError("ollie did not become ready")
+            else:
+                raise RuntimeError("ollie exited with {}".format(proc.wait()))
+        finally:
+            proc.terminate()
+            proc.wait()
+    return times
+
+
+def summarize(times):
+    times = sorted(times)
+    return {
+        "min": times[0],
+        "median": times[len(times) // 2],
+        "max": times[-1],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument(
+        "--broker", action="store_true",
+        help="also time exec to ready; needs an MQTT broker on localhost")
+    parser.add_argument("--devices", help="passed through to ollie")
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    args = parser.parse_args(argv)
+
+    results = {"import ollie.__main__": summarize(timeImport("ollie.__main__", args.repeat))}
+    if args.broker:
+        extra = ["--devices", args.devices] if args.devices else []
+        results["exec to ready"] = summarize(timeReady(extra, args.repeat))
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+        return
+    print("{:<24} {:>10} {:>10} {:>10}".format("", "min (ms)", "median", "max"))
+    for label, result in results.items():
+        print("{:<24} {:>10.1f} {:>10.1f} {:>10.1f}".format(
+            label, 1e3 * result["min"], 1e3 * result["median"], 1e3 * result["max"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+USBTMC transfers per intent.
+
+Runs every handler of a vendor module against a fake device and counts
+the commands it issues and the messages that actually reach the device:
+sent one per command (before), batched into compound messages from a
+cold start (batched), and batched with the settings shadow and the
+measurement cache warm from the same intent just before (cached):
+
+    python -m benchmarks.transfers [keysight|rigol]
+"""
+
+import sys
+
+from ollie import dispatch
+from ollie import keysight
+from ollie import measure
+from ollie import rigol
+from ollie.link import Link
+
+# A representative utterance for each intent; saveImage reads a binary
+# block the fake device can't answer
+samples = {
+    "runCapture": {},
+    "stopCapture": {},
+    "singleCapture": {},
+    "showChannel": {"source": "channel one"},
+    "hideChannel": {"source": "channel one"},
+    "setTimeBaseScale": {"scale": 2, "units": "milliseconds"},
+    "setTimebaseReference": {"reference": "left"},
+    "setChannelVerticalScale": {"channel": 1, "scale": 500, "units": "millivolts"},
+    "measure": {"source": "channel one", "type": "frequency"},
+    "clearAllMeasurements": {},
+    "setTriggerSource": {"source": "channel one"},
+    "setTriggerSlope": {"slope": "positive"},
+    "setProbeCoupling": {"channel": 1, "coupling": "AC"},
+    "setProbeAttenuation": {"channel": 1, "ratio": 10},
+    "autoScale": {},
+    "defaultSetup": {},
+    "increaseTimebase": {},
+    "decreaseTimebase": {},
+    "increaseVerticalScale": {"channel": 1},
+    "decreaseVerticalScale": {"channel": 1},
+    "forceTrigger": {},
+    "setTriggerLevel": {"level": 500, "units": "millivolts"},
+    "autoTriggerLevels": {},
+    "setTriggerCoupling": {"coupling": "DC"},
+    "setTriggerHoldoff": {"holdoff": 100, "units": "nanoseconds"},
+    "setTriggerSweepMode": {"mode": "normal"},
+}
+
+
+class CountingDevice:
+    """Answers every query with 1 and counts messages."""
+    def __init__(self):
+        self.messages = 0
+        self.queries = 0
+
+    def write(self, s):
+        self.messages += 1
+        self.queries = s.count("?")
+
+    def readline(self):
+        return ";".join(["+1.00000E+00"] * self.queries) + "\n"
+
+
+class NullClient:
+    """Drops spoken answers."""
+    def publish(self, topic, payload=None):
+        pass
+
+
+def makePayload(intent, slots):
+    return {
+        "intent": {"intentName": dispatch.intent_prefix + intent},
+        "slots": [
+            {"slotName": name, "value": {"value": value}}
+            for name, value in slots.items()
+        ],
+    }
+
+
+def run(link, handler, payload):
+    link.begin()
+    try:
+        handler(NullClient(), link, payload)
+    finally:
+        link.commit()
+
+
+def count(scope, intent, compound, warm):
+    handler = getattr(scope, dispatch.intent_handlers[intent])
+    payload = makePayload(intent, samples[intent])
+    measure.cache.values.clear()
+    device = CountingDevice()
+    link = Link(device, scope.__name__, compound=compound)
+    commands = []
+    write = link.write
+    link.write = lambda s: commands.append(s) or write(s)
+    if warm:
+        # As after a previous intent set or read the same settings
+        run(link, handler, payload)
+        device.messages = 0
+        commands.clear()
+    run(link, handler, payload)
+    return sum(s.endswith("\n") for s in commands), device.messages
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    scope = {"keysight": keysight, "rigol": rigol}[argv[0] if argv else "keysight"]
+    print("{:<26} {:>9} {:>8} {:>8} {:>8}".format(
+        "intent", "commands", "before", "batched", "cached"))
+    totals = [0, 0, 0, 0]
+    for intent in dispatch.intent_handlers:
+        if intent not in samples:
+            print("{:<26} {:>9}".format(intent, "n/a"))
+            continue
+        try:
+            commands, before = count(scope, intent, compound=False, warm=False)
+        except RuntimeError:
+            print("{:<26} {:>9}".format(intent, "n/a"))
+            continue
+        _, batched = count(scope, intent, compound=scope.compound_commands, warm=False)
+        _, cached = count(scope, intent, compound=scope.compound_commands, warm=True)
+        counts = (commands, before, batched, cached)
+        print("{:<26} {:>9} {:>8} {:>8} {:>8}".format(intent, *counts))
+        for i, n in enumerate(counts):
+            totals[i] += n
+    print("{:<26} {:>9} {:>8} {:>8} {:>8}".format("total", *totals))
+
+
+if __name__ == "__main__":
+    main()
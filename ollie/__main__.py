@@ -16,143 +16,333 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+import time
+
+started = time.monotonic()
+
+import argparse
 import json
-import paho.mqtt.client as mqtt
+import logging
 import signal
+import socket
 import sys
-import traceback
+import threading
 
 from .pixels import pixels
-from . import keysight
-from . import rigol
+from . import log as ollie_log
+from . import screenshot
+from . import waveform
+from .dispatch import decode, intent_topics
+from .instruments import DEVICE_PATTERN, SCOPE_SLOT, HotplugMonitor, Router
+from .metrics import MetricsPublisher
+from .session import Session
+from .slots import SlotError
+from .stream import TOPIC as STREAM_TOPIC
+from .worker import DeviceBusy
+
+log = logging.getLogger(__name__)
+
+# Publish any message here to get the log ring back on the log topic
+DEBUG_DUMP_TOPIC = "ollie/debug/dump"
+DEBUG_LOG_TOPIC = "ollie/debug/log"
 
 def on_message(client, userdata, msg):
+    """
+    Callback for the topics without one of their own, the dialogue
+    events. Only the topic matters for those, so the payload is never
+    decoded.
+    """
     try:
-        topic = msg.topic
-        payload = json.loads(msg.payload.decode("utf-8"))
-        scope, device = userdata
-
-        print("topic received: {topic}, payload: {payload}".format(
-            topic=topic, payload=payload), file=sys.stderr)
-        if topic == "hermes/dialogueManager/sessionStarted":
-            pixels.listen()
-        if topic == "hermes/dialogueManager/sessionEnded":
-            pixels.off()
-        if topic == "hermes/asr/textCaptured":
-            pixels.think()
-
-        if topic.startswith("hermes/intent/"):
-            # Once an intent is received, inform snips to close the session
-            # so it can start listening for new commands. None of the commands
-            # require follow-up input.
-            client.publish("hermes/dialogueManager/endSession",
-                           payload=json.dumps(dict(sessionId=payload["sessionId"])))
-
-        if topic == "hermes/intent/jmwilson:runCapture":
-            scope.onRunCapture(client, device, payload)
-        if topic == "hermes/intent/jmwilson:stopCapture":
-            scope.onStopCapture(client, device, payload)
-        if topic == "hermes/intent/jmwilson:singleCapture":
-            scope.onSingleCapture(client, device, payload)
-        if topic == "hermes/intent/jmwilson:showChannel":
-            scope.onShowChannel(client, device, payload)
-        if topic == "hermes/intent/jmwilson:hideChannel":
-            scope.onHideChannel(client, device, payload)
-        if topic == "hermes/intent/jmwilson:setTimeBaseScale":
-            scope.onSetTimebaseScale(client, device, payload)
-        if topic == "hermes/intent/jmwilson:setTimebaseReference":
-            scope.onSetTimebaseReference(client, device, payload)
-        if topic == "hermes/intent/jmwilson:setChannelVerticalScale":
-            scope.onSetChannelVerticalScale(client, device, payload)
-        if topic == "hermes/intent/jmwilson:measure":
-            scope.onMeasure(client, device, payload)
-        if topic == "hermes/intent/jmwilson:clearAllMeasurements":
-            scope.onClearAllMeasurements(client, device, payload)
-        if topic == "hermes/intent/jmwilson:setTriggerSource":
-            scope.onSetTriggerSource(client, device, payload)
-        if topic == "hermes/intent/jmwilson:setTriggerSlope":
-            scope.onSetTriggerSlope(client, device, payload)
-        if topic == "hermes/intent/jmwilson:saveImage":
-            scope.onSaveImage(client, device, payload)
-        if topic == "hermes/intent/jmwilson:setProbeCoupling":
-            scope.onSetProbeCoupling(client, device, payload)
-        if topic == "hermes/intent/jmwilson:setProbeAttenuation":
-            scope.onSetProbeAttenuation(client, device, payload)
-        if topic == "hermes/intent/jmwilson:autoScale":
-            scope.onAutoScale(client, device, payload)
-        if topic == "hermes/intent/jmwilson:defaultSetup":
-            scope.onDefaultSetup(client, device, payload)
-        if topic == "hermes/intent/jmwilson:increaseTimebase":
-            scope.onIncreaseTimebase(client, device, payload)
-        if topic == "hermes/intent/jmwilson:decreaseTimebase":
-            scope.onDecreaseTimebase(client, device, payload)
-        if topic == "hermes/intent/jmwilson:increaseVerticalScale":
-            scope.onIncreaseVerticalScale(client, device, payload)
-        if topic == "hermes/intent/jmwilson:decreaseVerticalScale":
-            scope.onDecreaseVerticalScale(client, device, payload)
-        if topic == "hermes/intent/jmwilson:forceTrigger":
-            scope.onForceTrigger(client, device, payload)
-        if topic == "hermes/intent/jmwilson:setTriggerLevel":
-            scope.onSetTriggerLevel(client, device, payload)
-        if topic == "hermes/intent/jmwilson:autoTriggerLevels":
-            scope.onAutoTriggerLevels(client, device, payload)
-        if topic == "hermes/intent/jmwilson:setTriggerCoupling":
-            scope.onSetTriggerCoupling(client, device, payload)
-        if topic == "hermes/intent/jmwilson:setTriggerHoldoff":
-            scope.onSetTriggerHoldoff(client, device, payload)
-        if topic == "hermes/intent/jmwilson:setTriggerSweepMode":
-            scope.onSetTriggerSweepMode(client, device, payload)
+        log.debug("received %s", msg.topic)
+        event = dialogue_events.get(msg.topic)
+        if event is not None:
+            getattr(pixels, event)()
     except Exception:
-        print(traceback.format_exc(), file=sys.stderr)
+        log.exception("Failed to handle %s", msg.topic)
         raise  # note: paho-mqtt ignores all exceptions
 
 
-def main():
+def on_intent(client, userdata, msg):
+    """
+    Per-topic callback registered with message_callback_add() for each
+    intent ollie implements, so on_message is bypassed for them.
+    """
+    try:
+        start = time.monotonic()
+        payload = decode(msg.payload)
+        decoded = time.monotonic()
+
+        log.debug("received %s: %s", msg.topic, payload)
+        if not session.accept(msg):
+            return
+        endSession(client, payload)
+        timing = (getattr(msg, "timestamp", None), start, decoded)
+        dispatch(client, userdata, msg.topic, payload, timing)
+    except Exception:
+        log.exception("Failed to handle %s", msg.topic)
+        raise  # note: paho-mqtt ignores all exceptions
+
+
+def on_waveform(client, userdata, msg):
+    """
+    Queue a waveform capture on the instrument's worker, routed like an
+    intent by its optional scope selector; see waveform.publishWaveform.
+    """
     try:
-        # Open with line buffering because usbtmc is similar to a tty
-        dev = open("/dev/usbtmc0", mode="r+", buffering=1, encoding='ascii')
-        print("*IDN?", file=dev)
-        ident = dev.readline()
-        if ident.upper().startswith("KEYSIGHT") or ident.upper().startswith("AGILENT"):
-            print("Keysight device detected", file=sys.stderr)
-            scope = keysight
-        elif ident.upper().startswith("RIGOL"):
-            print("Rigol device detected", file=sys.stderr)
-            scope = rigol
-        else:
-            print("No device detected", file=sys.stderr)
-            raise ValueError(ident)
-    except FileNotFoundError:
-        # If /dev/usbtmc0 is not there, assume some race condition with
-        # device disconnect and service restarts. exit(0) will stop retries.
+        request = decode(msg.payload)
+        slots = [{"slotName": SCOPE_SLOT, "value": {"value": request["scope"]}}] \
+            if "scope" in request else []
+        instrument, payload = userdata.route({
+            "intent": {"intentName": "captureWaveform"}, "slots": slots})
+
+        def captureWaveform(client, device, payload):
+            waveform.publishWaveform(client, instrument.waveform_topic,
+                                     instrument.scope.captureWaveform, device, request)
+        instrument.worker.submit(captureWaveform, payload)
+    except (DeviceBusy, RuntimeError, KeyError, TypeError, ValueError) as e:
+        log.warning("Waveform request %r failed: %s", msg.payload, e)
+
+
+def on_dump(client, userdata, msg):
+    client.publish(DEBUG_LOG_TOPIC, payload=ollie_log.ring.dumps())
+
+
+def endSession(client, payload):
+    # Once an intent is received, inform snips to close the session
+    # so it can start listening for new commands. None of the commands
+    # require follow-up input.
+    client.publish("hermes/dialogueManager/endSession",
+                   payload=json.dumps(dict(sessionId=payload["sessionId"])))
+
+
+def dispatch(client, router, topic, payload, timing=None):
+    try:
+        instrument, payload = router.route(payload)
+    except RuntimeError as e:
+        log.warning("%s", e)
         pixels.error()
-        sys.exit(0)
-    except (OSError, ValueError):
-        # For other errors, exit(1) + Restart=on-failure in the systemd unit
-        # file will force retrying.
+        return
+
+    worker = instrument.worker
+    if timing is not None:
+        received, start, decoded = timing
+        intent = topic.rpartition(":")[2]
+        if received is not None:
+            worker.observe(intent, "receive", start - received)
+        worker.observe(intent, "decode", decoded - start)
+
+    # Device I/O happens on the instrument's worker thread; the network
+    # thread only queues the intent so endSession and LED feedback are
+    # never delayed by a busy scope.
+    try:
+        if not worker.submit(instrument.intents[topic], payload):
+            log.info("Dropping duplicate session %s", payload.get("sessionId"))
+    except (DeviceBusy, SlotError) as e:
+        log.warning("%s", e)
         pixels.error()
-        sys.exit(1)
 
-    client = mqtt.Client(userdata=(scope, dev))
-    client.on_message = on_message
 
-    client.connect("localhost")
-    client.subscribe("hermes/intent/#")
-    client.subscribe("hermes/dialogueManager/sessionStarted")
-    client.subscribe("hermes/dialogueManager/sessionEnded")
-    client.subscribe("hermes/asr/textCaptured")
+# Dialogue event topic -> LED pattern
+dialogue_events = {
+    "hermes/dialogueManager/sessionStarted": "listen",
+    "hermes/dialogueManager/sessionEnded": "off",
+    "hermes/asr/textCaptured": "think",
+}
+
+# Only the intents ollie implements are subscribed to, so the broker
+# doesn't send those of other Snips skills just to be dropped here
+subscriptions = sorted(intent_topics) + [
+    "hermes/dialogueManager/sessionStarted",
+    "hermes/dialogueManager/sessionEnded",
+    "hermes/asr/textCaptured",
+    DEBUG_DUMP_TOPIC,
+    waveform.REQUEST_TOPIC,
+]
+
+# Intents are acknowledged, so the broker keeps them for ollie's session
+# while it is disconnected; LED feedback is not worth keeping
+INTENT_QOS = 1
+
+
+class Startup:
+    """
+    Logs the time from process start until ollie is ready: subscribed to
+    MQTT and done with the first device scan, which run in parallel.
+    """
+    def __init__(self, *steps):
+        self.pending = set(steps)
+        self.lock = threading.Lock()
 
-    def handler(signal, frame):
-        # Catch SIGHUP thrown by udev remove rule to show error condition
-        # and stop the service.
+    def done(self, step):
+        with self.lock:
+            if step not in self.pending:
+                return
+            self.pending.discard(step)
+            log.debug("%s after %.3f s", step, time.monotonic() - started)
+            if not self.pending:
+                log.info("ready in %.3f s", time.monotonic() - started)
+
+
+startup = Startup("subscribed", "scanned")
+session = Session()
+
+
+def on_connect(client, userdata, flags, rc):
+    if rc != 0:
+        log.error("MQTT connection refused: %d", rc)
+        return
+    session.connected(flags.get("session present"))
+    client.subscribe([(topic, INTENT_QOS if topic in intent_topics else 0)
+                      for topic in subscriptions])
+
+
+def on_subscribe(client, userdata, mid, granted_qos):
+    startup.done("subscribed")
+
+
+def on_scanned(router):
+    if not router.instruments:
+        # Keep the MQTT session up; the scope is picked up when it appears
+        log.warning("No device detected")
         pixels.error()
-        client.disconnect()
-        dev.close()
-        sys.exit(0)
-    signal.signal(signal.SIGHUP, handler)
+    startup.done("scanned")
+
+
+def selector(value):
+    name, sep, target = value.partition("=")
+    if not sep or not name or not target:
+        raise argparse.ArgumentTypeError("expected NAME=SELECTOR, got {value}".format(value=value))
+    return name, target
+
+
+def streamed(value):
+    source, sep, measurement = value.partition(":")
+    if not sep or not source or not measurement:
+        raise argparse.ArgumentTypeError(
+            "expected SOURCE:MEASUREMENT, got {value}".format(value=value))
+    return source.strip().lower(), measurement.strip().lower()
+
 
-    pixels.startup()
-    client.loop_forever()
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="ollie", description="Voice control for oscilloscopes using Snips",
+        epilog="'ollie record PATH' captures the Snips messages ollie handles and "
+               "'ollie replay PATH' plays them back; see 'ollie record --help'")
+    parser.add_argument(
+        "--scope", type=selector, action="append", default=[], metavar="NAME=SELECTOR",
+        help="spoken name for the scope with this device path, serial number "
+             "or model; may be repeated")
+    parser.add_argument(
+        "--site", type=selector, action="append", default=[], metavar="SITEID=SELECTOR",
+        help="send intents from this Snips site to the scope with this device "
+             "path, serial number or name; may be repeated")
+    parser.add_argument(
+        "--host", default="localhost", help="MQTT broker host")
+    parser.add_argument(
+        "--port", type=int, default=1883, help="MQTT broker port")
+    parser.add_argument(
+        "--client-id", default="ollie-" + socket.gethostname(), metavar="ID",
+        help="MQTT client id; the broker keeps intents for this id while "
+             "ollie is disconnected")
+    parser.add_argument(
+        "--devices", default=DEVICE_PATTERN, metavar="PATTERN",
+        help="glob pattern for the USBTMC device nodes")
+    parser.add_argument(
+        "--timeout", type=float, default=2., metavar="SECONDS",
+        help="give up on a scope that takes longer than this to answer")
+    parser.add_argument(
+        "--sync-interval", type=float, default=0., metavar="SECONDS",
+        help="refresh the scope settings ollie relies on after this long "
+             "without a command, to pick up front-panel changes; 0 disables")
+    parser.add_argument(
+        "--stream", type=streamed, action="append", default=[],
+        metavar="SOURCE:MEASUREMENT",
+        help="poll this measurement, e.g. \"channel one:frequency\", while the "
+             "scope is idle and publish it on {topic}; may be repeated".format(
+                 topic=STREAM_TOPIC.format(instrument="SERIAL")))
+    parser.add_argument(
+        "--stream-interval", type=float, default=1., metavar="SECONDS",
+        help="shortest time between streamed samples; polling slows down "
+             "for a slow scope and while voice commands are being handled")
+    parser.add_argument(
+        "--image-dir", default=screenshot.DIRECTORY, metavar="PATH",
+        help="directory screenshots are saved in; a thumbnail of each is "
+             "published on {topic}".format(topic=screenshot.TOPIC))
+    parser.add_argument(
+        "--metrics-interval", type=float, default=60., metavar="SECONDS",
+        help="how often to publish metrics on the {topic} topic".format(
+            topic=MetricsPublisher.TOPIC))
+    parser.add_argument(
+        "--metrics-file", metavar="PATH",
+        help="also write metrics to this file in Prometheus text format")
+    parser.add_argument(
+        "--log-level", default="INFO",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        help="minimum level logged to stderr")
+    parser.add_argument(
+        "--log-ring", type=int, default=1000, metavar="RECORDS",
+        help="recent log records and SCPI traffic kept in memory, dumped on "
+             "SIGUSR1, on errors or on request over {topic}".format(
+                 topic=DEBUG_DUMP_TOPIC))
+    return parser.parse_args(argv)
+
+
+def main():
+    # udev sends SIGHUP whenever a usbtmc node is added or removed, which
+    # would end the process until the monitor is there to handle it. The
+    # monitor's first scan finds any device added in the meantime.
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    if sys.argv[1:2] in (["record"], ["replay"]):
+        # Capture or play back the Snips side of a session; see capture.py
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+        from . import capture
+        capture.main(sys.argv[1:],
+                     [topic for topic in subscriptions if topic.startswith("hermes/")])
+        return
+
+    args = parseArgs()
+    ollie_log.configure(getattr(logging, args.log_level), args.log_ring)
+    screenshot.directory = args.image_dir
+
+    # paho is only needed once the arguments are known to be good
+    import paho.mqtt.client as mqtt
+
+    router = Router(names=args.scope, sites=args.site)
+    client = mqtt.Client(client_id=args.client_id, clean_session=False, userdata=router)
+    client.on_connect = on_connect
+    client.on_subscribe = on_subscribe
+    client.on_message = on_message
+    for topic in intent_topics:
+        client.message_callback_add(topic, on_intent)
+    client.message_callback_add(DEBUG_DUMP_TOPIC, on_dump)
+    client.message_callback_add(waveform.REQUEST_TOPIC, on_waveform)
+
+    # The first device scan (opening each scope and waiting for *IDN?) runs
+    # on the monitor thread while the MQTT connection is set up.
+    monitor = HotplugMonitor(
+        client, router, args.devices,
+        connected=lambda instrument: pixels.startup(),
+        disconnected=lambda instrument: pixels.error(),
+        scanned=lambda: on_scanned(router),
+        sync_interval=args.sync_interval,
+        timeout=args.timeout,
+        stream=args.stream,
+        stream_interval=args.stream_interval)
+    monitor.start()
+
+    publisher = MetricsPublisher(client, args.metrics_interval, args.metrics_file)
+
+    # udev rules send SIGHUP when a usbtmc device is added or removed
+    signal.signal(signal.SIGHUP, lambda signum, frame: monitor.wake())
+    signal.signal(signal.SIGUSR1, lambda signum, frame: ollie_log.ring.dump(sys.stderr))
+
+    try:
+        session.run(client, args.host, args.port)
+    finally:
+        monitor.stop()
+        publisher.stop()
+        router.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,178 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import argparse
+import gzip
+import json
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+def openCapture(path, mode):
+    """
+    Open a capture file as text; gzip compressed if the name ends in .gz.
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class Recorder:
+    """
+    Writes each MQTT message it is given to a capture file, one compact
+    JSON line per message: [seconds since the first message, topic,
+    payload text].
+    """
+    def __init__(self, fd):
+        self.fd = fd
+        self.start = None
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def on_message(self, client, userdata, msg):
+        now = time.monotonic()
+        with self.lock:
+            if self.start is None:
+                self.start = now
+            self.fd.write(json.dumps(
+                [round(now - self.start, 4), msg.topic,
+                 msg.payload.decode("utf-8", "replace")],
+                separators=(",", ":")) + "\n")
+            self.count += 1
+
+
+def readCapture(fd):
+    """
+    Yield (time, topic, payload) for each message in a capture file.
+    """
+    for line in fd:
+        if line.strip():
+            t, topic, payload = json.loads(line)
+            yield t, topic, payload
+
+
+def renameSessions(payload, suffix):
+    """
+    Make the Snips sessionId in a payload unique to this replay, so ollie
+    doesn't drop the intents of a capture played twice as duplicates.
+    """
+    if '"sessionId"' not in payload:
+        return payload
+    try:
+        message = json.loads(payload)
+    except ValueError:
+        return payload
+    if not isinstance(message, dict) or message.get('sessionId') is None:
+        return payload
+    message['sessionId'] = "{id}-{suffix}".format(id=message['sessionId'], suffix=suffix)
+    return json.dumps(message)
+
+
+def replay(client, messages, speed=1., suffix=None, clock=time.monotonic, sleep=time.sleep):
+    """
+    Publish captured (time, topic, payload) messages, `speed` times as
+    fast as they were recorded, or as fast as possible if `speed` is 0.
+    Returns the number of messages published.
+    """
+    start = clock()
+    count = 0
+    for t, topic, payload in messages:
+        if speed:
+            delay = start + t / speed - clock()
+            if delay > 0:
+                sleep(delay)
+        if suffix is not None:
+            payload = renameSessions(payload, suffix)
+        client.publish(topic, payload=payload)
+        count += 1
+    return count
+
+
+def parseArgs(argv):
+    parser = argparse.ArgumentParser(
+        prog="ollie", description="Record or replay the Snips messages ollie handles")
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("path", help="capture file; compressed if it ends in .gz")
+    parser.add_argument(
+        "--host", default="localhost", help="MQTT broker host")
+    parser.add_argument(
+        "--port", type=int, default=1883, help="MQTT broker port")
+    parser.add_argument(
+        "--duration", type=float, metavar="SECONDS",
+        help="record: stop after this long; default until interrupted")
+    parser.add_argument(
+        "--speed", type=float, default=1., metavar="N",
+        help="replay: play back N times as fast as recorded; 0 for as fast as possible")
+    parser.add_argument(
+        "--keep-sessions", action="store_true",
+        help="replay: publish the recorded Snips session ids unchanged")
+    return parser.parse_args(argv)
+
+
+def main(argv, topics):
+    """
+    `ollie record PATH` captures the messages on `topics` until
+    interrupted; `ollie replay PATH` publishes a capture back to the
+    broker for a running ollie to handle.
+    """
+    args = parseArgs(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    import paho.mqtt.client as mqtt
+
+    client = mqtt.Client()
+    if args.mode == "record":
+        with openCapture(args.path, "w") as fd:
+            recorder = Recorder(fd)
+            client.on_connect = lambda client, userdata, flags, rc: \
+                client.subscribe([(topic, 0) for topic in topics])
+            client.on_message = recorder.on_message
+            client.connect(args.host, args.port)
+            client.loop_start()
+            try:
+                if args.duration:
+                    time.sleep(args.duration)
+                else:
+                    while True:
+                        time.sleep(60)
+            except KeyboardInterrupt:
+                pass
+            finally:
+                client.loop_stop()
+                client.disconnect()
+        log.info("Recorded %d messages to %s", recorder.count, args.path)
+        return
+
+    client.connect(args.host, args.port)
+    client.loop_start()
+    start = time.monotonic()
+    try:
+        with openCapture(args.path, "r") as fd:
+            count = replay(client, readCapture(fd), args.speed,
+                           None if args.keep_sessions else "replay{t:x}".format(t=int(time.time())))
+    finally:
+        # Let paho send what is queued before disconnecting
+        client.disconnect()
+        client.loop_stop()
+    elapsed = time.monotonic() - start
+    log.info("Replayed %d messages in %.3f s (%.1f/s)", count, elapsed,
+             count / elapsed if elapsed else 0.)
@@ -0,0 +1,71 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+try:
+    # orjson parses the bytes straight off the wire, several times faster
+    from orjson import loads as decode
+except ImportError:
+    from json import loads as decode
+
+intent_prefix = "hermes/intent/jmwilson:"
+
+# Snips intent name -> handler implemented by each vendor module
+intent_handlers = {
+    "runCapture": "onRunCapture",
+    "stopCapture": "onStopCapture",
+    "singleCapture": "onSingleCapture",
+    "showChannel": "onShowChannel",
+    "hideChannel": "onHideChannel",
+    "setTimeBaseScale": "onSetTimebaseScale",
+    "setTimebaseReference": "onSetTimebaseReference",
+    "setChannelVerticalScale": "onSetChannelVerticalScale",
+    "measure": "onMeasure",
+    "clearAllMeasurements": "onClearAllMeasurements",
+    "setTriggerSource": "onSetTriggerSource",
+    "setTriggerSlope": "onSetTriggerSlope",
+    "saveImage": "onSaveImage",
+    "setProbeCoupling": "onSetProbeCoupling",
+    "setProbeAttenuation": "onSetProbeAttenuation",
+    "autoScale": "onAutoScale",
+    "defaultSetup": "onDefaultSetup",
+    "increaseTimebase": "onIncreaseTimebase",
+    "decreaseTimebase": "onDecreaseTimebase",
+    "increaseVerticalScale": "onIncreaseVerticalScale",
+    "decreaseVerticalScale": "onDecreaseVerticalScale",
+    "forceTrigger": "onForceTrigger",
+    "setTriggerLevel": "onSetTriggerLevel",
+    "autoTriggerLevels": "onAutoTriggerLevels",
+    "setTriggerCoupling": "onSetTriggerCoupling",
+    "setTriggerHoldoff": "onSetTriggerHoldoff",
+    "setTriggerSweepMode": "onSetTriggerSweepMode",
+}
+
+intent_topics = frozenset(intent_prefix + intent for intent in intent_handlers)
+
+
+def makeIntentTable(scope):
+    """
+    Build the MQTT topic -> handler map for a vendor module.
+
+    This is done once at startup so that dispatching a message is a single
+    dictionary lookup instead of comparing against every known topic.
+    """
+    return {
+        intent_prefix + intent: getattr(scope, handler)
+        for intent, handler in intent_handlers.items()
+    }
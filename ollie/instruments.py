@@ -0,0 +1,314 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import collections
+import glob
+import importlib
+import logging
+import os
+import re
+import threading
+import time
+
+from .dispatch import makeIntentTable
+from .link import Link
+from .stream import MeasurementStream, TOPIC as STREAM_TOPIC
+from .transport import DeviceTimeout, Transport
+from .waveform import TOPIC as WAVEFORM_TOPIC
+from .worker import DeviceWorker
+
+log = logging.getLogger(__name__)
+
+DEVICE_PATTERN = "/dev/usbtmc[0-9]*"
+
+# *IDN? manufacturer prefix -> vendor module name. Vendor modules are only
+# imported once a scope of that make is found.
+vendors = collections.OrderedDict([
+    ("KEYSIGHT", "keysight"),
+    ("AGILENT", "keysight"),
+    ("RIGOL", "rigol"),
+])
+
+# Optional slot naming the scope an intent is meant for, e.g. "on the
+# Rigol" or "on bench two". It is removed before the payload reaches the
+# vendor handler.
+SCOPE_SLOT = "scope"
+
+
+def identify(ident):
+    """
+    Return (vendor name, vendor module) for an *IDN? response.
+    """
+    for prefix, vendor in vendors.items():
+        if ident.upper().startswith(prefix):
+            return vendor, importlib.import_module("." + vendor, __package__)
+    raise ValueError(ident)
+
+
+def devicePaths(pattern=DEVICE_PATTERN):
+    return sorted(glob.glob(pattern), key=lambda path: [
+        int(s) if s.isdigit() else s for s in re.split(r"(\d+)", path)])
+
+
+def openDevice(path, timeout=Transport.TIMEOUT):
+    """
+    Open a USBTMC device node and ask it to identify itself.
+    Returns the open transport and the *IDN? response.
+    """
+    dev = Transport.open(path, timeout)
+    try:
+        dev.write("*IDN?\n")
+        ident = dev.readline().strip()
+    except Exception:
+        dev.close()
+        raise
+    return dev, ident
+
+
+class Instrument:
+    """
+    One oscilloscope: its vendor module, link and command worker.
+
+    Each instrument has its own worker thread, so commands for different
+    scopes run concurrently.
+
+    The `stream` measurements, (source, measurement) spoken names, are
+    published every `stream_interval` seconds or so; see MeasurementStream.
+    """
+    def __init__(self, client, path, dev, ident, on_error=None, sync_interval=None,
+                 stream=(), stream_interval=1.):
+        self.path = path
+        self.ident = ident
+        self.vendor, self.scope = identify(ident)
+        fields = [field.strip() for field in ident.split(",")]
+        fields += [""] * (4 - len(fields))
+        self.manufacturer, self.model, self.serial, self.firmware = fields[:4]
+        self.names = {self.model.lower()} if self.model else set()
+        self.intents = makeIntentTable(self.scope)
+        self.link = Link(dev, self.vendor, on_error, self.scope.compound_commands)
+        name = self.serial or os.path.basename(path)
+        self.waveform_topic = WAVEFORM_TOPIC.format(instrument=name)
+        self.stream = None
+        if stream:
+            topic = STREAM_TOPIC.format(instrument=name)
+            self.stream = MeasurementStream(client, self.link, self.scope, stream,
+                                            topic, stream_interval)
+        self.worker = DeviceWorker(client, self.scope, self.link,
+                                   sync_interval=sync_interval, stream=self.stream)
+
+    def matches(self, selector):
+        """
+        True if `selector` is this instrument's device path, serial number
+        or one of its spoken names.
+        """
+        selector = selector.strip().lower()
+        return selector in (self.path.lower(), self.serial.lower()) or \
+            selector in self.names
+
+    def close(self):
+        self.worker.stop(timeout=1)
+        self.link.close()
+
+    def __repr__(self):
+        return "<Instrument {path}: {ident}>".format(path=self.path, ident=self.ident)
+
+
+class Router:
+    """
+    Chooses the instrument that handles each intent.
+
+    An intent goes to the scope named in its `scope` slot if there is one,
+    otherwise to the scope assigned to the Snips site it came from, and
+    otherwise to the first scope found.
+    """
+    def __init__(self, names=None, sites=None):
+        # spoken name -> selector, Snips siteId -> selector
+        self.names = dict(names or {})
+        self.sites = dict(sites or {})
+        self.instruments = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def add(self, instrument):
+        for name, selector in self.names.items():
+            if instrument.matches(selector):
+                instrument.names.add(name.lower())
+        with self.lock:
+            self.instruments[instrument.path] = instrument
+        log.info("%s: %s", instrument.path, instrument.ident)
+
+    def remove(self, path):
+        with self.lock:
+            return self.instruments.pop(path, None)
+
+    def find(self, selector):
+        for instrument in list(self.instruments.values()):
+            if instrument.matches(selector):
+                return instrument
+        return None
+
+    def route(self, payload):
+        """
+        Return the instrument for an intent payload, and the payload with
+        any scope slot removed.
+        """
+        slots = payload.get('slots', [])
+        named = [slot for slot in slots if slot['slotName'] == SCOPE_SLOT]
+        if named:
+            name = named[0]['value']['value']
+            instrument = self.find(name)
+            if instrument is None:
+                raise RuntimeError("No oscilloscope named {name}".format(name=name))
+            payload = dict(payload)
+            payload['slots'] = [slot for slot in slots if slot['slotName'] != SCOPE_SLOT]
+            return instrument, payload
+
+        site = self.sites.get(payload.get('siteId'))
+        if site is not None:
+            instrument = self.find(site)
+            if instrument is None:
+                raise RuntimeError("No oscilloscope {site} for site {id}".format(
+                    site=site, id=payload.get('siteId')))
+            return instrument, payload
+
+        for instrument in list(self.instruments.values()):
+            return instrument, payload
+        raise RuntimeError("No oscilloscope connected")
+
+    def close(self):
+        with self.lock:
+            instruments = list(self.instruments.values())
+            self.instruments.clear()
+        for instrument in instruments:
+            instrument.close()
+
+
+class HotplugMonitor:
+    """
+    Keeps the router's instruments in step with the USBTMC device nodes,
+    so a scope that is unplugged and plugged back in is reopened without
+    restarting the process or dropping the MQTT session.
+
+    The udev rules send SIGHUP whenever a usbtmc node is added or removed;
+    the signal handler calls wake() for an immediate rescan. The device
+    directory is also polled in case an event is missed, and a link that
+    fails with an I/O error is reopened on the next scan.
+
+    A device that doesn't answer *IDN?, e.g. a scope still booting when
+    its node appears, is asked again after RETRY_INTERVAL seconds, then
+    twice as long each time up to MAX_RETRY_INTERVAL, so it doesn't hold
+    up every scan.
+    """
+    POLL_INTERVAL = 0.5
+    RETRY_INTERVAL = 1.
+    MAX_RETRY_INTERVAL = 60.
+
+    def __init__(self, client, router, pattern=DEVICE_PATTERN, interval=POLL_INTERVAL,
+                 connected=None, disconnected=None, scanned=None, sync_interval=None,
+                 timeout=Transport.TIMEOUT, stream=(), stream_interval=1.):
+        self.client = client
+        self.router = router
+        self.pattern = pattern
+        self.interval = interval
+        self.connected = connected
+        self.disconnected = disconnected
+        self.scanned = scanned
+        self.sync_interval = sync_interval
+        self.timeout = timeout
+        self.stream = stream
+        self.stream_interval = stream_interval
+        self.ignored = set()
+        # path -> (seconds to the next retry after this one, time of the retry)
+        self.retries = {}
+        self.wakeup = threading.Event()
+        self.stopped = False
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped = True
+        self.wakeup.set()
+
+    def wake(self):
+        # Only sets an event, so this is safe to call from a signal handler
+        self.wakeup.set()
+
+    def scan(self):
+        paths = set(devicePaths(self.pattern))
+        self.ignored &= paths
+        for path in set(self.retries) - paths:
+            del self.retries[path]
+        now = time.monotonic()
+
+        for path, instrument in list(self.router.instruments.items()):
+            if path in paths and not instrument.link.broken:
+                continue
+            self.router.remove(path)
+            instrument.close()
+            log.warning("%s: disconnected", path)
+            if self.disconnected is not None:
+                self.disconnected(instrument)
+
+        for path in sorted(paths - self.ignored - set(self.router.instruments)):
+            interval, retry = self.retries.get(path, (self.RETRY_INTERVAL, now))
+            if retry > now:
+                continue
+            try:
+                dev, ident = openDevice(path, self.timeout)
+            except DeviceTimeout:
+                log.warning("%s: no answer to *IDN?, retrying in %g s", path, interval)
+                self.retries[path] = (min(2 * interval, self.MAX_RETRY_INTERVAL),
+                                      time.monotonic() + interval)
+                continue
+            except OSError as e:
+                # udev may not have set permissions yet; retried next scan
+                log.debug("%s: %s", path, e)
+                continue
+            self.retries.pop(path, None)
+            try:
+                instrument = Instrument(self.client, path, dev, ident, self.wake,
+                                        self.sync_interval, self.stream,
+                                        self.stream_interval)
+            except ValueError:
+                log.warning("%s: unsupported device %r", path, ident)
+                self.ignored.add(path)
+                dev.close()
+                continue
+            self.router.add(instrument)
+            if self.connected is not None:
+                self.connected(instrument)
+
+    def _run(self):
+        # The first scan runs as soon as the thread starts, in parallel with
+        # connecting to MQTT; `scanned` is called once it is done.
+        first = True
+        while not self.stopped:
+            try:
+                self.scan()
+            except Exception:
+                log.exception("Device scan failed")
+            if first and self.scanned is not None:
+                try:
+                    self.scanned()
+                except Exception:
+                    log.exception("Scan callback failed")
+            first = False
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
@@ -0,0 +1,143 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import collections
+import queue
+import threading
+import time
+
+
+# Relative zoom handlers that can be merged into a net step count:
+# handler name -> (step function in the vendor module, direction)
+coalesced_handlers = {
+    "onIncreaseTimebase": ("stepTimebase", 1),
+    "onDecreaseTimebase": ("stepTimebase", -1),
+    "onIncreaseVerticalScale": ("stepVerticalScale", 1),
+    "onDecreaseVerticalScale": ("stepVerticalScale", -1),
+}
+
+
+class Job:
+    """
+    A pending intent: the vendor handler, the decoded Snips payload and
+    its slots, extracted by the handler's schema (see ollie.slots) when
+    the job is made, so a bad payload is rejected before it is queued.
+
+    Zoom intents carry a step count instead, so that a burst of them can
+    be applied by the vendor step function with one query and one write.
+    """
+    def __init__(self, handler, payload):
+        self.handler = handler
+        self.payload = payload
+        self.name = payload['intent']['intentName'].rpartition(":")[2]
+        self.queued = time.monotonic()
+        extract = getattr(handler, "extract", None)
+        self.slots = extract(payload) if extract is not None else {}
+        self.step = None
+        self.args = ()
+        self.steps = 0
+
+        rule = coalesced_handlers.get(handler.__name__)
+        if rule is not None:
+            step, direction = rule
+            if self.slots.get("factor") is not None:
+                return  # "zoom in by ten x" snaps instead of stepping
+            if step == "stepVerticalScale":
+                self.args = (self.slots["channel"],)
+            self.steps = self.slots.get("steps", 1) * direction
+            self.step = step
+
+    def merge(self, other):
+        """
+        Fold a later job into this one if both move the same control.
+        """
+        if self.step is None or (self.step, self.args) != (other.step, other.args):
+            return False
+        self.steps += other.steps
+        return True
+
+    def run(self, client, scope, device):
+        if self.step is None:
+            self.handler(client, device, self.payload, **self.slots)
+        else:
+            getattr(scope, self.step)(client, device, *self.args, self.steps)
+
+
+class IntentQueue:
+    """
+    Bounded FIFO of jobs for one device.
+
+    A job is merged into the one queued just before it when both are
+    relative zoom steps on the same control, and an intent whose Snips
+    sessionId was already seen (ASR double-fire) is dropped.
+    """
+    SESSION_HISTORY = 64
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.jobs = collections.deque()
+        self.sessions = collections.OrderedDict()
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def put_nowait(self, job):
+        """
+        Queue a job. Returns False if it was a duplicate and dropped;
+        raises queue.Full if there is no room for it.
+        """
+        with self.cond:
+            session = job.payload.get('sessionId')
+            if session is not None and session in self.sessions:
+                return False
+
+            if self.jobs and self.jobs[-1].merge(job):
+                if self.jobs[-1].steps == 0:
+                    # e.g. "zoom in" followed by "zoom out"
+                    self.jobs.pop()
+            elif len(self.jobs) >= self.maxsize:
+                # Not remembered, so a later delivery of it is accepted
+                raise queue.Full
+            else:
+                self.jobs.append(job)
+                self.cond.notify()
+
+            if session is not None:
+                self.sessions[session] = None
+                if len(self.sessions) > self.SESSION_HISTORY:
+                    self.sessions.popitem(last=False)
+            return True
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def get(self, timeout=None):
+        """
+        Wait for the next job. Returns None once the queue is closed, and
+        raises queue.Empty if there is no job within `timeout` seconds.
+        """
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.jobs or self.closed, timeout):
+                raise queue.Empty
+            if self.closed:
+                return None
+            return self.jobs.popleft()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
@@ -0,0 +1,298 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import collections
+import logging
+import time
+
+from .metrics import metrics
+from .shadow import Shadow, header
+from .transport import DeviceTimeout
+
+log = logging.getLogger(__name__)
+
+
+class Link:
+    """
+    Connection to an instrument, passed to the vendor handlers as `device`.
+
+    Behaves like the line-buffered text file it wraps: handlers send
+    commands with print(..., file=device) and read responses with
+    device.readline(). Every command sent and every query round trip is
+    timed against the intent currently being handled, and the traffic is
+    logged at debug level for the in-memory log ring.
+
+    Settings ollie has set or read recently are kept in `shadow`; a query
+    for one of them is answered from memory without touching the device
+    (see Shadow.MAX_AGE). Several
+    queries written as one line are answered by one `;`-separated line,
+    with a single round trip for those not in the shadow.
+
+    If the scope accepts compound messages, commands written between
+    begin() and commit() are sent together as one `;`-separated message,
+    flushed early only when a query needs an answer. Each message costs a
+    USBTMC transfer and a trip through the scope's parser, so a handler
+    that sends three commands now costs one transfer instead of three.
+
+    An I/O error marks the link broken and calls `on_error`, so the
+    hotplug monitor can reopen or drop the instrument. A timeout clears
+    the device and is passed on to the handler; see recover().
+    """
+    # Longest compound message sent; longer batches are split
+    MAX_MESSAGE = 1024
+    # Consecutive timeouts before the link is reopened
+    MAX_TIMEOUTS = 3
+
+    def __init__(self, file, vendor, on_error=None, compound=False):
+        self.file = file
+        self.vendor = vendor
+        self.on_error = on_error
+        self.compound = compound
+        self.broken = False
+        self.timeouts = 0
+        self.pending = []
+        self.batching = False
+        self.batch = []
+        self.sent = None
+        self.shadow = Shadow()
+        # Reused for binary responses such as waveforms; see readBlock
+        self.buffer = bytearray()
+        # One entry per query message not yet read, in order: the names
+        # queried and their values, None for those still to be read from
+        # the device and recorded.
+        self.responses = collections.deque()
+        self.setIntent("")
+
+    def fail(self):
+        self.broken = True
+        if self.on_error is not None:
+            self.on_error()
+
+    def recover(self):
+        """
+        Resynchronize after a timeout: forget the queries still waiting
+        for an answer and clear the device, so a late answer isn't read
+        as the response to the next query. What ollie knows about the
+        scope's settings can't be trusted either. After MAX_TIMEOUTS in a
+        row the link is given up on and reopened.
+        """
+        metrics.increment("ollie_scpi_timeouts_total", self.count_labels)
+        self.timeouts += 1
+        self.responses.clear()
+        self.batch = []
+        self.sent = None
+        self.shadow.invalidate()
+        if self.timeouts >= self.MAX_TIMEOUTS:
+            log.warning("%d timeouts in a row, reopening", self.timeouts)
+            self.fail()
+            return
+        try:
+            self.file.clear()
+        except (AttributeError, OSError) as e:
+            log.warning("Failed to clear device: %s", e)
+            self.fail()
+
+    def setIntent(self, intent):
+        self.write_labels = (("intent", intent), ("op", "write"), ("vendor", self.vendor))
+        self.query_labels = (("intent", intent), ("op", "query"), ("vendor", self.vendor))
+        self.hit_labels = (("intent", intent), ("result", "hit"), ("vendor", self.vendor))
+        self.miss_labels = (("intent", intent), ("result", "miss"), ("vendor", self.vendor))
+        self.count_labels = (("intent", intent), ("vendor", self.vendor))
+
+    def write(self, s):
+        # print() writes the text and the line ending separately; send the
+        # command as a whole once the line is complete.
+        self.pending.append(s)
+        if s.endswith("\n"):
+            line = "".join(self.pending)
+            self.pending = []
+            commands = [command.strip() for command in line.split(";") if command.strip()]
+            metrics.increment("ollie_scpi_commands_total", self.count_labels, len(commands))
+            queries = []
+            for command in commands:
+                name, _ = header(command)
+                if name.endswith("?"):
+                    queries.append((name[:-1], command))
+                else:
+                    self.shadow.update(command)
+                    self.command(command + "\n")
+            if queries:
+                self.query(queries)
+        return len(s)
+
+    def query(self, queries):
+        """
+        Send (name, command) queries, or answer them from the shadow. The
+        answers are returned together, separated by `;`, by the next
+        readline().
+        """
+        names = [name for name, _ in queries]
+        values = [self.shadow.get(name) for name in names]
+        missing = []
+        for (name, command), value in zip(queries, values):
+            if value is not None:
+                metrics.increment("ollie_shadow_queries_total", self.hit_labels)
+                continue
+            if self.shadow.caches(name):
+                metrics.increment("ollie_shadow_queries_total", self.miss_labels)
+            missing.append(command)
+
+        if not missing:
+            log.debug("> %s (cached)", joinCommands(command for _, command in queries))
+        elif self.compound or len(missing) == 1:
+            # The answer is needed now, so any batched commands go with it.
+            # The scope answers all the queries in one response.
+            self.send(joinCommands(self.batch + missing) + "\n")
+            self.batch = []
+        else:
+            # Without compound messages every query is a round trip, and a
+            # query sent before the last answer was read would abort it
+            for i, value in enumerate(values):
+                if value is None:
+                    self.send(queries[i][1] + "\n")
+                    values[i] = self.receive().strip()
+                    self.shadow.record(names[i], values[i])
+        self.responses.append((names, values))
+
+    def command(self, line):
+        if not self.batching:
+            self.send(line)
+            return
+        if self.batch and len(joinCommands(self.batch + [line.strip()])) > self.MAX_MESSAGE:
+            self.commit()
+            self.batching = True
+        self.batch.append(line.strip())
+
+    def begin(self):
+        """
+        Start collecting the commands of one intent into a single message.
+        """
+        self.batching = self.compound
+
+    def commit(self):
+        """
+        Send any commands collected since begin().
+        """
+        self.batching = False
+        if self.batch:
+            batch, self.batch = self.batch, []
+            self.send(joinCommands(batch) + "\n")
+
+    def send(self, line):
+        log.debug("> %s", line.rstrip())
+        metrics.increment("ollie_scpi_transfers_total", self.count_labels)
+        start = time.monotonic()
+        try:
+            self.file.write(line)
+        except DeviceTimeout:
+            self.recover()
+            raise
+        except OSError:
+            self.fail()
+            raise
+        self.sent = time.monotonic()
+        metrics.observe("ollie_scpi_seconds", self.write_labels, self.sent - start)
+
+    def refresh(self, name, max_age=None):
+        """
+        Query a setting from the device even if it is in the shadow, and
+        record the response for `max_age` seconds (see Shadow.record).
+        Returns the value last recorded, however old, and the new value.
+        """
+        previous = self.shadow.last(name)
+        self.responses.append(([name], [None]))
+        self.send(name + "?\n")
+        value = self.readline().strip()
+        self.shadow.record(name, value, max_age)
+        return previous, value
+
+    def receive(self):
+        try:
+            line = self.file.readline()
+        except DeviceTimeout:
+            self.recover()
+            raise
+        except OSError:
+            self.fail()
+            raise
+        self.timeouts = 0
+        log.debug("< %s", line.rstrip())
+        if self.sent is not None:
+            metrics.observe("ollie_scpi_seconds", self.query_labels,
+                            time.monotonic() - self.sent)
+            self.sent = None
+        return line
+
+    def readinto(self, b, timeout=None):
+        """
+        Read a binary response, or part of one, straight into `b`; see
+        Transport.readinto.
+        """
+        if self.responses:
+            self.responses.popleft()
+        try:
+            n = self.file.readinto(b, timeout)
+        except DeviceTimeout:
+            self.recover()
+            raise
+        except OSError:
+            self.fail()
+            raise
+        self.timeouts = 0
+        log.debug("< %d bytes", n)
+        if self.sent is not None:
+            metrics.observe("ollie_scpi_seconds", self.query_labels,
+                            time.monotonic() - self.sent)
+            self.sent = None
+        return n
+
+    def readline(self):
+        if not self.responses:
+            return self.receive()
+        names, values = self.responses.popleft()
+        missing = [i for i, value in enumerate(values) if value is None]
+        if missing:
+            line = self.receive()
+            answers = line.strip().split(";")
+            if len(answers) != len(missing):
+                return line  # let the caller fail to parse it
+            for i, answer in zip(missing, answers):
+                values[i] = answer
+                self.shadow.record(names[i], answer)
+        return ";".join(values) + "\n"
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        try:
+            self.file.close()
+        except OSError:
+            pass  # flushing a pending write to a device that is gone
+
+
+def joinCommands(commands):
+    """
+    Join program messages into one compound message.
+
+    After a `;` a header without a leading colon is taken relative to the
+    subsystem of the command before it, so every header is made absolute.
+    """
+    return ";".join(
+        command if command.startswith((":", "*")) else ":" + command
+        for command in commands)
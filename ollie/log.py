@@ -0,0 +1,114 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import collections
+import json
+import logging
+import sys
+import traceback
+
+
+# Attributes every LogRecord has; anything else was passed with extra=
+# and is included as a field when the record is dumped.
+standard_attributes = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message", "asctime",
+}
+
+
+def formatRecord(record):
+    """
+    Render a record as one line of JSON.
+    """
+    event = collections.OrderedDict()
+    event["time"] = record.created
+    event["level"] = record.levelname
+    event["logger"] = record.name
+    event["thread"] = record.threadName
+    event["message"] = record.getMessage()
+    for key, value in vars(record).items():
+        if key not in standard_attributes:
+            event[key] = value
+    if record.exc_info:
+        event["exception"] = "".join(traceback.format_exception(*record.exc_info))
+    return json.dumps(event, default=str)
+
+
+class RingHandler(logging.Handler):
+    """
+    Keeps the most recent log records in memory, unformatted.
+
+    Records are only turned into text when the ring is dumped: on demand
+    over MQTT or SIGUSR1, or automatically to `target` when a record at
+    `dump_level` or above arrives, so the context leading up to an error
+    makes it into the journal without logging every event there.
+    """
+    def __init__(self, capacity, target=None, dump_level=logging.ERROR):
+        super().__init__(logging.DEBUG)
+        self.records = collections.deque(maxlen=capacity)
+        self.target = target
+        self.dump_level = dump_level
+
+    def resize(self, capacity):
+        self.records = collections.deque(self.records, maxlen=capacity)
+
+    def handle(self, record):
+        # Skip the handler lock and filters: deque.append is atomic and
+        # this runs for every debug record on the hot path.
+        self.records.append(record)
+        if record.levelno >= self.dump_level and self.target is not None:
+            self.dump(self.target)
+            self.records.clear()
+        return True
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def dumps(self):
+        return "".join(formatRecord(record) + "\n" for record in list(self.records))
+
+    def dump(self, stream):
+        stream.write(self.dumps())
+        stream.flush()
+
+
+ring = RingHandler(1000)
+
+
+def configure(level=logging.INFO, capacity=1000):
+    """
+    Send records at `level` and above to stderr, and keep the last
+    `capacity` records of any level in the ring.
+    """
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setLevel(level)
+    stream.setFormatter(logging.Formatter("%(levelname)s %(name)s: %(message)s"))
+
+    logger = logging.getLogger("ollie")
+    logger.addHandler(stream)
+    if capacity > 0:
+        ring.resize(capacity)
+        ring.target = sys.stderr
+        logger.addHandler(ring)
+        logger.setLevel(logging.DEBUG)
+    else:
+        # Without a ring, records below `level` are never even created
+        logger.setLevel(level)
+    logger.propagate = False
@@ -0,0 +1,143 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import json
+import threading
+import time
+
+TTS_TOPIC = "hermes/tts/say"
+
+# Values are kept this long, so asking again within about one acquisition
+# doesn't go back to the scope
+TTL = 1.
+
+# Scopes answer 9.9E+37 when a measurement can't be made
+INVALID = 9.9e37
+
+# Custom slot type: Measurement type -> unit it is spoken in
+measurement_units = {
+    "duty cycle": "percent",
+    "fall time": "seconds",
+    "frequency": "hertz",
+    "overshoot": "percent",
+    "period": "seconds",
+    "preshoot": "percent",
+    "rise time": "seconds",
+    "amplitude": "volts",
+    "average": "volts",
+    "base": "volts",
+    "maximum": "volts",
+    "minimum": "volts",
+    "peak to peak": "volts",
+    "top": "volts",
+    "pulse width": "seconds",
+    "negative pulse width": "seconds",
+}
+
+prefixes = [
+    (1e9, "giga"),
+    (1e6, "mega"),
+    (1e3, "kilo"),
+    (1, ""),
+    (1e-3, "milli"),
+    (1e-6, "micro"),
+    (1e-9, "nano"),
+    (1e-12, "pico"),
+]
+
+
+class MeasurementCache:
+    """
+    Recently read measurement values, keyed by device, source and
+    measurement, each valid for `ttl` seconds.
+    """
+    def __init__(self, ttl=TTL):
+        self.ttl = ttl
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if time.monotonic() >= expires:
+                del self.values[key]
+                return None
+            return value
+
+    def put(self, key, value):
+        now = time.monotonic()
+        with self.lock:
+            # Drop expired entries, e.g. for scopes that were unplugged
+            for old in [k for k, (_, expires) in self.values.items() if now >= expires]:
+                del self.values[old]
+            self.values[key] = (value, now + self.ttl)
+
+
+cache = MeasurementCache()
+
+
+def readMeasurement(device, source, measurement, add, query):
+    """
+    Return the value of a measurement, reading it from the scope unless
+    it was read within the last TTL seconds. `add` is the command that
+    shows the measurement on screen and `query` the one that reads it.
+    The measurement is always shown, even when the value is cached, e.g.
+    by a measurement stream that only queries it.
+    """
+    print(add, file=device)
+    key = (device, source, measurement)
+    value = cache.get(key)
+    if value is None:
+        print(query, file=device)
+        value = float(device.readline())
+        cache.put(key, value)
+    return value
+
+
+def spokenValue(value, unit):
+    """
+    Format a value for text to speech, e.g. "1.5 kilohertz".
+    """
+    if unit == "percent" or value == 0:
+        return "{value:.3g} {unit}".format(value=value, unit=unit)
+    for scale, prefix in prefixes:
+        if abs(value) >= scale:
+            break
+    return "{value:.3g} {prefix}{unit}".format(value=value / scale, prefix=prefix, unit=unit)
+
+
+def say(client, payload, text):
+    """
+    Speak `text` on the Snips site the intent came from.
+    """
+    client.publish(TTS_TOPIC, payload=json.dumps(dict(
+        text=text, siteId=payload.get('siteId', "default"))))
+
+
+def speakMeasurement(client, payload, source, measurement, value):
+    if abs(value) >= INVALID:
+        text = "There is no {measurement} on {source}".format(
+            measurement=measurement, source=source)
+    else:
+        text = "The {measurement} on {source} is {value}".format(
+            measurement=measurement, source=source,
+            value=spokenValue(value, measurement_units[measurement]))
+    say(client, payload, text)
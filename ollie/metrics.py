@@ -0,0 +1,221 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import bisect
+import collections
+import logging
+import os
+import threading
+
+
+log = logging.getLogger(__name__)
+
+
+class Histogram:
+    # Upper bounds in seconds; USBTMC round trips are usually a few ms, but
+    # a busy scope can take much longer to answer a query.
+    BUCKETS = (
+        0.0001, 0.00025, 0.0005,
+        0.001, 0.0025, 0.005,
+        0.01, 0.025, 0.05,
+        0.1, 0.25, 0.5,
+        1, 2.5, 5, 10,
+    )
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield "_bucket", (("le", "{:g}".format(bound)),), cumulative
+        yield "_bucket", (("le", "+Inf"),), self.count
+        yield "_sum", (), self.sum
+        yield "_count", (), self.count
+
+
+class Counter:
+    def __init__(self):
+        self.count = 0
+
+    def observe(self, value):
+        self.count += value
+
+    def samples(self):
+        yield "", (), self.count
+
+
+class Metrics:
+    """
+    Process-wide set of metric families.
+
+    Labels are passed as a tuple of (name, value) pairs so the hot path
+    only does a dictionary lookup and a few additions; all formatting is
+    deferred to render().
+    """
+    kinds = {
+        "histogram": Histogram,
+        "counter": Counter,
+    }
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.families = collections.OrderedDict()
+
+    def declare(self, name, kind, help):
+        self.families[name] = (kind, help, {})
+
+    def observe(self, name, labels, value):
+        kind, _, series = self.families[name]
+        with self.lock:
+            metric = series.get(labels)
+            if metric is None:
+                metric = series[labels] = self.kinds[kind]()
+            metric.observe(value)
+
+    def increment(self, name, labels, value=1):
+        self.observe(name, labels, value)
+
+    def render(self):
+        """
+        Format all metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        with self.lock:
+            for name, (kind, help, series) in self.families.items():
+                lines.append("# HELP {name} {help}".format(name=name, help=help))
+                lines.append("# TYPE {name} {kind}".format(name=name, kind=kind))
+                for labels, metric in sorted(series.items()):
+                    for suffix, extra, value in metric.samples():
+                        lines.append("{name}{suffix}{labels} {value}".format(
+                            name=name, suffix=suffix,
+                            labels=formatLabels(labels + extra),
+                            value=formatValue(value)))
+        return "\n".join(lines) + "\n"
+
+
+def formatLabels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(
+        '{key}="{value}"'.format(key=key, value=str(value)
+                                 .replace("\\", "\\\\")
+                                 .replace("\n", "\\n")
+                                 .replace('"', '\\"'))
+        for key, value in labels) + "}"
+
+
+def formatValue(value):
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+class MetricsPublisher:
+    """
+    Periodically publishes the metrics over MQTT and writes them to a
+    text file, e.g. for the node_exporter textfile collector.
+    """
+    TOPIC = "ollie/metrics"
+
+    def __init__(self, client, interval, path=None):
+        self.client = client
+        self.interval = interval
+        self.path = path
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def publish(self):
+        text = metrics.render()
+        self.client.publish(self.TOPIC, payload=text)
+        if self.path is not None:
+            # Write and rename so a scraper never reads a partial file
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as fd:
+                fd.write(text)
+            os.replace(tmp, self.path)
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.publish()
+            except OSError as e:
+                log.warning("Failed to publish metrics: %s", e)
+
+
+metrics = Metrics()
+metrics.declare(
+    "ollie_intent_stage_seconds", "histogram",
+    "Time spent in each stage of handling an intent: receive (paho to "
+    "callback), decode, queue (waiting for the device worker) and handler")
+metrics.declare(
+    "ollie_scpi_seconds", "histogram",
+    "Time to send each SCPI command (op=write) and from sending a query "
+    "to reading its response (op=query)")
+metrics.declare(
+    "ollie_intents_total", "counter",
+    "Intents received, by outcome")
+metrics.declare(
+    "ollie_shadow_queries_total", "counter",
+    "Queries for cached scope settings, answered from memory (result=hit) "
+    "or by the scope (result=miss)")
+metrics.declare(
+    "ollie_sync_total", "counter",
+    "Idle refreshes of the scope settings, by whether a front-panel change "
+    "was found or the refresh was interrupted by an intent")
+metrics.declare(
+    "ollie_scpi_commands_total", "counter",
+    "SCPI commands and queries issued by intent handlers")
+metrics.declare(
+    "ollie_scpi_transfers_total", "counter",
+    "Messages sent to the device; less than ollie_scpi_commands_total when "
+    "commands are batched or answered from the shadow")
+metrics.declare(
+    "ollie_scpi_timeouts_total", "counter",
+    "Reads and writes that missed their deadline")
+metrics.declare(
+    "ollie_stream_samples_total", "counter",
+    "Measurement samples streamed over MQTT (result=published), or dropped "
+    "because an intent arrived while they were being read")
+metrics.declare(
+    "ollie_screenshot_seconds", "histogram",
+    "Time to read a screenshot from the device and write it to disk")
+metrics.declare(
+    "ollie_screenshot_bytes_total", "counter",
+    "Screenshot image data read from the device")
+metrics.declare(
+    "ollie_mqtt_reconnect_seconds", "histogram",
+    "Time from losing the connection to the MQTT broker until reconnected")
+metrics.declare(
+    "ollie_mqtt_redelivered_total", "counter",
+    "Intents the broker held for ollie while it was disconnected, or sent "
+    "again as duplicates, by whether they were handled or dropped as stale")
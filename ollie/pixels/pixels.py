@@ -6,8 +6,6 @@ import time
 import threading
 import queue
 
-from . import apa102
-
 
 class Pixels:
     PIXELS_N = 3
@@ -20,6 +18,8 @@ class Pixels:
         self.basis[7] = 2
 
         self.colors = [0] * 3 * self.PIXELS_N
+        # Imported here so that importing this module doesn't load spidev
+        from . import apa102
         self.dev = apa102.APA102(num_led=self.PIXELS_N)
 
         self.next = threading.Event()
@@ -139,7 +139,24 @@ class Pixels:
         self.dev.show()
 
 
-pixels = Pixels()
+class LazyPixels:
+    """
+    Stands in for a Pixels instance, creating it on first use so that
+    importing this module does not open SPI or start a thread.
+    """
+    def __init__(self):
+        self._pixels = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if self._pixels is None:
+            with self._lock:
+                if self._pixels is None:
+                    self._pixels = Pixels()
+        return getattr(self._pixels, name)
+
+
+pixels = LazyPixels()
 
 
 if __name__ == '__main__':
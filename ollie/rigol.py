@@ -16,6 +16,17 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+from . import waveform
+from .measure import readMeasurement, speakMeasurement
+from .scpi import queryValues
+from .screenshot import saveScreenshot
+from .slots import intent
+from .zoom import ladder, snapLevel, zoomLevel
+
+
+# Compound messages are not documented for the DS1000Z parser, so each
+# command is sent on its own.
+compound_commands = False
 
 # Custom slot type: Measurement source
 measurement_sources = {
@@ -42,6 +53,12 @@ measurement_sources = {
     "function": "MATH",
 }
 
+# Sources :WAVEFORM:DATA? can read
+waveform_sources = {
+    name: source for name, source in measurement_sources.items()
+    if source.startswith(("CHANNEL", "MATH"))
+}
+
 display_sources = {
     "channel one": "CHANNEL1",
     "channel two": "CHANNEL2",
@@ -134,51 +151,26 @@ trigger_slopes = {
     "either": "RFAL",
 }
 
+# Timebase reference -> divisions the trigger point is moved from the
+# center, by way of the horizontal offset
+timebase_references = {
+    "left": 4,
+    "center": 0,
+    "right": -4,
+}
+
 # Based on the range possible on the DS 7054
 # < 500 ps and > 1000s are invalid, but included as sentinel values when the
 # control is currently at an extreme. Trying to bump to an invalid value
 # will give a visual error indication on the oscilloscope screen, much
 # like continuing to turn the knob.
-horizontal_zoom_levels = [
-    100e-12, 200e-12, 500e-12,
-    1e-9,    2e-9,    5e-9,
-    10e-9,   20e-9,   50e-9,
-    100e-9,  200e-9,  500e-9,
-    1e-6,    2e-6,    5e-6,
-    10e-6,   20e-6,   50e-6,
-    100e-6,  200e-6,  500e-6,
-    1e-3,    2e-3,    5e-3,
-    10e-3,   20e-3,   50e-3,
-    100e-3,  200e-3,  500e-3,
-    1,       2,       5,
-    10,      20,      50,
-    100,     200,     500,
-    1000,    2000,    5000,
-]
+horizontal_zoom_levels = ladder(100e-12, 5000)
 
 # Based on range possible on the DS 1054
-vertical_zoom_levels = [
-    100e-6,  200e-6,  500e-6,
-    1e-3,    2e-3,    5e-3,
-    10e-3,   20e-3,   50e-3,
-    100e-3,  200e-3,  500e-3,
-    1,       2,       5,
-    10,      20,      50,
-]
-
-
-def expectSlots(payload, expected):
-    if len(payload['slots']) != expected:
-        raise RuntimeError(
-            "Expected {expected} slot{s} to {intent}, got {actual}".format(
-                expected=expected,
-                s="s" if expected != 1 else "",
-                intent=payload['intent']['intentName'],
-                actual=len(payload['slots']),
-            )
-        )
+vertical_zoom_levels = ladder(100e-6, 50)
 
 
+@intent("runCapture")
 def onRunCapture(client, device, payload):
     """
     Snips intent name: runCapture
@@ -188,6 +180,7 @@ def onRunCapture(client, device, payload):
     print(":RUN", file=device)
 
 
+@intent("stopCapture")
 def onStopCapture(client, device, payload):
     """
     Snips intent name: stopCapture
@@ -197,6 +190,7 @@ def onStopCapture(client, device, payload):
     print(":STOP", file=device)
 
 
+@intent("singleCapture")
 def onSingleCapture(client, device, payload):
     """
     Snips intent name: singleCapture
@@ -206,33 +200,30 @@ def onSingleCapture(client, device, payload):
     print(":SINGLE", file=device)
 
 
-def onShowChannel(client, device, payload):
+@intent("showChannel")
+def onShowChannel(client, device, payload, source):
     """
     Snips intent name: showChannel
 
     Slots:
     source: custom/Measurement source
     """
-    expectSlots(payload, 1)
-    value = payload['slots'][0]['value']['value']
-    source = display_sources[value]
     print(":{source}:DISPLAY ON".format(source=source), file=device)
 
 
-def onHideChannel(client, device, payload):
+@intent("hideChannel")
+def onHideChannel(client, device, payload, source):
     """
     Snips intent name: hideChannel
 
     Slots:
     source: custom/Measurement source
     """
-    expectSlots(payload, 1)
-    value = payload['slots'][0]['value']['value']
-    source = display_sources[value]
     print(":{source}:DISPLAY OFF".format(source=source), file=device)
 
 
-def onSetTimebaseScale(client, device, payload):
+@intent("setTimeBaseScale")
+def onSetTimebaseScale(client, device, payload, scale, units):
     """
     Snips intent name: setTimebaseScale
 
@@ -240,35 +231,27 @@ def onSetTimebaseScale(client, device, payload):
     scale: snips/number
     units: custom/Time units
     """
-    expectSlots(payload, 2)
-    for slot in payload['slots']:
-        if slot['slotName'] == "scale":
-            scale_mantissa = int(slot['value']['value'])
-        if slot['slotName'] == "units":
-            scale_exp = time_units[slot['value']['value']]
-    print(":TIMEBASE:SCALE {scale:G}".format(scale=scale_mantissa * scale_exp), file=device)
+    # The main timebase only takes 1-2-5 steps; the scope would round an
+    # in-between value anyway, so send the value it will end up with.
+    scale = snapLevel(horizontal_zoom_levels, scale * units)
+    print(":TIMEBASE:SCALE {scale:G}".format(scale=scale), file=device)
 
 
-def onSetTimebaseReference(client, device, payload):
+@intent("setTimebaseReference")
+def onSetTimebaseReference(client, device, payload, reference):
     """
     Snips intent name: setTimebaseReference
 
     Slots:
     reference: snips/default
     """
-    expectSlots(payload, 1)
-    value = payload['slots'][0]['value']['value']
     print(":TIMEBASE:SCALE?", file=device)
     scale = float(device.readline())
-    if value == "left":
-        print(":TIMEBASE:OFFSET {offset:G}".format(offset=4 * scale), file=device)
-    if value == "center":
-        print(":TIMEBASE:OFFSET 0", file=device)
-    if value == "right":
-        print(":TIMEBASE:OFFSET {offset:G}".format(offset=-4 * scale), file=device)
+    print(":TIMEBASE:OFFSET {offset:G}".format(offset=reference * scale), file=device)
 
 
-def onSetChannelVerticalScale(client, device, payload):
+@intent("setChannelVerticalScale")
+def onSetChannelVerticalScale(client, device, payload, channel, scale, units):
     """
     Snips intent name: setChannelVerticalScale
 
@@ -277,14 +260,7 @@ def onSetChannelVerticalScale(client, device, payload):
     scale: snips/number
     units: custom/Vertical units
     """
-    expectSlots(payload, 3)
-    for slot in payload['slots']:
-        if slot['slotName'] == "channel":
-            channel = int(slot['value']['value'])
-        if slot['slotName'] == "scale":
-            scale = float(slot['value']['value'])
-        if slot['slotName'] == "units":
-            unit_type, exp = vertical_units[slot['value']['value']]
+    unit_type, exp = units
     if unit_type == "voltage":
         print(":CHANNEL{n}:UNITS VOLTAGE".format(n=channel), file=device)
     else:
@@ -292,23 +268,25 @@ def onSetChannelVerticalScale(client, device, payload):
     print(":CHANNEL{n}:SCALE {scale:G}".format(n=channel, scale=scale * exp), file=device)
 
 
-def onMeasure(client, device, payload):
+@intent("measure")
+def onMeasure(client, device, payload, source, spoken_source, subcommand, measurement):
     """
     Snips intent name: measure
 
     Slots:
     source: custom/Measurement source
     type: custom/Measurement type
+
+    Adds the measurement to the screen and speaks its value.
     """
-    expectSlots(payload, 2)
-    for slot in payload['slots']:
-        if slot['slotName'] == "type":
-            subcommand = measurement_commands[slot['value']['value']]
-        if slot['slotName'] == "source":
-            source = measurement_sources[slot['value']['value']]
-    print(":MEASURE:ITEM {cmd},{source}".format(cmd=subcommand, source=source), file=device)
+    value = readMeasurement(
+        device, source, subcommand,
+        ":MEASURE:ITEM {cmd},{source}".format(cmd=subcommand, source=source),
+        ":MEASURE:ITEM? {cmd},{source}".format(cmd=subcommand, source=source))
+    speakMeasurement(client, payload, spoken_source, measurement, value)
 
 
+@intent("clearAllMeasurements")
 def onClearAllMeasurements(client, device, payload):
     """
     Snips intent name: clearAllMeasurements
@@ -318,43 +296,43 @@ def onClearAllMeasurements(client, device, payload):
     print(":MEASURE:CLEAR ALL", file=device)
 
 
-def onSetTriggerSlope(client, device, payload):
+@intent("setTriggerSlope")
+def onSetTriggerSlope(client, device, payload, slope):
     """
     Snips intent name: setTriggerSlope
 
     Slots:
     slope: custom/Trigger slope
     """
-    expectSlots(payload, 1)
-    value = payload['slots'][0]['value']['value']
-    slope = trigger_slopes[value]
     print(":TRIGGER:EDGE:SLOPE {slope}".format(slope=slope), file=device)
 
 
-def onSetTriggerSource(client, device, payload):
+@intent("setTriggerSource")
+def onSetTriggerSource(client, device, payload, source):
     """
     Snips intent name: setTriggerSource
 
     Slots:
     source: custom/Trigger source
     """
-    expectSlots(payload, 1)
-    value = payload['slots'][0]['value']['value']
-    source = trigger_sources[value]
     print(":TRIGGER:EDGE:SOURCE {source}".format(source=source), file=device)
 
 
+@intent("saveImage")
 def onSaveImage(client, device, payload):
     """
     Snips intent name: saveImage
 
     Slots: none
+
+    Reads the screen over USB into a file on the Pi; see saveScreenshot.
     """
-    # There's no command to save image data to USB storage.
-    raise RuntimeError("Operation not supported on Rigol")
+    # Color, without inverting, as PNG
+    saveScreenshot(client, device, ":DISPLAY:DATA? ON,OFF,PNG")
 
 
-def onSetProbeCoupling(client, device, payload):
+@intent("setProbeCoupling")
+def onSetProbeCoupling(client, device, payload, channel, coupling):
     """
     Snips intent name: setProbeCoupling
 
@@ -362,17 +340,12 @@ def onSetProbeCoupling(client, device, payload):
     channel: snips/number
     coupling: custom/coupling
     """
-    expectSlots(payload, 2)
-    for slot in payload['slots']:
-        if slot['slotName'] == "channel":
-            channel = int(slot['value']['value'])
-        if slot['slotName'] == "coupling":
-            coupling = slot['value']['value']
     print(":CHANNEL{n}:COUPLING {coupling}".format(
         n=channel, coupling=coupling), file=device)
 
 
-def onSetProbeAttenuation(client, device, payload):
+@intent("setProbeAttenuation")
+def onSetProbeAttenuation(client, device, payload, channel, ratio):
     """
     Snips intent name: setProbeAttenuation
 
@@ -380,16 +353,11 @@ def onSetProbeAttenuation(client, device, payload):
     channel: snips/number
     ratio: snips/number
     """
-    expectSlots(payload, 2)
-    for slot in payload['slots']:
-        if slot['slotName'] == "channel":
-            channel = int(slot['value']['value'])
-        if slot['slotName'] == "ratio":
-            ratio = float(slot['value']['value'])
     print(":CHANNEL{n}:PROBE {ratio:G}".format(
         n=channel, ratio=ratio), file=device)
 
 
+@intent("autoScale")
 def onAutoScale(client, device, payload):
     """
     Snips intent name: autoScale
@@ -399,6 +367,7 @@ def onAutoScale(client, device, payload):
     print(":AUTOSCALE", file=device)
 
 
+@intent("defaultSetup")
 def onDefaultSetup(client, device, payload):
     """
     Snips intent name: defaultSetup
@@ -408,68 +377,118 @@ def onDefaultSetup(client, device, payload):
     print("*RST", file=device)
 
 
-def onIncreaseTimebase(client, device, payload):
+def stepTimebase(client, device, steps):
     """
-    Snips intent name: increaseTimebase
-
-    Slots: none
+    Move the timebase by a number of zoom levels; positive zooms out.
+    Consecutive increase/decreaseTimebase intents are coalesced into a
+    single call.
     """
     print(":TIMEBASE:SCALE?", file=device)
     scale = float(device.readline())
-    new_scale = next(x for x in horizontal_zoom_levels if scale < x)
+    new_scale = zoomLevel(horizontal_zoom_levels, scale, steps)
     print(":TIMEBASE:SCALE {scale:G}".format(scale=new_scale), file=device)
 
 
-def onDecreaseTimebase(client, device, payload):
+def scaleTimebase(client, device, factor):
     """
-    Snips intent name: decreaseTimebase
-
-    Slots: none
+    Multiply the timebase by a factor, snapped to the nearest zoom level.
     """
     print(":TIMEBASE:SCALE?", file=device)
     scale = float(device.readline())
-    new_scale = next(x for x in reversed(horizontal_zoom_levels) if scale > x)
+    new_scale = snapLevel(horizontal_zoom_levels, scale * factor)
     print(":TIMEBASE:SCALE {scale:G}".format(scale=new_scale), file=device)
 
 
-def onIncreaseVerticalScale(client, device, payload):
+def stepVerticalScale(client, device, channel, steps):
+    """
+    Move a channel's vertical scale by a number of zoom levels; positive
+    zooms out. Consecutive increase/decreaseVerticalScale intents for the
+    same channel are coalesced into a single call.
+    """
+    scale, ratio = queryValues(device, ":CHANNEL{n}:SCALE?".format(n=channel),
+                               ":CHANNEL{n}:PROBE?".format(n=channel))
+    new_scale = ratio * zoomLevel(vertical_zoom_levels, scale/ratio, steps)
+    print(":CHANNEL{n}:SCALE {scale:G}".format(
+        n=channel, scale=new_scale), file=device)
+
+
+def scaleVerticalScale(client, device, channel, factor):
+    """
+    Multiply a channel's vertical scale by a factor, snapped to the
+    nearest zoom level.
+    """
+    scale, ratio = queryValues(device, ":CHANNEL{n}:SCALE?".format(n=channel),
+                               ":CHANNEL{n}:PROBE?".format(n=channel))
+    new_scale = ratio * snapLevel(vertical_zoom_levels, scale/ratio * factor)
+    print(":CHANNEL{n}:SCALE {scale:G}".format(
+        n=channel, scale=new_scale), file=device)
+
+
+def zoomTimebase(client, device, steps, factor, direction):
+    if factor is not None:
+        scaleTimebase(client, device, factor ** direction)
+    else:
+        stepTimebase(client, device, steps * direction)
+
+
+def zoomVerticalScale(client, device, channel, steps, factor, direction):
+    if factor is not None:
+        scaleVerticalScale(client, device, channel, factor ** direction)
+    else:
+        stepVerticalScale(client, device, channel, steps * direction)
+
+
+@intent("increaseTimebase")
+def onIncreaseTimebase(client, device, payload, steps, factor):
+    """
+    Snips intent name: increaseTimebase
+
+    Slots:
+    steps: snips/number (optional)
+    factor: snips/number (optional)
+    """
+    zoomTimebase(client, device, steps, factor, 1)
+
+
+@intent("decreaseTimebase")
+def onDecreaseTimebase(client, device, payload, steps, factor):
+    """
+    Snips intent name: decreaseTimebase
+
+    Slots:
+    steps: snips/number (optional)
+    factor: snips/number (optional)
+    """
+    zoomTimebase(client, device, steps, factor, -1)
+
+
+@intent("increaseVerticalScale")
+def onIncreaseVerticalScale(client, device, payload, channel, steps, factor):
     """
     Snips intent name: increaseVerticalScale
 
     Slots:
     channel: snips/number
+    steps: snips/number (optional)
+    factor: snips/number (optional)
     """
-    expectSlots(payload, 1)
-    channel = int(payload['slots'][0]['value']['value'])
-    print(":CHANNEL{n}:SCALE?".format(n=channel), file=device)
-    scale = float(device.readline())
-    print(":CHANNEL{n}:PROBE?".format(n=channel), file=device)
-    ratio = float(device.readline())
-    new_scale = ratio * \
-        next(x for x in vertical_zoom_levels if scale/ratio < x)
-    print(":CHANNEL{n}:SCALE {scale:G}".format(
-        n=channel, scale=new_scale), file=device)
+    zoomVerticalScale(client, device, channel, steps, factor, 1)
 
 
-def onDecreaseVerticalScale(client, device, payload):
+@intent("decreaseVerticalScale")
+def onDecreaseVerticalScale(client, device, payload, channel, steps, factor):
     """
     Snips intent name: decreaseVerticalScale
 
     Slots:
     channel: snips/number
+    steps: snips/number (optional)
+    factor: snips/number (optional)
     """
-    expectSlots(payload, 1)
-    channel = int(payload['slots'][0]['value']['value'])
-    print(":CHANNEL{n}:SCALE?".format(n=channel), file=device)
-    scale = float(device.readline())
-    print(":CHANNEL{n}:PROBE?".format(n=channel), file=device)
-    ratio = float(device.readline())
-    new_scale = ratio * \
-        next(x for x in reversed(vertical_zoom_levels) if scale/ratio > x)
-    print(":CHANNEL{n}:SCALE {scale:G}".format(
-        n=channel, scale=new_scale), file=device)
+    zoomVerticalScale(client, device, channel, steps, factor, -1)
 
 
+@intent("forceTrigger")
 def onForceTrigger(client, device, payload):
     """
     Snips intent name: forceTrigger
@@ -479,30 +498,24 @@ def onForceTrigger(client, device, payload):
     print(":TFORCE", file=device)
 
 
-def onSetTriggerLevel(client, device, payload):
+@intent("setTriggerLevel")
+def onSetTriggerLevel(client, device, payload, source, level, units):
     """
     Snips intent name: setTriggerLevel
 
     Slots:
-    source: custom/Trigger source
+    source: custom/Trigger source (optional)
     level: snips/number
-    units: custom/Vertical units
+    units: custom/Vertical units (optional)
     """
-    level, exp = None, None
-    for slot in payload['slots']:
-        if slot['slotName'] == "source":
-            raise RuntimeError("Operation not supported on Rigol")
-        if slot['slotName'] == "level":
-            level = float(slot['value']['value'])
-        if slot['slotName'] == "units":
-            _, exp = vertical_units[slot['value']['value']]
-    if level is None:
-        raise RuntimeError("Expected slot level in intent setTriggerLevel")
-    if exp is not None:
-        level *= exp
+    if source is not None:
+        raise RuntimeError("Operation not supported on Rigol")
+    if units is not None:
+        level *= units[1]
     print(":TRIGGER:EDGE:LEVEL {level:G}".format(level=level), file=device)
 
 
+@intent("autoTriggerLevels")
 def onAutoTriggerLevels(client, device, payload):
     """
     Snips intent name: autoTriggerLevels
@@ -512,20 +525,20 @@ def onAutoTriggerLevels(client, device, payload):
     raise RuntimeError("Operation not supported on Rigol")
 
 
-def onSetTriggerCoupling(client, device, payload):
+@intent("setTriggerCoupling")
+def onSetTriggerCoupling(client, device, payload, coupling):
     """
     Snips intent name: setTriggerCoupling
 
     Slots:
     coupling: custom/coupling
     """
-    expectSlots(payload, 1)
-    coupling = payload['slots'][0]['value']['value']
     print(":TRIGGER:COUPLING {coupling}".format(
         coupling=coupling), file=device)
 
 
-def onSetTriggerHoldoff(client, device, payload):
+@intent("setTriggerHoldoff")
+def onSetTriggerHoldoff(client, device, payload, holdoff, units):
     """
     Snips intent name: setTriggerHoldoff
 
@@ -533,23 +546,44 @@ def onSetTriggerHoldoff(client, device, payload):
     holdoff: snips/number
     units: custom/Time units
     """
-    expectSlots(payload, 2)
-    for slot in payload['slots']:
-        if slot['slotName'] == "holdoff":
-            holdoff = int(slot['value']['value'])
-        if slot['slotName'] == "units":
-            exp = time_units[slot['value']['value']]
     print(":TRIGGER:HOLDOFF {holdoff:G}".format(
-        holdoff=holdoff * exp), file=device)
+        holdoff=holdoff * units), file=device)
 
 
-def onSetTriggerSweepMode(client, device, payload):
+@intent("setTriggerSweepMode")
+def onSetTriggerSweepMode(client, device, payload, mode):
     """
     Snips intent name: setTriggerSweepMode
 
     Slots:
     mode: snips/default
     """
-    expectSlots(payload, 1)
-    mode = payload['slots'][0]['value']['value'].upper()
     print(":TRIGGER:SWEEP {mode}".format(mode=mode), file=device)
+
+
+def captureWaveform(client, device, source, timeout=None):
+    """
+    Read the waveform on screen for a channel or the math function.
+    `source` is a spoken source name or its SCPI name. Returns a
+    waveform.Waveform whose values are in volts (or amps).
+    """
+    source = waveform.waveformSource(waveform_sources, source)
+    print(":WAVEFORM:SOURCE {source}".format(source=source), file=device)
+    print(":WAVEFORM:MODE NORMAL", file=device)
+    print(":WAVEFORM:FORMAT BYTE", file=device)
+    preamble = waveform.readPreamble(device)
+    print(":WAVEFORM:DATA?", file=device)
+    data = waveform.readBlock(device, timeout)
+    values = (waveform.counts(data) - preamble.yorigin - preamble.yreference) \
+        * preamble.yincrement
+    return waveform.Waveform(source, preamble, values)
+
+
+def queryMeasurements(device, measurements):
+    """
+    Read several measurements, given as (source, measurement) SCPI names.
+    Returns their values in order.
+    """
+    return queryValues(device, *[
+        ":MEASURE:ITEM? {cmd},{source}".format(cmd=subcommand, source=source)
+        for source, subcommand in measurements])
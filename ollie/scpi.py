@@ -0,0 +1,36 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+def queryValues(device, *queries, convert=float):
+    """
+    Send several queries as one message and return the answers, converted
+    with `convert`, e.g.
+
+        scale, ratio = queryValues(device, ":CHANNEL1:SCALE?", ":CHANNEL1:PROBE?")
+
+    The scope answers a compound query with one `;`-separated line, so the
+    values cost a single round trip (or none, if the link has them all).
+    """
+    print(";".join(queries), file=device)
+    line = device.readline()
+    answers = line.strip().split(";")
+    if len(answers) != len(queries):
+        raise RuntimeError("Expected {n} answers to {queries}, got {line!r}".format(
+            n=len(queries), queries=";".join(queries), line=line))
+    return [convert(answer) for answer in answers]
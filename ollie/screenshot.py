@@ -0,0 +1,125 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import base64
+import io
+import json
+import logging
+import os
+import time
+
+from .metrics import metrics
+from .waveform import readBlockLength, readExactly
+
+log = logging.getLogger(__name__)
+
+TOPIC = "ollie/screenshot"
+
+# Where screenshots are written; set from --image-dir. systemd names the
+# service's state directory (StateDirectory= in ollie.service).
+DIRECTORY = os.environ.get("STATE_DIRECTORY", "/var/lib/ollie")
+directory = DIRECTORY
+
+# Bytes copied from the device to the file at a time
+CHUNK = 64 * 1024
+
+# Drawing the screen and compressing it takes the scope a few seconds,
+# longer than any other query
+TIMEOUT = 10.
+
+# Largest thumbnail published, in pixels
+THUMBNAIL_SIZE = (160, 96)
+
+
+def copyBlock(device, fd, timeout=None, chunk=CHUNK):
+    """
+    Copy an IEEE 488.2 definite length block from the device to the file
+    `fd`, `chunk` bytes at a time through the device's reusable buffer, so
+    the whole block is never held in memory. Returns its length.
+    """
+    length = readBlockLength(device, timeout)
+    buffer = device.buffer
+    if len(buffer) < chunk:
+        buffer.extend(bytes(chunk - len(buffer)))
+    view = memoryview(buffer)[:chunk]
+    remaining = length
+    while remaining:
+        n = min(chunk, remaining)
+        readExactly(device, view[:n], timeout)
+        fd.write(view[:n])
+        remaining -= n
+    # Followed by the message terminator
+    readExactly(device, bytearray(1), timeout)
+    return length
+
+
+def thumbnail(path, size=THUMBNAIL_SIZE):
+    """
+    Return a downscaled PNG copy of the image at `path`, or None if
+    Pillow isn't installed.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        log.debug("Pillow is not installed, no thumbnail")
+        return None
+    with Image.open(path) as image:
+        image.thumbnail(size)
+        out = io.BytesIO()
+        image.save(out, "PNG")
+    return out.getvalue()
+
+
+def saveScreenshot(client, device, query, timeout=TIMEOUT):
+    """
+    Send `query`, which asks the scope for a PNG of its screen, and stream
+    the image into a new file in `directory`. Publishes the file name,
+    the size and time of the transfer and a base64 thumbnail on TOPIC.
+    Returns the path of the file.
+    """
+    os.makedirs(directory, exist_ok=True)
+    now = time.time()
+    path = os.path.join(directory, "{vendor}-{time}{ms:03d}.png".format(
+        vendor=device.vendor, time=time.strftime("%Y%m%d-%H%M%S", time.localtime(now)),
+        ms=int(now * 1000) % 1000))
+    # Written under a temporary name so a half-read image never appears
+    partial = path + ".part"
+    start = time.monotonic()
+    print(query, file=device)
+    try:
+        with open(partial, "wb") as fd:
+            length = copyBlock(device, fd, timeout)
+        os.replace(partial, path)
+    except BaseException:
+        try:
+            os.unlink(partial)
+        except OSError:
+            pass
+        raise
+    seconds = time.monotonic() - start
+    labels = (("vendor", device.vendor),)
+    metrics.observe("ollie_screenshot_seconds", labels, seconds)
+    metrics.increment("ollie_screenshot_bytes_total", labels, length)
+    log.info("Saved %s: %d bytes in %.3f s", path, length, seconds)
+
+    image = thumbnail(path)
+    client.publish(TOPIC, payload=json.dumps(dict(
+        path=path, bytes=length, seconds=round(seconds, 3),
+        thumbnail=base64.b64encode(image).decode("ascii") if image else None)))
+    return path
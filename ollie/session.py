@@ -0,0 +1,152 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+import random
+import threading
+import time
+
+from .metrics import metrics
+
+log = logging.getLogger(__name__)
+
+
+class Backoff:
+    """
+    Exponential backoff with jitter: each delay is between half and all
+    of `initial` doubled once per failed attempt, up to `maximum`. The
+    jitter keeps several clients from retrying in lockstep when the
+    broker they all lost comes back.
+    """
+    def __init__(self, initial=0.5, maximum=30., random=random.random):
+        self.initial = initial
+        self.maximum = maximum
+        self.random = random
+        self.reset()
+
+    def reset(self):
+        self.attempts = 0
+
+    def next(self):
+        delay = min(self.maximum, self.initial * 2 ** self.attempts)
+        self.attempts += 1
+        return delay / 2 * (1 + self.random())
+
+
+class Session:
+    """
+    Keeps ollie connected to the MQTT broker, in place of paho's
+    loop_forever().
+
+    The client is meant to have a stable client id and a persistent
+    session (clean_session=False) with the intents subscribed at QoS 1,
+    so the broker holds on to intents while ollie is disconnected and
+    delivers them once it is back. When the connection is lost, or the
+    first connection fails, it is retried with a jittered Backoff until
+    it succeeds or stop() is called.
+
+    connected() is called from on_connect. It records how long the
+    reconnect took. If the broker kept the session, the intents it held
+    arrive straight away, so intents received for the next
+    REDELIVERY_WINDOW seconds are taken to be redelivered, along with any
+    the broker marks as duplicates; see accept(). paho can't tell a held
+    message from a new one, so an intent spoken just as ollie reconnects
+    is counted as redelivered too.
+
+    Intents held over a short outage are handled. After an outage longer
+    than MAX_OUTAGE, or when ollie itself was restarted and the broker
+    still had its session, the user has long stopped waiting: acting on
+    them hours late could reset or autoscale a scope in use, so they are
+    logged and dropped. Duplicate deliveries of one intent are dropped by
+    the intent queue, by session id.
+    """
+    # Seconds paho waits for network traffic in each loop() call
+    LOOP_TIMEOUT = 1.
+    REDELIVERY_WINDOW = 1.
+    MAX_OUTAGE = 10.
+
+    def __init__(self, backoff=None, clock=time.monotonic):
+        self.backoff = backoff or Backoff()
+        self.clock = clock
+        self.first = True
+        self.lost = None
+        self.redelivering = 0.
+        self.stale = False
+        self.stopped = False
+        self.wakeup = threading.Event()
+
+    def connected(self, session_present):
+        now = self.clock()
+        self.backoff.reset()
+        if self.lost is not None:
+            outage = now - self.lost
+            metrics.observe("ollie_mqtt_reconnect_seconds", (), outage)
+            log.info("Reconnected to MQTT after %.1f s", outage)
+            self.stale = outage > self.MAX_OUTAGE
+        else:
+            # On the first connection the outage is however long ollie
+            # was not running
+            self.stale = self.first
+        self.first = False
+        self.lost = None
+        if session_present:
+            self.redelivering = now + self.REDELIVERY_WINDOW
+
+    def accept(self, msg):
+        """
+        Whether to handle an intent message. Intents held by the broker
+        while ollie was disconnected, or sent a second time, are counted,
+        and dropped if they are stale.
+        """
+        held = self.clock() < self.redelivering
+        if not (held or getattr(msg, "dup", False)):
+            return True
+        if held and self.stale:
+            metrics.increment("ollie_mqtt_redelivered_total", (("action", "dropped"),))
+            log.warning("Dropping %s held by the broker since before ollie "
+                        "reconnected", msg.topic)
+            return False
+        metrics.increment("ollie_mqtt_redelivered_total", (("action", "handled"),))
+        log.info("Redelivered %s", msg.topic)
+        return True
+
+    def run(self, client, host, port, keepalive=60):
+        """
+        Connect, then handle network traffic until stop() is called.
+        """
+        connect = lambda: client.connect(host, port, keepalive)
+        while not self.stopped:
+            try:
+                connect()
+            except OSError as e:
+                log.warning("Failed to connect to MQTT broker %s:%d: %s", host, port, e)
+            else:
+                # Later attempts resume the same session
+                connect = client.reconnect
+                while not self.stopped and client.loop(self.LOOP_TIMEOUT) == 0:
+                    pass
+                if self.stopped:
+                    break
+                if self.lost is None:
+                    self.lost = self.clock()
+                    log.warning("Lost connection to MQTT broker")
+            self.wakeup.wait(self.backoff.next())
+
+    def stop(self):
+        self.stopped = True
+        self.wakeup.set()
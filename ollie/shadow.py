@@ -0,0 +1,120 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import re
+import threading
+import time
+
+# Settings whose value ollie keeps a copy of. Each is recorded whenever
+# ollie sets or queries it, so later relative intents (zoom in, zoom out)
+# can compute the next value without a query round trip.
+cached_settings = re.compile(r":(TIMEBASE:SCALE|CHANNEL\d+:(SCALE|PROBE))$")
+
+# Commands after which nothing ollie knows about the scope can be trusted
+resets = re.compile(r"(\*RST|\*RCL|:AUTOSCALE|:SYSTEM:PRESET|:SYSTEM:SETUP|:RECALL:.*)$")
+
+# Setting -> settings the scope changes along with it. Changing the probe
+# ratio rescales the channel, since the scale is in units at the probe tip.
+dependents = [
+    (re.compile(r":CHANNEL(\d+):PROBE$"), ":CHANNEL{0}:SCALE"),
+    (re.compile(r":CHANNEL(\d+):UNITS$"), ":CHANNEL{0}:SCALE"),
+]
+
+
+def header(command):
+    """
+    Split a program message into its normalized header and its argument.
+    """
+    name, _, argument = command.strip().partition(" ")
+    name = name.upper()
+    if not name.startswith((":", "*")):
+        name = ":" + name
+    return name, argument.strip()
+
+
+class Shadow:
+    """
+    Write-through copy of scope settings.
+
+    The scope is still the authority: the copy is dropped after commands
+    that reset or reconfigure the scope, and by invalidate() when a
+    front-panel change is detected or the link is reopened. A value is
+    only used for MAX_AGE seconds after it was recorded, long enough for
+    a run of spoken zoom commands; after that the knob may have been
+    turned, and the setting is queried again. Values are recorded as
+    sent, so a setting the scope rejects or rounds stays wrong until it
+    expires or is invalidated.
+    """
+    MAX_AGE = 2.
+
+    def __init__(self, max_age=MAX_AGE, clock=time.monotonic):
+        self.max_age = max_age
+        self.clock = clock
+        # name -> (value, time it stops being used)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def caches(self, name):
+        return cached_settings.match(name) is not None
+
+    def get(self, name):
+        value, expires = self.values.get(name, (None, None))
+        if value is None or self.clock() > expires:
+            return None
+        return value
+
+    def last(self, name):
+        """
+        The value last recorded for a setting, however old, or None.
+        """
+        return self.values.get(name, (None, None))[0]
+
+    def record(self, name, value, max_age=None):
+        """
+        Remember the value of a setting that was just set or queried, for
+        `max_age` seconds (by default MAX_AGE).
+        """
+        if self.caches(name):
+            if max_age is None:
+                max_age = self.max_age
+            with self.lock:
+                self.values[name] = (value, self.clock() + max_age)
+
+    def update(self, command):
+        """
+        Apply a command that was sent to the scope.
+        """
+        name, argument = header(command)
+        if resets.match(name):
+            self.invalidate()
+            return
+        for pattern, dependent in dependents:
+            match = pattern.match(name)
+            if match:
+                with self.lock:
+                    self.values.pop(dependent.format(*match.groups()), None)
+        if argument:
+            self.record(name, argument)
+
+    def names(self):
+        with self.lock:
+            return sorted(self.values)
+
+    def invalidate(self):
+        with self.lock:
+            self.values.clear()
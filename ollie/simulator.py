@@ -0,0 +1,420 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import argparse
+import collections
+import os
+import re
+import select
+import socket
+import struct
+import threading
+import time
+import tty
+import zlib
+
+# *IDN? answers; the manufacturer prefix picks the vendor module
+idents = {
+    "keysight": "KEYSIGHT TECHNOLOGIES,DSO-X 3024T,MY00000001,07.20.2017102615",
+    "rigol": "RIGOL TECHNOLOGIES,DS1054Z,DS1ZA000000001,00.04.04.SP3",
+}
+
+# How each vendor formats numbers in responses
+number_formats = {
+    "keysight": "{:+.5E}",
+    "rigol": "{:.6e}",
+}
+
+# Settings after *RST, by header. Settings without a default are
+# undefined headers, except for the :DISPLAY state of any source.
+defaults = {
+    ":TIMEBASE:SCALE": "1e-3",
+    ":TIMEBASE:OFFSET": "0",
+    ":TIMEBASE:REFERENCE": "CENTER",
+    ":TRIGGER:SOURCE": "CHANNEL1",
+    ":TRIGGER:SLOPE": "POSITIVE",
+    ":TRIGGER:LEVEL": "0",
+    ":TRIGGER:EDGE:SOURCE": "CHANNEL1",
+    ":TRIGGER:EDGE:SLOPE": "POSITIVE",
+    ":TRIGGER:EDGE:LEVEL": "0",
+    ":TRIGGER:COUPLING": "DC",
+    ":TRIGGER:HOLDOFF": "1e-7",
+    ":TRIGGER:SWEEP": "AUTO",
+    ":WAVEFORM:SOURCE": "CHANNEL1",
+    ":WAVEFORM:FORMAT": "BYTE",
+    ":WAVEFORM:UNSIGNED": "1",
+    ":WAVEFORM:MODE": "NORMAL",
+}
+for n in range(1, 5):
+    defaults.update({
+        ":CHANNEL{n}:SCALE".format(n=n): "1",
+        ":CHANNEL{n}:PROBE".format(n=n): "10",
+        ":CHANNEL{n}:COUPLING".format(n=n): "DC",
+        ":CHANNEL{n}:UNITS".format(n=n): "VOLT",
+        ":CHANNEL{n}:DISPLAY".format(n=n): "1" if n == 1 else "0",
+    })
+
+# What :AUTOSCALE settles on for the square wave below
+autoscaled = {
+    ":TIMEBASE:SCALE": "2e-4",
+    ":CHANNEL1:SCALE": "0.2",
+    ":TRIGGER:LEVEL": "0.5",
+    ":TRIGGER:EDGE:LEVEL": "0.5",
+}
+
+# Every displayed channel sees a 1 kHz, 1 V square wave. Measurement
+# names of both vendors -> value.
+square_wave = {
+    "FREQUENCY": 1e3,
+    "PERIOD": 1e-3,
+    "DUTYCYCLE": 50., "PDUTY": 50.,
+    "RISETIME": 1e-8, "RTIME": 1e-8,
+    "FALLTIME": 1e-8, "FTIME": 1e-8,
+    "OVERSHOOT": 2.,
+    "PRESHOOT": 2.,
+    "VAMPLITUDE": 1., "VAMP": 1.,
+    "VAVERAGE": .5, "VAVG": .5,
+    "VBASE": 0.,
+    "VMAX": 1.02,
+    "VMIN": -.02,
+    "VPP": 1.04,
+    "VTOP": 1.,
+    "PWIDTH": 5e-4,
+    "NWIDTH": 5e-4,
+}
+
+# Answered when a measurement can't be made
+INVALID = 9.9e37
+
+probe = re.compile(r":CHANNEL(\d+):PROBE$")
+
+SCREEN_SIZE = (800, 480)
+
+
+def block(data):
+    """
+    Format an IEEE 488.2 definite length block.
+    """
+    length = str(len(data))
+    return "#{n}{length}".format(n=len(length), length=length).encode() + data
+
+
+def png(width, height, rgb=(0, 0, 0)):
+    """
+    A solid `rgb` PNG image.
+    """
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + \
+            struct.pack(">I", zlib.crc32(kind + data))
+    rows = (b"\x00" + bytes(rgb) * width) * height
+    return b"\x89PNG\r\n\x1a\n" + \
+        chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)) + \
+        chunk(b"IDAT", zlib.compress(rows)) + \
+        chunk(b"IEND", b"")
+
+
+class Latency:
+    """
+    How long the simulated scope takes over a message: `command` seconds
+    for each command or query in it, `query` more for each query, and
+    the time to move the response at `rate` bytes per second. Headers
+    matching a pattern in `overrides` take that many seconds instead of
+    `command`, e.g. {r":DISPLAY:DATA": 2.} for drawing a screenshot.
+    """
+    def __init__(self, command=0., query=0., rate=None, overrides=None):
+        self.command = command
+        self.query = query
+        self.rate = rate
+        self.overrides = [(re.compile(pattern), seconds)
+                          for pattern, seconds in (overrides or {}).items()]
+
+    def delay(self, header):
+        for pattern, seconds in self.overrides:
+            if pattern.match(header):
+                return seconds
+        return self.command + (self.query if header.endswith("?") else 0.)
+
+    def transfer(self, length):
+        return length / self.rate if self.rate else 0.
+
+
+class SimulatedScope:
+    """
+    The subset of SCPI the vendor modules use, answered the way a
+    Keysight InfiniiVision or a Rigol DS1000Z would.
+
+    Settings are kept in `state` by header, so a value set by one intent
+    is what the next query reads; changing a probe ratio rescales the
+    channel like the real scope does. Measurements, waveforms and
+    screenshots come from a fixed signal. An unknown header adds an error
+    to the :SYSTEM:ERROR? queue and, for a query, gets no answer at all,
+    so the client times out as it would on the bench.
+    """
+    def __init__(self, vendor, latency=None, points=1000):
+        self.vendor = vendor
+        self.ident = idents[vendor]
+        self.number = number_formats[vendor].format
+        self.latency = latency or Latency()
+        self.points = points
+        self.errors = collections.deque(maxlen=32)
+        self.messages = 0
+        self.screen = png(*SCREEN_SIZE)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.state = dict(defaults)
+        self.running = True
+        self.measurements = []
+
+    def execute(self, message):
+        """
+        Run one program message, with its `;`-separated commands and
+        queries. Returns the response, or None if there's nothing to
+        read, and the time the scope takes over it.
+        """
+        answers = []
+        delay = 0.
+        previous = ""
+        with self.lock:
+            self.messages += 1
+            for unit in message.split(";"):
+                unit = unit.strip()
+                if not unit:
+                    continue
+                header, _, argument = unit.partition(" ")
+                header = header.upper()
+                if not header.startswith((":", "*")):
+                    # Relative to the subsystem of the header before it
+                    header = previous.rpartition(":")[0] + ":" + header
+                previous = header
+                delay += self.latency.delay(header)
+                if not header.endswith("?"):
+                    self.command(header, argument.strip())
+                    continue
+                answer = self.query(header[:-1], argument.strip())
+                if answer is None:
+                    self.errors.append('-113,"Undefined header"')
+                    continue
+                answers.append(answer if isinstance(answer, bytes) else answer.encode())
+        if not answers:
+            return None, delay
+        response = b";".join(answers) + b"\n"
+        return response, delay + self.latency.transfer(len(response))
+
+    def command(self, header, argument):
+        if header in ("*RST", ":SYSTEM:PRESET"):
+            self.reset()
+        elif header == ":AUTOSCALE":
+            self.reset()
+            self.state.update(autoscaled)
+        elif header == "*CLS":
+            self.errors.clear()
+        elif header in (":RUN", ":SINGLE"):
+            self.running = True
+        elif header == ":STOP":
+            self.running = False
+        elif header in (":TFORCE", ":TRIGGER:FORCE"):
+            pass
+        elif header == ":TRIGGER:LEVEL:ASETUP":
+            self.state[":TRIGGER:LEVEL"] = "0.5"
+        elif header.startswith(":MEASURE:CLEAR"):
+            self.measurements = []
+        elif header == ":MEASURE:ITEM":
+            self.measurements.append(tuple(argument.upper().split(",")[:2]))
+        elif header.startswith(":MEASURE:") and header[9:] in square_wave:
+            self.measurements.append((header[9:], argument.upper()))
+        elif header in self.state or header.endswith(":DISPLAY"):
+            value = argument.upper()
+            value = {"ON": "1", "OFF": "0"}.get(value, value)
+            match = probe.match(header)
+            if match is not None:
+                # The volts per division on screen follow the probe ratio
+                scale = ":CHANNEL{n}:SCALE".format(n=match.group(1))
+                self.state[scale] = repr(float(self.state[scale]) * float(value) /
+                                         float(self.state[header]))
+            self.state[header] = value
+        else:
+            self.errors.append('-113,"Undefined header"')
+
+    def query(self, header, argument):
+        if header == "*IDN":
+            return self.ident
+        if header == "*OPC":
+            return "1"
+        if header == ":SYSTEM:ERROR":
+            return self.errors.popleft() if self.errors else '+0,"No error"'
+        if header == ":MEASURE:ITEM":
+            measurement, _, source = argument.upper().partition(",")
+            return self.measure(measurement, source)
+        if header.startswith(":MEASURE:"):
+            return self.measure(header[9:], argument.upper())
+        if header == ":WAVEFORM:PREAMBLE":
+            return ",".join(self.number(value) for value in self.preamble())
+        if header == ":WAVEFORM:DATA":
+            return block(self.waveform())
+        if header == ":DISPLAY:DATA":
+            return block(self.screen)
+        value = self.state.get(header)
+        if value is None:
+            return None
+        try:
+            return self.number(float(value))
+        except ValueError:
+            return value
+
+    def measure(self, measurement, source):
+        if measurement not in square_wave:
+            return None
+        if self.state.get(":{source}:DISPLAY".format(source=source)) != "1":
+            return self.number(INVALID)
+        return self.number(square_wave[measurement])
+
+    def preamble(self):
+        timebase = float(self.state[":TIMEBASE:SCALE"])
+        source = self.state[":WAVEFORM:SOURCE"]
+        scale = float(self.state.get(":{source}:SCALE".format(source=source), "1"))
+        # format, type, points, count, x increment, origin and reference,
+        # y increment, origin and reference; 10 divisions across, 8 up
+        return (0, 0, self.points, 1,
+                10 * timebase / self.points,
+                float(self.state[":TIMEBASE:OFFSET"]) - 5 * timebase, 0,
+                8 * scale / 250, 0., 128)
+
+    def waveform(self):
+        _, _, points, _, xincrement, xorigin, _, yincrement, _, yreference = self.preamble()
+        high = max(0, min(255, int(yreference + round(1. / yincrement))))
+        return bytes(
+            high if (xorigin + i * xincrement) * square_wave["FREQUENCY"] % 1 < .5
+            else int(yreference)
+            for i in range(points))
+
+
+class Simulator:
+    """
+    Serves a SimulatedScope on file descriptors that stand in for a
+    usbtmc device node: one end of a socket pair, for tests and
+    benchmarks that build their own Transport, or a pty in raw mode
+    whose path ollie can open with --devices.
+
+    Each endpoint is served by a thread of its own, which answers every
+    message after the delay the scope's latency model gives it.
+    """
+    def __init__(self, scope):
+        self.scope = scope
+        self.stopped = threading.Event()
+        self.fds = []
+        self.threads = []
+
+    def socketpair(self):
+        """
+        Return a file descriptor connected to the scope, e.g. for
+        Transport(fd).
+        """
+        ours, theirs = socket.socketpair()
+        self.serve(ours.detach())
+        return theirs.detach()
+
+    def pty(self):
+        """
+        Return the path of a pty connected to the scope, e.g. for
+        Transport.open(path).
+        """
+        master, slave = os.openpty()
+        # No echo or newline translation, so blocks pass through intact.
+        # The slave stays open here: the settings last as long as some fd
+        # is open, and the client can close and reopen it.
+        tty.setraw(slave)
+        self.fds.append(slave)
+        self.serve(master)
+        return os.ttyname(slave)
+
+    def serve(self, fd):
+        self.fds.append(fd)
+        thread = threading.Thread(target=self._run, args=(fd,))
+        thread.daemon = True
+        thread.start()
+        self.threads.append(thread)
+
+    def close(self):
+        self.stopped.set()
+        for thread in self.threads:
+            thread.join(1)
+        for fd in self.fds:
+            os.close(fd)
+        self.fds = []
+        self.threads = []
+
+    def _run(self, fd):
+        poller = select.poll()
+        poller.register(fd, select.POLLIN)
+        pending = b""
+        while not self.stopped.is_set():
+            if not poller.poll(100):
+                continue
+            try:
+                data = os.read(fd, 65536)
+            except OSError:
+                data = b""
+            if not data:
+                # The client closed its end
+                break
+            pending += data
+            while b"\n" in pending:
+                line, pending = pending.split(b"\n", 1)
+                response, delay = self.scope.execute(line.decode("ascii", "replace"))
+                if delay:
+                    time.sleep(delay)
+                if response is not None:
+                    self.write(fd, response)
+
+    def write(self, fd, data):
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="ollie.simulator",
+        description="Simulated oscilloscope on a pty, for running ollie without a scope")
+    parser.add_argument("vendor", choices=sorted(idents))
+    parser.add_argument(
+        "--latency", type=float, default=0.002, metavar="SECONDS",
+        help="time taken over each command or query")
+    parser.add_argument(
+        "--rate", type=float, default=1e6, metavar="BYTES",
+        help="bytes per second the responses are sent at")
+    parser.add_argument(
+        "--points", type=int, default=1000, help="waveform length")
+    args = parser.parse_args(argv)
+
+    simulator = Simulator(SimulatedScope(
+        args.vendor, Latency(command=args.latency, rate=args.rate), args.points))
+    print(simulator.pty(), flush=True)
+    try:
+        simulator.stopped.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import collections
+import functools
+
+
+class SlotError(RuntimeError):
+    """
+    An intent payload doesn't match its schema.
+    """
+
+
+class Slot(collections.namedtuple("Slot", [
+        "convert", "table", "optional", "default", "arg", "spoken"])):
+    """
+    One slot of an intent. Its raw value is passed through `convert`,
+    then looked up in the vendor module's table named `table`, if any,
+    and given to the handler as the argument `arg` (by default named
+    after the slot). An optional slot that is missing gets `default`.
+    If `spoken` is set, the raw value is also passed as that argument,
+    e.g. for repeating a name back to the user.
+    """
+
+
+def slot(convert=str, table=None, optional=False, default=None, arg=None, spoken=None):
+    return Slot(convert, table, optional, default, arg, spoken)
+
+
+def positive(convert):
+    def check(value):
+        value = convert(value)
+        if not value > 0:
+            raise ValueError(value)
+        return value
+    return check
+
+
+# Relative zoom: a number of steps ("zoom out three steps", default one)
+# or a factor ("zoom in by ten x")
+zoom_slots = {
+    "steps": slot(positive(int), optional=True, default=1),
+    "factor": slot(positive(float), optional=True),
+}
+
+# Snips intent name -> its slots, shared by every vendor module
+intent_slots = {
+    "runCapture": {},
+    "stopCapture": {},
+    "singleCapture": {},
+    # The channel to show or hide has been sent as either slot name
+    "showChannel": {
+        "source": slot(table="display_sources"),
+        "channel": slot(table="display_sources", arg="source"),
+    },
+    "hideChannel": {
+        "source": slot(table="display_sources"),
+        "channel": slot(table="display_sources", arg="source"),
+    },
+    "setTimeBaseScale": {
+        "scale": slot(int),
+        "units": slot(table="time_units"),
+    },
+    "setTimebaseReference": {
+        "reference": slot(table="timebase_references"),
+    },
+    "setChannelVerticalScale": {
+        "channel": slot(int),
+        "scale": slot(float),
+        "units": slot(table="vertical_units"),
+    },
+    "measure": {
+        "source": slot(table="measurement_sources", spoken="spoken_source"),
+        "type": slot(table="measurement_commands", arg="subcommand", spoken="measurement"),
+    },
+    "clearAllMeasurements": {},
+    "setTriggerSource": {
+        "source": slot(table="trigger_sources"),
+    },
+    "setTriggerSlope": {
+        "slope": slot(table="trigger_slopes"),
+    },
+    "saveImage": {},
+    "setProbeCoupling": {
+        "channel": slot(int),
+        "coupling": slot(),
+    },
+    "setProbeAttenuation": {
+        "channel": slot(int),
+        "ratio": slot(float),
+    },
+    "autoScale": {},
+    "defaultSetup": {},
+    "increaseTimebase": zoom_slots,
+    "decreaseTimebase": zoom_slots,
+    "increaseVerticalScale": dict(zoom_slots, channel=slot(int)),
+    "decreaseVerticalScale": dict(zoom_slots, channel=slot(int)),
+    "forceTrigger": {},
+    "setTriggerLevel": {
+        "source": slot(table="trigger_sources", optional=True),
+        "level": slot(float),
+        "units": slot(table="vertical_units", optional=True),
+    },
+    "autoTriggerLevels": {},
+    "setTriggerCoupling": {
+        "coupling": slot(),
+    },
+    "setTriggerHoldoff": {
+        "holdoff": slot(int),
+        "units": slot(table="time_units"),
+    },
+    "setTriggerSweepMode": {
+        "mode": slot(str.upper),
+    },
+}
+
+
+def compileSlots(intent, tables):
+    """
+    Build the extractor for an intent's slots, with the lookup tables
+    resolved in `tables` (a vendor module's namespace). The extractor
+    reads a payload's slots in one pass and returns the handler's keyword
+    arguments, or raises SlotError.
+    """
+    rules = {}
+    defaults = {}
+    required = []
+    for name, spec in intent_slots[intent].items():
+        arg = spec.arg or name
+        table = tables[spec.table] if spec.table is not None else None
+        rules[name] = (arg, spec.convert, table, spec.spoken)
+        if spec.optional:
+            defaults[arg] = spec.default
+            if spec.spoken is not None:
+                defaults[spec.spoken] = None
+        else:
+            required.append((name, arg))
+
+    def extract(payload):
+        args = dict(defaults)
+        for slot in payload['slots']:
+            name = slot['slotName']
+            rule = rules.get(name)
+            if rule is None:
+                raise SlotError("Unexpected slot {name} in intent {intent}".format(
+                    name=name, intent=intent))
+            arg, convert, table, spoken = rule
+            raw = slot['value']['value']
+            try:
+                value = convert(raw)
+                if table is not None:
+                    value = table[value]
+            except (KeyError, TypeError, ValueError):
+                raise SlotError("Can't use {value!r} as {name} in intent {intent}".format(
+                    value=raw, name=name, intent=intent))
+            args[arg] = value
+            if spoken is not None:
+                args[spoken] = raw
+        for name, arg in required:
+            if arg not in args:
+                raise SlotError("Expected slot {name} in intent {intent}".format(
+                    name=name, intent=intent))
+        return args
+    return extract
+
+
+def intent(name):
+    """
+    Decorator for the vendor handler of the Snips intent `name`. The
+    handler takes the intent's slots as keyword arguments after
+    (client, device, payload); called with a payload alone, it extracts
+    them first. The extractor is kept as `extract`, so the intent queue
+    can check a payload, and reject it, before it is queued.
+    """
+    def decorate(handler):
+        extract = compileSlots(name, handler.__globals__)
+
+        @functools.wraps(handler)
+        def wrapper(client, device, payload, **args):
+            if not args:
+                args = extract(payload)
+            return handler(client, device, payload, **args)
+        wrapper.extract = extract
+        return wrapper
+    return decorate
@@ -0,0 +1,134 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import json
+import logging
+import time
+
+from . import measure
+from .metrics import metrics
+
+log = logging.getLogger(__name__)
+
+# Samples for one instrument, named by serial number
+TOPIC = "ollie/measurements/{instrument}"
+
+
+class MeasurementStream:
+    """
+    Polls a set of measurements while the device is idle and publishes
+    each sample on `topic` as one compact JSON message, e.g.
+
+        {"seq":7,"t":1571234567.25,"values":{"channel one:frequency":1000.0}}
+
+    `t` is the wall-clock time the sample was requested and `seq` counts
+    published samples, so a subscriber can spot dropped messages. A value
+    the scope can't measure is null.
+
+    Like StateSync this runs on the device worker thread between intents,
+    so streaming never competes with a voice command for the link. The
+    poll rate adapts: polls are spaced at least IDLE_RATIO times as long
+    as the last one took, so a slow scope is left mostly idle, and every
+    intent doubles the interval (up to MAX_INTERVAL) and holds polling off
+    for HOLDOFF seconds while the user is talking to the scope. Each
+    sample without interruption halves it again, back to `interval`.
+    """
+    IDLE_RATIO = 4
+    HOLDOFF = 2.
+    MAX_INTERVAL = 30.
+
+    def __init__(self, client, device, scope, measurements, topic, interval):
+        """
+        `measurements` are (source, measurement) pairs of spoken names, as
+        in the measure intent; those the scope doesn't support are skipped.
+        """
+        self.client = client
+        self.device = device
+        self.scope = scope
+        self.topic = topic
+        self.base = interval
+        self.interval = interval
+        self.sequence = 0
+        self.names = []
+        self.measurements = []
+        for source, measurement in measurements:
+            try:
+                self.measurements.append((scope.measurement_sources[source],
+                                          scope.measurement_commands[measurement]))
+            except KeyError:
+                log.warning("Can't stream %s on %s", measurement, source)
+                continue
+            self.names.append("{source}:{measurement}".format(
+                source=source, measurement=measurement))
+        vendor = scope.__name__.rpartition(".")[2]
+        self.labels = {
+            result: (("result", result), ("vendor", vendor))
+            for result in ("published", "interrupted")
+        }
+        self.next = time.monotonic()
+
+    def touch(self):
+        """
+        Note an intent: back off while the scope is in interactive use.
+        """
+        self.interval = min(self.interval * 2, self.MAX_INTERVAL)
+        self.next = time.monotonic() + max(self.interval, self.HOLDOFF)
+
+    def timeout(self):
+        return max(0., self.next - time.monotonic())
+
+    def run(self, busy):
+        """
+        Read and publish one sample, unless `busy()` becomes true first.
+        Returns the published values, or None if the sample was dropped.
+        """
+        self.device.setIntent("stream")
+        # Without compound messages each value is a round trip of its own,
+        # so check for a waiting intent in between
+        if self.device.compound:
+            groups = [self.measurements]
+        else:
+            groups = [[measurement] for measurement in self.measurements]
+        timestamp = time.time()
+        start = time.monotonic()
+        values = []
+        try:
+            for group in groups:
+                if busy():
+                    metrics.increment("ollie_stream_samples_total",
+                                      self.labels["interrupted"])
+                    return None
+                values += self.scope.queryMeasurements(self.device, group)
+        finally:
+            self.next = time.monotonic() + self.interval
+        elapsed = time.monotonic() - start
+        for key, value in zip(self.measurements, values):
+            measure.cache.put((self.device,) + key, value)
+
+        self.sequence += 1
+        self.client.publish(self.topic, payload=json.dumps(dict(
+            seq=self.sequence, t=round(timestamp, 3),
+            values={
+                name: None if abs(value) >= measure.INVALID else value
+                for name, value in zip(self.names, values)
+            }), separators=(",", ":")))
+        metrics.increment("ollie_stream_samples_total", self.labels["published"])
+        self.interval = max(self.base, elapsed * self.IDLE_RATIO, self.interval / 2)
+        self.next = time.monotonic() + self.interval
+        return values
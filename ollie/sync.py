@@ -0,0 +1,101 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+import time
+
+from .metrics import metrics
+
+log = logging.getLogger(__name__)
+
+
+class StateSync:
+    """
+    Refreshes the link's copy of the scope settings while the device is
+    idle, so a knob turned on the front panel is picked up, and logged,
+    before the next voice command instead of that command acting on a
+    stale value.
+
+    A refreshed setting is used for `interval` seconds instead of the
+    shadow's usual MAX_AGE, until the next refresh is due: with sync on,
+    a voice command skips the query, at the cost of missing a knob
+    turned since the last refresh.
+
+    Runs on the device worker thread between intents. Settings are read
+    one query at a time and the refresh stops as soon as an intent is
+    waiting, so the link is handed back after at most one round trip.
+    """
+    # Always read, so zoom intents start from the scope's actual timebase
+    SETTINGS = (":TIMEBASE:SCALE",)
+
+    def __init__(self, device, interval, vendor):
+        self.device = device
+        self.interval = interval
+        self.labels = {
+            result: (("result", result), ("vendor", vendor))
+            for result in ("unchanged", "changed", "interrupted")
+        }
+        self.touch()
+
+    def touch(self):
+        """
+        Note device activity; the next refresh is `interval` after it.
+        """
+        self.last = time.monotonic()
+
+    def timeout(self):
+        return max(0., self.last + self.interval - time.monotonic())
+
+    def names(self):
+        known = self.device.shadow.names()
+        return list(self.SETTINGS) + [name for name in known if name not in self.SETTINGS]
+
+    def run(self, busy):
+        self.refresh(busy)
+
+    def refresh(self, busy):
+        """
+        Read back every setting ollie relies on, stopping early if
+        `busy()` becomes true. Returns the names of settings that were
+        changed on the scope.
+        """
+        self.device.setIntent("sync")
+        changed = []
+        try:
+            for name in self.names():
+                if busy():
+                    metrics.increment("ollie_sync_total", self.labels["interrupted"])
+                    return changed
+                previous, value = self.device.refresh(name, self.interval)
+                if previous is not None and not same(previous, value):
+                    log.info("%s changed on the scope: %s -> %s", name, previous, value)
+                    changed.append(name)
+        finally:
+            self.touch()
+        metrics.increment("ollie_sync_total",
+                          self.labels["changed" if changed else "unchanged"])
+        return changed
+
+
+def same(a, b):
+    # The shadow holds values as ollie sent them ("0.001") or as the
+    # scope formats them ("+1.00000E-03")
+    try:
+        return float(a) == float(b)
+    except ValueError:
+        return a == b
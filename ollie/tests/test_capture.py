@@ -0,0 +1,72 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import json
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+from .. import capture
+
+class Message:
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+class CaptureTest(unittest.TestCase):
+    def testRoundTrip(self):
+        intent = json.dumps({"sessionId": "abc", "intent": {"intentName": "jmwilson:runCapture"}})
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "session.jsonl.gz")
+            with capture.openCapture(path, "w") as fd:
+                recorder = capture.Recorder(fd)
+                with unittest.mock.patch.object(capture.time, "monotonic", side_effect=[10., 10.5]):
+                    recorder.on_message(None, None, Message(
+                        "hermes/dialogueManager/sessionStarted", b"{}"))
+                    recorder.on_message(None, None, Message(
+                        "hermes/intent/jmwilson:runCapture", intent.encode()))
+            with capture.openCapture(path, "r") as fd:
+                messages = list(capture.readCapture(fd))
+        self.assertEqual(messages, [
+            (0., "hermes/dialogueManager/sessionStarted", "{}"),
+            (0.5, "hermes/intent/jmwilson:runCapture", intent),
+        ])
+
+    def testRenameSessions(self):
+        renamed = capture.renameSessions('{"sessionId": "abc", "siteId": "default"}', "r1")
+        self.assertEqual(json.loads(renamed), {"sessionId": "abc-r1", "siteId": "default"})
+        self.assertEqual(capture.renameSessions("{}", "r1"), "{}")
+        self.assertEqual(capture.renameSessions("not json", "r1"), "not json")
+
+    def testReplaySpeed(self):
+        messages = [(0., "a", "{}"), (1., "b", "{}"), (3., "c", "{}")]
+        now = [100.]
+        slept = []
+        def sleep(seconds):
+            slept.append(seconds)
+            now[0] += seconds
+        client = unittest.mock.Mock()
+        count = capture.replay(client, messages, speed=2., clock=lambda: now[0], sleep=sleep)
+        self.assertEqual(count, 3)
+        self.assertEqual(slept, [0.5, 1.])
+        self.assertEqual([call[0][0] for call in client.publish.call_args_list], ["a", "b", "c"])
+
+        slept.clear()
+        capture.replay(client, messages, speed=0, clock=lambda: now[0], sleep=sleep)
+        self.assertEqual(slept, [])
@@ -0,0 +1,48 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import unittest
+
+from .. import dispatch
+from .. import keysight
+from .. import rigol
+
+class DispatchTest(unittest.TestCase):
+    def testIntentTable(self):
+        for scope in (keysight, rigol):
+            intents = dispatch.makeIntentTable(scope)
+            self.assertEqual(len(intents), len(dispatch.intent_handlers))
+            self.assertIs(intents["hermes/intent/jmwilson:runCapture"],
+                          scope.onRunCapture)
+            self.assertIs(intents["hermes/intent/jmwilson:setTimeBaseScale"],
+                          scope.onSetTimebaseScale)
+            for topic, handler in intents.items():
+                self.assertTrue(topic.startswith(dispatch.intent_prefix))
+                self.assertTrue(callable(handler))
+
+    def testDecode(self):
+        payload = dispatch.decode('{"sessionId": "a", "slots": [], "siteId": "café"}'.encode("utf-8"))
+        self.assertEqual(payload, {"sessionId": "a", "slots": [], "siteId": "café"})
+        with self.assertRaises(ValueError):
+            dispatch.decode(b"{")
+
+    def testSubscriptions(self):
+        from .. import __main__ as ollie_main
+        intents = [topic for topic in ollie_main.subscriptions
+                   if topic.startswith("hermes/intent/")]
+        self.assertEqual(set(intents), dispatch.intent_topics)
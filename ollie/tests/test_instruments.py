@@ -0,0 +1,193 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import tempfile
+import time
+import unittest
+import unittest.mock
+
+from .. import instruments
+from .. import keysight
+from .. import rigol
+from ..transport import DeviceTimeout
+
+class RouterTest(unittest.TestCase):
+    def setUp(self):
+        self.client = unittest.mock.Mock()
+        self.router = instruments.Router(
+            names=[("bench two", "DS1ZA1")],
+            sites=[("lab", "/dev/usbtmc1")])
+        self.keysight = instruments.Instrument(
+            self.client, "/dev/usbtmc0", unittest.mock.Mock(),
+            "KEYSIGHT TECHNOLOGIES,DSO-X 3024A,MY12345678,07.20")
+        self.rigol = instruments.Instrument(
+            self.client, "/dev/usbtmc1", unittest.mock.Mock(),
+            "RIGOL TECHNOLOGIES,DS1054Z,DS1ZA1,00.04.04")
+        self.router.add(self.keysight)
+        self.router.add(self.rigol)
+
+    def tearDown(self):
+        self.router.close()
+
+    def makeSnipsPayload(self, siteId="default", **kwargs):
+        return {
+            "siteId": siteId,
+            "intent": {
+                "intentName": "none",
+            },
+            "slots": [
+                {
+                    "slotName": key,
+                    "value": { "value": value }
+                } for (key, value) in kwargs.items()
+            ]
+        }
+
+    def testIdentify(self):
+        self.assertEqual(instruments.identify("AGILENT TECHNOLOGIES,DSO-X 2002A,MY1,02"),
+                         ("keysight", keysight))
+        self.assertEqual(instruments.identify("Rigol Technologies,MSO1104Z,DS1,00"),
+                         ("rigol", rigol))
+        with self.assertRaises(ValueError):
+            instruments.identify("TEKTRONIX,TDS 2024B,0,CF:91.1CT")
+        self.assertEqual(self.rigol.model, "DS1054Z")
+        self.assertEqual(self.rigol.serial, "DS1ZA1")
+
+    def testDefault(self):
+        payload = self.makeSnipsPayload()
+        instrument, routed = self.router.route(payload)
+        self.assertIs(instrument, self.keysight)
+        self.assertIs(routed, payload)
+
+    def testSite(self):
+        instrument, _ = self.router.route(self.makeSnipsPayload(siteId="lab"))
+        self.assertIs(instrument, self.rigol)
+
+    def testSpokenName(self):
+        payload = self.makeSnipsPayload(siteId="lab", scope="DSO-X 3024A", channel=1)
+        instrument, routed = self.router.route(payload)
+        self.assertIs(instrument, self.keysight)
+        self.assertEqual([slot['slotName'] for slot in routed['slots']], ["channel"])
+        self.assertEqual(len(payload['slots']), 2)
+
+        instrument, _ = self.router.route(self.makeSnipsPayload(scope="Bench Two"))
+        self.assertIs(instrument, self.rigol)
+
+        with self.assertRaises(RuntimeError):
+            self.router.route(self.makeSnipsPayload(scope="bench three"))
+
+    def testNoInstruments(self):
+        self.router.close()
+        with self.assertRaises(RuntimeError):
+            self.router.route(self.makeSnipsPayload())
+
+
+class HotplugMonitorTest(unittest.TestCase):
+    def setUp(self):
+        self.client = unittest.mock.Mock()
+        self.router = instruments.Router()
+        self.dir = tempfile.TemporaryDirectory()
+        self.connected = unittest.mock.Mock()
+        self.disconnected = unittest.mock.Mock()
+        self.monitor = instruments.HotplugMonitor(
+            self.client, self.router, os.path.join(self.dir.name, "usbtmc*"),
+            connected=self.connected, disconnected=self.disconnected)
+        self.idents = {}
+        patcher = unittest.mock.patch.object(instruments, "openDevice", self.openDevice)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.router.close()
+        self.dir.cleanup()
+
+    def openDevice(self, path, timeout=None):
+        return unittest.mock.Mock(), self.idents[os.path.basename(path)]
+
+    def plug(self, name, ident):
+        self.idents[name] = ident
+        open(os.path.join(self.dir.name, name), "w").close()
+        return os.path.join(self.dir.name, name)
+
+    def testReconnect(self):
+        path = self.plug("usbtmc0", "KEYSIGHT TECHNOLOGIES,DSO-X 3024A,MY1,07.20")
+        self.monitor.scan()
+        first = self.router.instruments[path]
+        self.connected.assert_called_once_with(first)
+
+        os.unlink(path)
+        self.monitor.scan()
+        self.assertEqual(len(self.router.instruments), 0)
+        self.disconnected.assert_called_once_with(first)
+        with self.assertRaises(RuntimeError):
+            self.router.route({"slots": []})
+
+        self.plug("usbtmc0", "RIGOL TECHNOLOGIES,DS1054Z,DS1ZA1,00.04.04")
+        self.monitor.scan()
+        self.assertEqual(self.router.instruments[path].vendor, "rigol")
+
+    def testBrokenLink(self):
+        path = self.plug("usbtmc0", "KEYSIGHT TECHNOLOGIES,DSO-X 3024A,MY1,07.20")
+        self.monitor.scan()
+        first = self.router.instruments[path]
+        first.link.file.readline.side_effect = OSError(19, "No such device")
+        with self.assertRaises(OSError):
+            first.link.readline()
+        self.assertTrue(self.monitor.wakeup.is_set())
+        self.monitor.scan()
+        self.assertIsNot(self.router.instruments[path], first)
+
+    def testUnsupported(self):
+        self.plug("usbtmc0", "TEKTRONIX,TDS 2024B,0,CF:91.1CT")
+        with self.assertLogs("ollie.instruments", "WARNING"):
+            self.monitor.scan()
+        self.monitor.scan()
+        self.assertEqual(len(self.router.instruments), 0)
+        self.connected.assert_not_called()
+
+    def testRetryIdent(self):
+        path = self.plug("usbtmc0", "KEYSIGHT TECHNOLOGIES,DSO-X 3024A,MY1,07.20")
+        with unittest.mock.patch.object(instruments, "openDevice",
+                                        side_effect=DeviceTimeout("*IDN?")) as opened:
+            with self.assertLogs("ollie.instruments", "WARNING"):
+                self.monitor.scan()
+            # Not asked again until the retry interval is up
+            self.monitor.scan()
+            self.assertEqual(opened.call_count, 1)
+        self.assertEqual(self.monitor.retries[path][0], 2 * self.monitor.RETRY_INTERVAL)
+
+        self.monitor.retries[path] = (2., 0.)
+        self.monitor.scan()
+        self.assertIn(path, self.router.instruments)
+        self.assertNotIn(path, self.monitor.retries)
+
+    def testScannedCallbackFails(self):
+        # e.g. the LEDs can't be opened; the monitor must keep scanning
+        self.monitor.scanned = unittest.mock.Mock(side_effect=OSError(2, "No such file"))
+        self.monitor.interval = 0.01
+        with self.assertLogs("ollie.instruments", "ERROR"):
+            self.monitor.start()
+            path = self.plug("usbtmc0", "KEYSIGHT TECHNOLOGIES,DSO-X 3024A,MY1,07.20")
+            for _ in range(100):
+                if path in self.router.instruments:
+                    break
+                time.sleep(0.01)
+        self.monitor.stop()
+        self.monitor.thread.join(1)
+        self.assertIn(path, self.router.instruments)
@@ -0,0 +1,117 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import queue
+import unittest
+
+from .. import keysight
+from ..intentqueue import IntentQueue, Job
+from ..slots import SlotError
+
+class IntentQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.queue = IntentQueue(4)
+        self.sessions = 0
+
+    def makeSnipsPayload(self, session=None, **kwargs):
+        if session is None:
+            self.sessions += 1
+            session = "session-{n}".format(n=self.sessions)
+        return {
+            "sessionId": session,
+            "intent": {
+                "intentName": "none",
+            },
+            "slots": [
+                {
+                    "slotName": key,
+                    "value": { "value": value }
+                } for (key, value) in kwargs.items()
+            ]
+        }
+
+    def put(self, handler, **kwargs):
+        return self.queue.put_nowait(Job(handler, self.makeSnipsPayload(**kwargs)))
+
+    def testCoalesceTimebase(self):
+        self.put(keysight.onIncreaseTimebase)
+        self.put(keysight.onIncreaseTimebase)
+        self.put(keysight.onDecreaseTimebase)
+        self.put(keysight.onIncreaseTimebase)
+        job = self.queue.get()
+        self.assertEqual(job.step, "stepTimebase")
+        self.assertEqual(job.steps, 2)
+        self.queue.close()
+        self.assertIsNone(self.queue.get())
+
+    def testCancellingZoom(self):
+        self.put(keysight.onIncreaseTimebase)
+        self.put(keysight.onDecreaseTimebase)
+        self.put(keysight.onRunCapture)
+        self.assertIs(self.queue.get().handler, keysight.onRunCapture)
+
+    def testCoalesceVerticalPerChannel(self):
+        self.put(keysight.onDecreaseVerticalScale, channel=1)
+        self.put(keysight.onDecreaseVerticalScale, channel=1)
+        self.put(keysight.onDecreaseVerticalScale, channel=2)
+        job = self.queue.get()
+        self.assertEqual((job.step, job.args, job.steps), ("stepVerticalScale", (1,), -2))
+        job = self.queue.get()
+        self.assertEqual((job.step, job.args, job.steps), ("stepVerticalScale", (2,), -1))
+
+    def testCoalesceMultipleSteps(self):
+        self.put(keysight.onIncreaseTimebase, steps=3)
+        self.put(keysight.onDecreaseTimebase)
+        self.assertEqual(self.queue.get().steps, 2)
+
+    def testZoomFactorNotCoalesced(self):
+        self.put(keysight.onIncreaseTimebase)
+        self.put(keysight.onIncreaseTimebase, factor=10)
+        self.assertEqual(self.queue.get().steps, 1)
+        self.assertIsNone(self.queue.get().step)
+
+    def testNoCoalesceAcrossOtherIntents(self):
+        self.put(keysight.onIncreaseTimebase)
+        self.put(keysight.onRunCapture)
+        self.put(keysight.onIncreaseTimebase)
+        self.assertEqual(self.queue.get().steps, 1)
+        self.assertIs(self.queue.get().handler, keysight.onRunCapture)
+        self.assertEqual(self.queue.get().steps, 1)
+
+    def testBadPayloadNotQueued(self):
+        with self.assertRaises(SlotError):
+            self.put(keysight.onIncreaseVerticalScale)
+        with self.assertRaises(SlotError):
+            self.put(keysight.onIncreaseTimebase, steps=0)
+        self.assertEqual(len(self.queue), 0)
+
+    def testDuplicateSession(self):
+        self.assertTrue(self.put(keysight.onRunCapture, session="a"))
+        self.assertFalse(self.put(keysight.onRunCapture, session="a"))
+        self.assertTrue(self.put(keysight.onStopCapture, session="b"))
+        self.assertIs(self.queue.get().handler, keysight.onRunCapture)
+        self.assertIs(self.queue.get().handler, keysight.onStopCapture)
+
+    def testFull(self):
+        for _ in range(4):
+            self.put(keysight.onRunCapture)
+        with self.assertRaises(queue.Full):
+            self.put(keysight.onRunCapture, session="busy")
+        # A rejected intent isn't taken for a duplicate once there is room
+        self.queue.get()
+        self.assertTrue(self.put(keysight.onRunCapture, session="busy"))
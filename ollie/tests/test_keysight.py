@@ -16,6 +16,7 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+import json
 import unittest
 import unittest.mock
 
@@ -137,9 +138,22 @@ class KeysightTest(unittest.TestCase):
     def testMeasure(self):
         with self.assertRaises(RuntimeError):
             keysight.onMeasure(self.client, self.device, self.makeSnipsPayload())
+        self.device.readline.return_value = "+1.5E+03\n"
         payload = self.makeSnipsPayload(source="channel one", type="frequency")
         keysight.onMeasure(self.client, self.device, payload)
         self.device.write.assert_any_call(":MEASURE:FREQUENCY CHANNEL1")
+        self.device.write.assert_any_call(":MEASURE:FREQUENCY? CHANNEL1")
+        self.client.publish.assert_called_once_with("hermes/tts/say", payload=json.dumps(dict(
+            text="The frequency on channel one is 1.5 kilohertz", siteId="default")))
+
+        # Asked again straight away, the value is not read again, but the
+        # measurement is still shown
+        self.device.reset_mock()
+        keysight.onMeasure(self.client, self.device, payload)
+        self.device.write.assert_any_call(":MEASURE:FREQUENCY CHANNEL1")
+        self.assertNotIn(unittest.mock.call(":MEASURE:FREQUENCY? CHANNEL1"), self.device.write.call_args_list)
+        self.device.readline.assert_not_called()
+        self.assertEqual(self.client.publish.call_count, 2)
 
     def testClearAllMeasurements(self):
         keysight.onClearAllMeasurements(self.client, self.device, self.makeSnipsPayload())
@@ -161,10 +175,11 @@ class KeysightTest(unittest.TestCase):
         keysight.onSetTriggerSource(self.client, self.device, payload)
         self.device.write.assert_any_call(":TRIGGER:SOURCE EXTERNAL")
 
-    def testSaveImage(self):
+    @unittest.mock.patch.object(keysight, "saveScreenshot")
+    def testSaveImage(self, saveScreenshot):
         keysight.onSaveImage(self.client, self.device, self.makeSnipsPayload())
-        self.client.assert_not_called()
-        self.device.write.assert_any_call(":SAVE:IMAGE")
+        saveScreenshot.assert_called_once_with(
+            self.client, self.device, ":DISPLAY:DATA? PNG,COLOR")
 
     def testSetProbeCoupling(self):
         with self.assertRaises(RuntimeError):
@@ -205,10 +220,56 @@ class KeysightTest(unittest.TestCase):
         self.client.assert_not_called()
         self.device.write.assert_any_call(":TIMEBASE:SCALE 0.5")
 
+    def testStepTimebase(self):
+        self.device.readline.return_value = 1
+        keysight.stepTimebase(self.client, self.device, 3)
+        self.device.write.assert_any_call(":TIMEBASE:SCALE 10")
+        self.device.reset_mock()
+
+        self.device.readline.return_value = 1.5
+        keysight.stepTimebase(self.client, self.device, -2)
+        self.device.write.assert_any_call(":TIMEBASE:SCALE 0.5")
+        self.device.reset_mock()
+
+        self.device.readline.return_value = 1e-9
+        keysight.stepTimebase(self.client, self.device, -100)
+        self.device.write.assert_any_call(":TIMEBASE:SCALE {scale:G}".format(
+            scale=keysight.horizontal_zoom_levels[0]))
+
+    def testZoomTimebaseSteps(self):
+        self.device.readline.return_value = 1
+        payload = self.makeSnipsPayload(steps=3)
+        keysight.onIncreaseTimebase(self.client, self.device, payload)
+        self.device.write.assert_any_call(":TIMEBASE:SCALE 10")
+
+    def testZoomTimebaseFactor(self):
+        self.device.readline.return_value = 2e-3
+        payload = self.makeSnipsPayload(factor=10)
+        keysight.onDecreaseTimebase(self.client, self.device, payload)
+        self.device.write.assert_any_call(":TIMEBASE:SCALE 0.0002")
+        self.device.reset_mock()
+
+        self.device.readline.return_value = 1e-3
+        payload = self.makeSnipsPayload(factor=3)
+        keysight.onIncreaseTimebase(self.client, self.device, payload)
+        self.device.write.assert_any_call(":TIMEBASE:SCALE 0.002")
+
+    def testZoomVerticalScaleFactor(self):
+        self.device.readline.return_value = "1;10\n"
+        payload = self.makeSnipsPayload(channel=1, factor=4)
+        keysight.onIncreaseVerticalScale(self.client, self.device, payload)
+        self.device.write.assert_any_call(":CHANNEL1:SCALE 5")
+
+    def testStepVerticalScale(self):
+        self.device.readline.return_value = "0.1;10\n"
+        keysight.stepVerticalScale(self.client, self.device, 2, 2)
+        self.device.write.assert_any_call(":CHANNEL2:SCALE?;:CHANNEL2:PROBE?")
+        self.device.write.assert_any_call(":CHANNEL2:SCALE 0.5")
+
     def testIncreaseVerticalScale(self):
         with self.assertRaises(RuntimeError):
             keysight.onIncreaseVerticalScale(self.client, self.device, self.makeSnipsPayload())
-        self.device.readline.return_value = 1
+        self.device.readline.return_value = "1;1\n"
         payload = self.makeSnipsPayload(channel=1)
         keysight.onIncreaseVerticalScale(self.client, self.device, payload)
         self.device.write.assert_any_call(":CHANNEL1:SCALE 2")
@@ -216,7 +277,7 @@ class KeysightTest(unittest.TestCase):
     def testDecreaseVerticalScale(self):
         with self.assertRaises(RuntimeError):
             keysight.onDecreaseVerticalScale(self.client, self.device, self.makeSnipsPayload())
-        self.device.readline.return_value = 1
+        self.device.readline.return_value = "1;1\n"
         payload = self.makeSnipsPayload(channel=1)
         keysight.onDecreaseVerticalScale(self.client, self.device, payload)
         self.device.write.assert_any_call(":CHANNEL1:SCALE 0.5")
@@ -0,0 +1,135 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import unittest
+import unittest.mock
+
+from .. import link
+from .. import scpi
+from .. import transport
+
+class LinkTest(unittest.TestCase):
+    def setUp(self):
+        self.device = unittest.mock.Mock()
+        self.device.readline.return_value = "+1.00000E+00\n"
+        self.link = link.Link(self.device, "keysight", compound=True)
+
+    def testJoinCommands(self):
+        self.assertEqual(link.joinCommands([":RUN", "*CLS", "TRIGGER:FORCE"]),
+                         ":RUN;*CLS;:TRIGGER:FORCE")
+
+    def testUnbatched(self):
+        print(":SAVE:IMAGE:FORMAT PNG", file=self.link)
+        print(":SAVE:IMAGE", file=self.link)
+        self.assertEqual(self.device.write.call_count, 2)
+
+    def testBatch(self):
+        self.link.begin()
+        print(":SAVE:IMAGE:FORMAT PNG", file=self.link)
+        print(":SAVE:IMAGE", file=self.link)
+        self.device.write.assert_not_called()
+        self.link.commit()
+        self.device.write.assert_called_once_with(":SAVE:IMAGE:FORMAT PNG;:SAVE:IMAGE\n")
+
+    def testQueryFlushesBatch(self):
+        self.link.begin()
+        print(":STOP", file=self.link)
+        print(":CHANNEL1:SCALE?", file=self.link)
+        self.assertEqual(self.link.readline(), "+1.00000E+00\n")
+        print(":CHANNEL1:SCALE 2", file=self.link)
+        self.link.commit()
+        self.device.write.assert_has_calls([
+            unittest.mock.call(":STOP;:CHANNEL1:SCALE?\n"),
+            unittest.mock.call(":CHANNEL1:SCALE 2\n"),
+        ])
+
+    def testSplitLongBatch(self):
+        self.link.MAX_MESSAGE = 20
+        self.link.begin()
+        for n in range(1, 4):
+            print(":CHANNEL{n}:DISPLAY ON".format(n=n), file=self.link)
+        self.link.commit()
+        self.assertEqual(self.device.write.call_count, 3)
+
+    def testNotCompound(self):
+        self.link.compound = False
+        self.link.begin()
+        print(":STOP", file=self.link)
+        self.device.write.assert_called_once_with(":STOP\n")
+        self.link.commit()
+        self.assertEqual(self.device.write.call_count, 1)
+
+    def testCompoundQuery(self):
+        self.device.readline.return_value = "+1.00000E-01;+1.00000E+01\n"
+        values = scpi.queryValues(self.link, ":CHANNEL1:SCALE?", ":CHANNEL1:PROBE?")
+        self.assertEqual(values, [0.1, 10.])
+        self.device.write.assert_called_once_with(":CHANNEL1:SCALE?;:CHANNEL1:PROBE?\n")
+        self.assertEqual(self.device.readline.call_count, 1)
+        # Both answers were recorded
+        scpi.queryValues(self.link, ":CHANNEL1:SCALE?", ":CHANNEL1:PROBE?")
+        self.assertEqual(self.device.write.call_count, 1)
+
+    def testPartlyCachedQuery(self):
+        print(":CHANNEL1:PROBE 10", file=self.link)
+        self.device.readline.return_value = "+1.00000E-01\n"
+        values = scpi.queryValues(self.link, ":CHANNEL1:SCALE?", ":CHANNEL1:PROBE?")
+        self.assertEqual(values, [0.1, 10.])
+        self.device.write.assert_called_with(":CHANNEL1:SCALE?\n")
+
+    def testQueryWithoutCompound(self):
+        self.link.compound = False
+        self.device.readline.side_effect = ["+1.00000E-01\n", "+1.00000E+01\n"]
+        values = scpi.queryValues(self.link, ":CHANNEL1:SCALE?", ":CHANNEL1:PROBE?")
+        self.assertEqual(values, [0.1, 10.])
+        self.device.write.assert_has_calls([
+            unittest.mock.call(":CHANNEL1:SCALE?\n"),
+            unittest.mock.call(":CHANNEL1:PROBE?\n"),
+        ])
+
+    def testWrongNumberOfAnswers(self):
+        self.device.readline.return_value = "+1.00000E-01\n"
+        with self.assertRaises(RuntimeError):
+            scpi.queryValues(self.link, "*IDN?", "*OPC?")
+
+    def testTimeoutRecovery(self):
+        errors = []
+        self.link.on_error = lambda: errors.append(True)
+        self.device.readline.side_effect = transport.DeviceTimeout(110, "No response")
+        print(":TIMEBASE:SCALE 1", file=self.link)
+        for _ in range(link.Link.MAX_TIMEOUTS - 1):
+            print("*IDN?", file=self.link)
+            with self.assertRaises(transport.DeviceTimeout):
+                self.link.readline()
+        self.assertEqual(self.device.clear.call_count, link.Link.MAX_TIMEOUTS - 1)
+        self.assertIsNone(self.link.shadow.get(":TIMEBASE:SCALE"))
+        self.assertFalse(self.link.broken)
+
+        # An answer resets the count
+        self.device.readline.side_effect = None
+        print("*IDN?", file=self.link)
+        self.link.readline()
+        self.assertEqual(self.link.timeouts, 0)
+
+        self.device.readline.side_effect = transport.DeviceTimeout(110, "No response")
+        with self.assertLogs("ollie.link", "WARNING"):
+            for _ in range(link.Link.MAX_TIMEOUTS):
+                print("*IDN?", file=self.link)
+                with self.assertRaises(transport.DeviceTimeout):
+                    self.link.readline()
+        self.assertTrue(self.link.broken)
+        self.assertEqual(errors, [True])
@@ -0,0 +1,70 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import io
+import json
+import logging
+import unittest
+
+from .. import log
+
+class Payload:
+    formatted = 0
+
+    def __str__(self):
+        self.formatted += 1
+        return "payload"
+
+class RingHandlerTest(unittest.TestCase):
+    def setUp(self):
+        self.target = io.StringIO()
+        self.ring = log.RingHandler(3, target=self.target)
+        # Not registered with logging.getLogger, so no other handlers
+        self.logger = logging.Logger("ollie.test", logging.DEBUG)
+        self.logger.addHandler(self.ring)
+
+    def testLazyFormatting(self):
+        payload = Payload()
+        self.logger.debug("received %s", payload)
+        self.assertEqual(payload.formatted, 0)
+        events = [json.loads(line) for line in self.ring.dumps().splitlines()]
+        self.assertEqual(len(events), 1)
+        self.assertEqual(payload.formatted, 1)
+        self.assertEqual(events[0]["message"], "received payload")
+        self.assertEqual(events[0]["level"], "DEBUG")
+        self.assertEqual(events[0]["logger"], "ollie.test")
+
+    def testBounded(self):
+        for i in range(5):
+            self.logger.debug("> :CHANNEL%d:SCALE?", i, extra={"intent": "measure"})
+        events = [json.loads(line) for line in self.ring.dumps().splitlines()]
+        self.assertEqual([e["message"] for e in events],
+                         ["> :CHANNEL2:SCALE?", "> :CHANNEL3:SCALE?", "> :CHANNEL4:SCALE?"])
+        self.assertEqual(events[0]["intent"], "measure")
+
+    def testDumpOnError(self):
+        self.logger.debug("> :TIMEBASE:SCALE?")
+        try:
+            raise ValueError("bad response")
+        except ValueError:
+            self.logger.exception("increaseTimebase failed")
+        events = [json.loads(line) for line in self.target.getvalue().splitlines()]
+        self.assertEqual([e["message"] for e in events],
+                         ["> :TIMEBASE:SCALE?", "increaseTimebase failed"])
+        self.assertIn("ValueError: bad response", events[1]["exception"])
+        self.assertEqual(self.ring.dumps(), "")
@@ -0,0 +1,48 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import unittest
+import unittest.mock
+
+from .. import measure
+
+class MeasureTest(unittest.TestCase):
+    def testSpokenValue(self):
+        self.assertEqual(measure.spokenValue(1500, "hertz"), "1.5 kilohertz")
+        self.assertEqual(measure.spokenValue(2.5e-9, "seconds"), "2.5 nanoseconds")
+        self.assertEqual(measure.spokenValue(-0.12345, "volts"), "-123 millivolts")
+        self.assertEqual(measure.spokenValue(3.3, "volts"), "3.3 volts")
+        self.assertEqual(measure.spokenValue(0, "volts"), "0 volts")
+        self.assertEqual(measure.spokenValue(49.96, "percent"), "50 percent")
+
+    def testCacheExpires(self):
+        cache = measure.MeasurementCache(ttl=10)
+        with unittest.mock.patch.object(measure.time, "monotonic", return_value=100):
+            cache.put("key", 1.)
+            self.assertEqual(cache.get("key"), 1.)
+        with unittest.mock.patch.object(measure.time, "monotonic", return_value=110):
+            self.assertIsNone(cache.get("key"))
+            cache.put("other", 2.)
+        self.assertEqual(list(cache.values), ["other"])
+
+    def testInvalidMeasurement(self):
+        client = unittest.mock.Mock()
+        measure.speakMeasurement(client, {"siteId": "bench"}, "channel two", "rise time", 9.9e37)
+        client.publish.assert_called_once_with(
+            measure.TTS_TOPIC,
+            payload='{"text": "There is no rise time on channel two", "siteId": "bench"}')
@@ -0,0 +1,63 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import unittest
+import unittest.mock
+
+from .. import link
+from .. import metrics
+
+class MetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.metrics = metrics.Metrics()
+        self.metrics.declare("test_seconds", "histogram", "Test histogram")
+        self.metrics.declare("test_total", "counter", "Test counter")
+
+    def testRender(self):
+        labels = (("intent", "runCapture"), ("vendor", "keysight"))
+        self.metrics.observe("test_seconds", labels, 0.003)
+        self.metrics.observe("test_seconds", labels, 0.2)
+        self.metrics.increment("test_total", (("outcome", 'say "hi"'),))
+        text = self.metrics.render()
+        self.assertIn("# TYPE test_seconds histogram\n", text)
+        self.assertIn('test_seconds_bucket{intent="runCapture",vendor="keysight",le="0.0025"} 0\n', text)
+        self.assertIn('test_seconds_bucket{intent="runCapture",vendor="keysight",le="0.005"} 1\n', text)
+        self.assertIn('test_seconds_bucket{intent="runCapture",vendor="keysight",le="+Inf"} 2\n', text)
+        self.assertIn('test_seconds_count{intent="runCapture",vendor="keysight"} 2\n', text)
+        self.assertIn('test_total{outcome="say \\"hi\\""} 1\n', text)
+
+    def testLinkTimesCommands(self):
+        device = unittest.mock.Mock()
+        device.readline.return_value = "1\n"
+        dev = link.Link(device, "keysight")
+        dev.setIntent("increaseTimebase")
+        with unittest.mock.patch.object(link, "metrics", self.metrics):
+            self.metrics.declare("ollie_scpi_seconds", "histogram", "")
+            self.metrics.declare("ollie_shadow_queries_total", "counter", "")
+            self.metrics.declare("ollie_scpi_commands_total", "counter", "")
+            self.metrics.declare("ollie_scpi_transfers_total", "counter", "")
+            print(":TIMEBASE:SCALE?", file=dev)
+            self.assertEqual(dev.readline(), "1\n")
+            print(":TIMEBASE:SCALE 2", file=dev)
+        device.write.assert_has_calls([
+            unittest.mock.call(":TIMEBASE:SCALE?\n"),
+            unittest.mock.call(":TIMEBASE:SCALE 2\n"),
+        ])
+        text = self.metrics.render()
+        self.assertIn('ollie_scpi_seconds_count{intent="increaseTimebase",op="write",vendor="keysight"} 2\n', text)
+        self.assertIn('ollie_scpi_seconds_count{intent="increaseTimebase",op="query",vendor="keysight"} 1\n', text)
@@ -16,6 +16,7 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+import json
 import unittest
 import unittest.mock
 
@@ -99,6 +100,11 @@ class RigolTest(unittest.TestCase):
         rigol.onSetTimebaseScale(self.client, self.device, payload)
         self.client.assert_not_called()
         self.device.write.assert_any_call(":TIMEBASE:SCALE 1E-05")
+        self.device.reset_mock()
+
+        payload = self.makeSnipsPayload(scale=40., units="milliseconds")
+        rigol.onSetTimebaseScale(self.client, self.device, payload)
+        self.device.write.assert_any_call(":TIMEBASE:SCALE 0.05")
 
     def testSetTimebaseReference(self):
         with self.assertRaises(RuntimeError):
@@ -134,9 +140,22 @@ class RigolTest(unittest.TestCase):
     def testMeasure(self):
         with self.assertRaises(RuntimeError):
             rigol.onMeasure(self.client, self.device, self.makeSnipsPayload())
+        self.device.readline.return_value = "+1.5E+03\n"
         payload = self.makeSnipsPayload(source="channel one", type="frequency")
         rigol.onMeasure(self.client, self.device, payload)
         self.device.write.assert_any_call(":MEASURE:ITEM FREQUENCY,CHANNEL1")
+        self.device.write.assert_any_call(":MEASURE:ITEM? FREQUENCY,CHANNEL1")
+        self.client.publish.assert_called_once_with("hermes/tts/say", payload=json.dumps(dict(
+            text="The frequency on channel one is 1.5 kilohertz", siteId="default")))
+
+        # Asked again straight away, the value is not read again, but the
+        # measurement is still shown
+        self.device.reset_mock()
+        rigol.onMeasure(self.client, self.device, payload)
+        self.device.write.assert_any_call(":MEASURE:ITEM FREQUENCY,CHANNEL1")
+        self.assertNotIn(unittest.mock.call(":MEASURE:ITEM? FREQUENCY,CHANNEL1"), self.device.write.call_args_list)
+        self.device.readline.assert_not_called()
+        self.assertEqual(self.client.publish.call_count, 2)
 
     def testClearAllMeasurements(self):
         rigol.onClearAllMeasurements(self.client, self.device, self.makeSnipsPayload())
@@ -158,9 +177,11 @@ class RigolTest(unittest.TestCase):
         rigol.onSetTriggerSource(self.client, self.device, payload)
         self.device.write.assert_any_call(":TRIGGER:EDGE:SOURCE CHANNEL1")
 
-    def testSaveImage(self):
-        with self.assertRaises(RuntimeError):
-            rigol.onSaveImage(self.client, self.device, self.makeSnipsPayload())
+    @unittest.mock.patch.object(rigol, "saveScreenshot")
+    def testSaveImage(self, saveScreenshot):
+        rigol.onSaveImage(self.client, self.device, self.makeSnipsPayload())
+        saveScreenshot.assert_called_once_with(
+            self.client, self.device, ":DISPLAY:DATA? ON,OFF,PNG")
 
     def testSetProbeCoupling(self):
         with self.assertRaises(RuntimeError):
@@ -201,10 +222,56 @@ class RigolTest(unittest.TestCase):
         self.client.assert_not_called()
         self.device.write.assert_any_call(":TIMEBASE:SCALE 0.5")
 
+    def testStepTimebase(self):
+        self.device.readline.return_value = 1
+        rigol.stepTimebase(self.client, self.device, 3)
+        self.device.write.assert_any_call(":TIMEBASE:SCALE 10")
+        self.device.reset_mock()
+
+        self.device.readline.return_value = 1.5
+        rigol.stepTimebase(self.client, self.device, -2)
+        self.device.write.assert_any_call(":TIMEBASE:SCALE 0.5")
+        self.device.reset_mock()
+
+        self.device.readline.return_value = 1e-9
+        rigol.stepTimebase(self.client, self.device, -100)
+        self.device.write.assert_any_call(":TIMEBASE:SCALE {scale:G}".format(
+            scale=rigol.horizontal_zoom_levels[0]))
+
+    def testZoomTimebaseSteps(self):
+        self.device.readline.return_value = 1
+        payload = self.makeSnipsPayload(steps=3)
+        rigol.onIncreaseTimebase(self.client, self.device, payload)
+        self.device.write.assert_any_call(":TIMEBASE:SCALE 10")
+
+    def testZoomTimebaseFactor(self):
+        self.device.readline.return_value = 2e-3
+        payload = self.makeSnipsPayload(factor=10)
+        rigol.onDecreaseTimebase(self.client, self.device, payload)
+        self.device.write.assert_any_call(":TIMEBASE:SCALE 0.0002")
+        self.device.reset_mock()
+
+        self.device.readline.return_value = 1e-3
+        payload = self.makeSnipsPayload(factor=3)
+        rigol.onIncreaseTimebase(self.client, self.device, payload)
+        self.device.write.assert_any_call(":TIMEBASE:SCALE 0.002")
+
+    def testZoomVerticalScaleFactor(self):
+        self.device.readline.return_value = "1;10\n"
+        payload = self.makeSnipsPayload(channel=1, factor=4)
+        rigol.onIncreaseVerticalScale(self.client, self.device, payload)
+        self.device.write.assert_any_call(":CHANNEL1:SCALE 5")
+
+    def testStepVerticalScale(self):
+        self.device.readline.return_value = "0.1;10\n"
+        rigol.stepVerticalScale(self.client, self.device, 2, 2)
+        self.device.write.assert_any_call(":CHANNEL2:SCALE?;:CHANNEL2:PROBE?")
+        self.device.write.assert_any_call(":CHANNEL2:SCALE 0.5")
+
     def testIncreaseVerticalScale(self):
         with self.assertRaises(RuntimeError):
             rigol.onIncreaseVerticalScale(self.client, self.device, self.makeSnipsPayload())
-        self.device.readline.return_value = 1
+        self.device.readline.return_value = "1;1\n"
         payload = self.makeSnipsPayload(channel=1)
         rigol.onIncreaseVerticalScale(self.client, self.device, payload)
         self.device.write.assert_any_call(":CHANNEL1:SCALE 2")
@@ -212,7 +279,7 @@ class RigolTest(unittest.TestCase):
     def testDecreaseVerticalScale(self):
         with self.assertRaises(RuntimeError):
             rigol.onDecreaseVerticalScale(self.client, self.device, self.makeSnipsPayload())
-        self.device.readline.return_value = 1
+        self.device.readline.return_value = "1;1\n"
         payload = self.makeSnipsPayload(channel=1)
         rigol.onDecreaseVerticalScale(self.client, self.device, payload)
         self.device.write.assert_any_call(":CHANNEL1:SCALE 0.5")
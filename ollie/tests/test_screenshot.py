@@ -0,0 +1,95 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import base64
+import io
+import json
+import os
+import socket
+import tempfile
+import unittest
+import unittest.mock
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from .. import link
+from .. import screenshot
+from .. import transport
+
+class ScreenshotTest(unittest.TestCase):
+    def setUp(self):
+        ours, theirs = socket.socketpair()
+        self.scope = theirs
+        self.link = link.Link(transport.Transport(ours.detach(), timeout=0.5), "keysight")
+        self.client = unittest.mock.Mock()
+        self.dir = tempfile.TemporaryDirectory()
+        patcher = unittest.mock.patch.object(screenshot, "directory", self.dir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.link.close()
+        self.scope.close()
+        self.dir.cleanup()
+
+    def testCopyBlockInChunks(self):
+        self.scope.sendall(b"#210" + bytes(range(10)) + b"\n+1\n")
+        out = io.BytesIO()
+        self.assertEqual(screenshot.copyBlock(self.link, out, chunk=4), 10)
+        self.assertEqual(out.getvalue(), bytes(range(10)))
+        self.assertEqual(len(self.link.buffer), 4)
+        print("*OPC?", file=self.link)
+        self.assertEqual(self.link.readline(), "+1\n")
+
+    def testSaveScreenshot(self):
+        self.scope.sendall(b"#18PNG data\n")
+        with unittest.mock.patch.object(screenshot, "thumbnail", return_value=None):
+            path = screenshot.saveScreenshot(self.client, self.link, ":DISPLAY:DATA? PNG,COLOR")
+        self.assertEqual(self.scope.recv(100), b":DISPLAY:DATA? PNG,COLOR\n")
+        self.assertEqual(os.listdir(self.dir.name), [os.path.basename(path)])
+        with open(path, "rb") as fd:
+            self.assertEqual(fd.read(), b"PNG data")
+        topic, = self.client.publish.call_args[0]
+        self.assertEqual(topic, screenshot.TOPIC)
+        report = json.loads(self.client.publish.call_args[1]['payload'])
+        self.assertEqual(report['path'], path)
+        self.assertEqual(report['bytes'], 8)
+        self.assertIn('seconds', report)
+
+    def testTruncatedScreenshot(self):
+        self.scope.sendall(b"#18PNG")
+        with self.assertRaises(transport.DeviceTimeout):
+            screenshot.saveScreenshot(self.client, self.link, ":DISPLAY:DATA? PNG,COLOR",
+                                      timeout=0.1)
+        self.assertEqual(os.listdir(self.dir.name), [])
+        self.client.publish.assert_not_called()
+
+    @unittest.skipIf(Image is None, "needs Pillow")
+    def testThumbnail(self):
+        image = io.BytesIO()
+        Image.new("RGB", (800, 480)).save(image, "PNG")
+        data = image.getvalue()
+        self.scope.sendall("#{n}{length}".format(n=len(str(len(data))), length=len(data))
+                           .encode() + data + b"\n")
+        screenshot.saveScreenshot(self.client, self.link, ":DISPLAY:DATA? PNG,COLOR")
+        report = json.loads(self.client.publish.call_args[1]['payload'])
+        with Image.open(io.BytesIO(base64.b64decode(report['thumbnail']))) as thumbnail:
+            self.assertEqual(thumbnail.size, screenshot.THUMBNAIL_SIZE)
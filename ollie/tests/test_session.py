@@ -0,0 +1,125 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import unittest
+
+from .. import session
+from ..metrics import metrics
+
+class FakeClient:
+    """
+    paho client whose connection attempts and loop() results are
+    scripted: `connects` raise or pass, `loops` are loop() return codes.
+    """
+    def __init__(self, connects, loops, on_loop=None):
+        self.connects = list(connects)
+        self.loops = list(loops)
+        self.on_loop = on_loop
+        self.calls = []
+
+    def attempt(self, name):
+        self.calls.append(name)
+        error = self.connects.pop(0)
+        if error is not None:
+            raise error
+
+    def connect(self, host, port, keepalive):
+        self.attempt("connect")
+
+    def reconnect(self):
+        self.attempt("reconnect")
+
+    def loop(self, timeout):
+        if self.on_loop is not None:
+            self.on_loop()
+        return self.loops.pop(0)
+
+
+class Message:
+    def __init__(self, dup=False):
+        self.topic = "hermes/intent/jmwilson:defaultSetup"
+        self.dup = dup
+
+
+def count(name):
+    _, _, series = metrics.families[name]
+    return sum(value.count for value in series.values())
+
+
+class BackoffTest(unittest.TestCase):
+    def testDelays(self):
+        backoff = session.Backoff(initial=1., maximum=8., random=lambda: 1.)
+        self.assertEqual([backoff.next() for _ in range(5)], [1., 2., 4., 8., 8.])
+        backoff = session.Backoff(initial=1., maximum=8., random=lambda: 0.)
+        self.assertEqual([backoff.next() for _ in range(3)], [0.5, 1., 2.])
+        backoff.reset()
+        self.assertEqual(backoff.next(), 0.5)
+
+
+class SessionTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 100.
+        self.session = session.Session(session.Backoff(initial=1e-3, maximum=1e-3),
+                                       clock=lambda: self.now)
+
+    def testReconnect(self):
+        reconnects = count("ollie_mqtt_reconnect_seconds")
+
+        def loop():
+            if len(client.loops) == 1:
+                # Reconnected; stop once this loop returns
+                self.now += 5.
+                self.session.connected(True)
+                self.session.stop()
+
+        client = FakeClient(
+            connects=[OSError("refused"), None, OSError("refused"), None],
+            loops=[0, 0, 7, 0], on_loop=loop)
+        self.session.run(client, "localhost", 1883)
+        self.assertEqual(client.calls, ["connect", "connect", "reconnect", "reconnect"])
+        self.assertEqual(count("ollie_mqtt_reconnect_seconds"), reconnects + 1)
+        self.assertIsNone(self.session.lost)
+
+    def testRedelivered(self):
+        handled = count("ollie_mqtt_redelivered_total")
+        self.session.connected(False)
+        self.assertTrue(self.session.accept(Message()))
+        self.assertTrue(self.session.accept(Message(dup=True)))
+
+        # Held over a short outage: handled
+        self.session.lost = self.now
+        self.now += 2.
+        self.session.connected(True)
+        self.assertTrue(self.session.accept(Message()))
+        self.now += self.session.REDELIVERY_WINDOW
+        self.assertTrue(self.session.accept(Message()))
+        self.assertEqual(count("ollie_mqtt_redelivered_total"), handled + 2)
+
+    def testStale(self):
+        # ollie restarted and the broker kept its session
+        self.session.connected(True)
+        with self.assertLogs("ollie.session", "WARNING"):
+            self.assertFalse(self.session.accept(Message()))
+
+        self.now += self.session.REDELIVERY_WINDOW
+        self.session.lost = self.now
+        self.now += self.session.MAX_OUTAGE + 1
+        self.session.connected(True)
+        with self.assertLogs("ollie.session", "WARNING"):
+            self.assertFalse(self.session.accept(Message()))
+        self.now += self.session.REDELIVERY_WINDOW
+        self.assertTrue(self.session.accept(Message()))
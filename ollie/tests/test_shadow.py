@@ -0,0 +1,104 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import unittest
+import unittest.mock
+
+from .. import keysight
+from .. import link
+from .. import shadow
+
+class ShadowTest(unittest.TestCase):
+    def setUp(self):
+        self.device = unittest.mock.Mock()
+        self.device.readline.side_effect = ["+1.00000E-03\n", "+1.00000E+01\n"]
+        self.link = link.Link(self.device, "keysight")
+
+    def queries(self):
+        return [call[0][0] for call in self.device.write.call_args_list
+                if call[0][0].rstrip().endswith("?")]
+
+    def testHeader(self):
+        self.assertEqual(shadow.header(":timebase:scale 1E-3\n"), (":TIMEBASE:SCALE", "1E-3"))
+        self.assertEqual(shadow.header("*RST\n"), ("*RST", ""))
+        self.assertEqual(shadow.header("CHANNEL1:PROBE?"), (":CHANNEL1:PROBE?", ""))
+
+    def testStepTimebaseQueriesOnce(self):
+        keysight.stepTimebase(None, self.link, 1)
+        keysight.stepTimebase(None, self.link, 1)
+        keysight.stepTimebase(None, self.link, -3)
+        self.assertEqual(self.queries(), [":TIMEBASE:SCALE?\n"])
+        self.device.write.assert_has_calls([
+            unittest.mock.call(":TIMEBASE:SCALE 0.002\n"),
+            unittest.mock.call(":TIMEBASE:SCALE 0.005\n"),
+            unittest.mock.call(":TIMEBASE:SCALE 0.0005\n"),
+        ])
+
+    def testStepVerticalScaleQueriesOnce(self):
+        keysight.stepVerticalScale(None, self.link, 1, 1)
+        keysight.stepVerticalScale(None, self.link, 1, 1)
+        self.assertEqual(self.queries(), [":CHANNEL1:SCALE?\n", ":CHANNEL1:PROBE?\n"])
+        self.device.write.assert_has_calls([
+            unittest.mock.call(":CHANNEL1:SCALE 0.002\n"),
+            unittest.mock.call(":CHANNEL1:SCALE 0.005\n"),
+        ])
+
+    def testSetThenStep(self):
+        print(":TIMEBASE:SCALE 2E-06", file=self.link)
+        keysight.stepTimebase(None, self.link, 1)
+        self.assertEqual(self.queries(), [])
+        self.device.write.assert_called_with(":TIMEBASE:SCALE 5E-06\n")
+
+    def testReset(self):
+        for command in ("*RST", ":AUTOSCALE", ":SYSTEM:PRESET"):
+            print(":TIMEBASE:SCALE 1", file=self.link)
+            print(command, file=self.link)
+            self.assertIsNone(self.link.shadow.get(":TIMEBASE:SCALE"))
+
+    def testProbeInvalidatesScale(self):
+        print(":CHANNEL2:SCALE 1", file=self.link)
+        print(":CHANNEL2:PROBE 10", file=self.link)
+        self.assertIsNone(self.link.shadow.get(":CHANNEL2:SCALE"))
+        self.assertEqual(self.link.shadow.get(":CHANNEL2:PROBE"), "10")
+
+    def testUncachedQueriesKeepOrder(self):
+        print(":TIMEBASE:SCALE 1", file=self.link)
+        print("*IDN?", file=self.link)
+        print(":TIMEBASE:SCALE?", file=self.link)
+        self.assertEqual(self.link.readline(), "+1.00000E-03\n")
+        self.assertEqual(self.link.readline(), "1\n")
+
+    def testInvalidate(self):
+        print(":TIMEBASE:SCALE 1", file=self.link)
+        self.link.shadow.invalidate()
+        print(":TIMEBASE:SCALE?", file=self.link)
+        self.assertEqual(self.link.readline(), "+1.00000E-03\n")
+        self.assertEqual(self.link.shadow.get(":TIMEBASE:SCALE"), "+1.00000E-03")
+
+    def testExpiry(self):
+        now = [0.]
+        self.link.shadow = shadow.Shadow(max_age=2., clock=lambda: now[0])
+        keysight.stepTimebase(None, self.link, 1)
+        now[0] = 1.5
+        keysight.stepTimebase(None, self.link, 1)
+        # The knob may have been turned since; ask the scope again
+        now[0] = 4.
+        self.device.readline.side_effect = ["+1.00000E-06\n"]
+        keysight.stepTimebase(None, self.link, 1)
+        self.assertEqual(self.queries(), [":TIMEBASE:SCALE?\n"] * 2)
+        self.device.write.assert_called_with(":TIMEBASE:SCALE 2E-06\n")
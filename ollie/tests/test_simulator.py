@@ -0,0 +1,139 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import json
+import os
+import tempfile
+import time
+import unittest
+import unittest.mock
+
+from .. import instruments
+from .. import keysight
+from .. import link
+from .. import measure
+from .. import rigol
+from .. import screenshot
+from .. import simulator
+from .. import transport
+from .. import waveform
+
+class SimulatorTest(unittest.TestCase):
+    def connect(self, vendor, latency=None, compound=True):
+        self.scope = simulator.SimulatedScope(vendor, latency, points=100)
+        self.simulator = simulator.Simulator(self.scope)
+        self.addCleanup(self.simulator.close)
+        self.link = link.Link(transport.Transport(self.simulator.socketpair(), timeout=0.5),
+                              vendor, compound=compound)
+        self.addCleanup(self.link.close)
+        self.client = unittest.mock.Mock()
+        measure.cache.values.clear()
+        self.addCleanup(measure.cache.values.clear)
+
+    def makeSnipsPayload(self, **kwargs):
+        return {
+            "intent": {"intentName": "none"},
+            "slots": [
+                {"slotName": name, "value": {"value": value}}
+                for name, value in kwargs.items()
+            ],
+        }
+
+    def spoken(self):
+        return json.loads(self.client.publish.call_args[1]['payload'])['text']
+
+    def testIdentify(self):
+        for vendor in ("keysight", "rigol"):
+            self.connect(vendor)
+            print("*IDN?", file=self.link)
+            self.assertEqual(instruments.identify(self.link.readline().strip())[0], vendor)
+
+    def testKeepsState(self):
+        self.connect("keysight")
+        keysight.onSetChannelVerticalScale(
+            self.client, self.link, self.makeSnipsPayload(channel=2, scale=500, units="millivolts"))
+        self.assertEqual(self.link.refresh(":CHANNEL2:SCALE"), ("0.5", "+5.00000E-01"))
+        keysight.onIncreaseVerticalScale(self.client, self.link, self.makeSnipsPayload(channel=2))
+        self.assertEqual(self.scope.state[":CHANNEL2:SCALE"], "1")
+
+    def testProbeRescales(self):
+        self.connect("rigol", compound=False)
+        print(":CHANNEL1:PROBE 1", file=self.link)
+        print(":CHANNEL1:SCALE?", file=self.link)
+        self.assertEqual(self.link.readline(), "1.000000e-01\n")
+
+    def testCompoundQuery(self):
+        self.connect("keysight")
+        print(":TIMEBASE:SCALE 0.002;:TIMEBASE:SCALE?;REFERENCE?", file=self.link.file)
+        self.assertEqual(self.link.file.readline(), "+2.00000E-03;CENTER\n")
+        self.assertEqual(self.scope.messages, 1)
+
+    def testMeasure(self):
+        self.connect("rigol", compound=False)
+        rigol.onMeasure(self.client, self.link,
+                        self.makeSnipsPayload(source="channel one", type="frequency"))
+        self.assertEqual(self.spoken(), "The frequency on channel one is 1 kilohertz")
+        self.assertEqual(self.scope.measurements, [("FREQUENCY", "CHANNEL1")])
+        self.assertEqual(rigol.queryMeasurements(self.link, [("CHANNEL2", "VPP")]),
+                         [simulator.INVALID])
+
+    def testWaveformBlock(self):
+        self.connect("keysight")
+        preamble = waveform.readPreamble(self.link)
+        self.assertEqual(preamble.points, 100)
+        print(":WAVEFORM:DATA?", file=self.link)
+        data = waveform.readBlock(self.link)
+        self.assertEqual(len(data), 100)
+        self.assertEqual(set(data), {128, 159})
+
+    def testScreenshot(self):
+        self.connect("rigol", compound=False)
+        with tempfile.TemporaryDirectory() as directory, \
+                unittest.mock.patch.object(screenshot, "directory", directory), \
+                unittest.mock.patch.object(screenshot, "thumbnail", return_value=None):
+            rigol.onSaveImage(self.client, self.link, self.makeSnipsPayload())
+            path, = os.listdir(directory)
+            with open(os.path.join(directory, path), "rb") as fd:
+                self.assertEqual(fd.read(), simulator.png(*simulator.SCREEN_SIZE))
+
+    def testUndefinedHeader(self):
+        self.connect("keysight")
+        print(":BOGUS?", file=self.link)
+        with self.assertRaises(transport.DeviceTimeout):
+            self.link.readline()
+        print(":SYSTEM:ERROR?", file=self.link)
+        self.assertEqual(self.link.readline(), '-113,"Undefined header"\n')
+
+    def testLatency(self):
+        self.connect("keysight", simulator.Latency(query=0.05, overrides={r":RUN": 0.2}))
+        start = time.monotonic()
+        print("*OPC?", file=self.link)
+        self.link.readline()
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+        self.assertEqual(self.scope.latency.delay(":RUN"), 0.2)
+        self.assertEqual(self.scope.latency.delay(":STOP"), 0.)
+
+    def testPty(self):
+        self.scope = simulator.SimulatedScope("rigol")
+        self.simulator = simulator.Simulator(self.scope)
+        self.addCleanup(self.simulator.close)
+        path = self.simulator.pty()
+        for attempt in range(2):
+            dev, ident = instruments.openDevice(path, timeout=0.5)
+            dev.close()
+            self.assertEqual(ident, simulator.idents["rigol"])
@@ -0,0 +1,77 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import unittest
+
+from .. import keysight, rigol, slots
+from ..dispatch import intent_handlers
+
+class SlotsTest(unittest.TestCase):
+    def makeSnipsPayload(self, **kwargs):
+        return {
+            "intent": {"intentName": "none"},
+            "slots": [
+                {"slotName": key, "value": {"value": value}}
+                for key, value in kwargs.items()
+            ],
+        }
+
+    def testZoomSlots(self):
+        extract = slots.compileSlots("increaseTimebase", {})
+        self.assertEqual(extract(self.makeSnipsPayload()), {"steps": 1, "factor": None})
+        self.assertEqual(extract(self.makeSnipsPayload(steps="3")), {"steps": 3, "factor": None})
+        self.assertEqual(extract(self.makeSnipsPayload(factor=10)), {"steps": 1, "factor": 10.})
+        with self.assertRaises(slots.SlotError):
+            extract(self.makeSnipsPayload(steps=0))
+        with self.assertRaises(slots.SlotError):
+            extract(self.makeSnipsPayload(factor=0))
+        extract = slots.compileSlots("increaseVerticalScale", {})
+        self.assertEqual(extract(self.makeSnipsPayload(channel=2, steps=3)),
+                         {"channel": 2, "steps": 3, "factor": None})
+        with self.assertRaises(slots.SlotError):
+            extract(self.makeSnipsPayload(steps=3))
+
+    def testTables(self):
+        payload = self.makeSnipsPayload(source="channel two", type="peak to peak")
+        self.assertEqual(keysight.onMeasure.extract(payload), {
+            "source": "CHANNEL2", "spoken_source": "channel two",
+            "subcommand": "VPP", "measurement": "peak to peak"})
+        payload = self.makeSnipsPayload(reference="left")
+        self.assertEqual(keysight.onSetTimebaseReference.extract(payload), {"reference": "LEFT"})
+        self.assertEqual(rigol.onSetTimebaseReference.extract(payload), {"reference": 4})
+
+    def testOptionalSlots(self):
+        extract = keysight.onSetTriggerLevel.extract
+        self.assertEqual(extract(self.makeSnipsPayload(level="1.5")),
+                         {"source": None, "level": 1.5, "units": None})
+        self.assertEqual(extract(self.makeSnipsPayload(level=200, units="millivolts")),
+                         {"source": None, "level": 200., "units": ("voltage", 1e-3)})
+
+    def testBadPayloads(self):
+        extract = keysight.onSetTriggerSlope.extract
+        with self.assertRaisesRegex(slots.SlotError, "Expected slot slope"):
+            extract(self.makeSnipsPayload())
+        with self.assertRaisesRegex(slots.SlotError, "Can't use 'sideways' as slope"):
+            extract(self.makeSnipsPayload(slope="sideways"))
+        with self.assertRaisesRegex(slots.SlotError, "Unexpected slot source"):
+            extract(self.makeSnipsPayload(slope="positive", source="channel one"))
+
+    def testEveryHandlerHasASchema(self):
+        self.assertEqual(set(intent_handlers), set(slots.intent_slots))
+        for scope in (keysight, rigol):
+            for handler in intent_handlers.values():
+                self.assertTrue(hasattr(getattr(scope, handler), "extract"), handler)
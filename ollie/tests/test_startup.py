@@ -0,0 +1,38 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import subprocess
+import sys
+import unittest
+
+
+class StartupTest(unittest.TestCase):
+    def testImportIsLazy(self):
+        # Importing the entry point must not load paho, the vendor modules
+        # or the LED driver; they are only needed once ollie is running.
+        script = (
+            "import sys\n"
+            "import ollie.__main__\n"
+            "from ollie.pixels import pixels\n"
+            "loaded = [name for name in ('paho', 'spidev', 'ollie.pixels.apa102',"
+            " 'ollie.keysight', 'ollie.rigol') if name in sys.modules]\n"
+            "assert not loaded, loaded\n"
+            "assert pixels._pixels is None\n")
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        subprocess.check_call([sys.executable, "-c", script], cwd=root)
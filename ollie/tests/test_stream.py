@@ -0,0 +1,133 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import json
+import threading
+import time
+import unittest
+import unittest.mock
+
+from .. import keysight
+from .. import link
+from .. import measure
+from .. import rigol
+from .. import stream
+from .. import worker
+
+class MeasurementStreamTest(unittest.TestCase):
+    def setUp(self):
+        self.client = unittest.mock.Mock()
+        self.device = unittest.mock.Mock()
+        measure.cache.values.clear()
+        self.addCleanup(measure.cache.values.clear)
+
+    def makeStream(self, scope, compound, measurements):
+        self.link = link.Link(self.device, scope.__name__, compound=compound)
+        return stream.MeasurementStream(self.client, self.link, scope, measurements,
+                                        "ollie/measurements/MY1", 1)
+
+    def published(self):
+        return [json.loads(call[1]['payload']) for call in self.client.publish.call_args_list]
+
+    def testCompoundSample(self):
+        s = self.makeStream(keysight, True, [
+            ("channel one", "frequency"), ("channel two", "peak to peak")])
+        self.device.readline.side_effect = ["+1.0E+03;+9.9E+37\n", "+1.0E+03;+2.5E-01\n"]
+        s.run(busy=lambda: False)
+        s.run(busy=lambda: False)
+        self.device.write.assert_called_with(
+            ":MEASURE:FREQUENCY? CHANNEL1;:MEASURE:VPP? CHANNEL2\n")
+        self.assertEqual(self.device.write.call_count, 2)
+        first, second = self.published()
+        self.assertEqual(first['seq'], 1)
+        self.assertEqual(second['seq'], 2)
+        self.assertIn('t', first)
+        self.assertEqual(first['values'], {
+            "channel one:frequency": 1000.0, "channel two:peak to peak": None})
+        self.assertEqual(second['values']["channel two:peak to peak"], 0.25)
+        self.assertEqual(self.client.publish.call_args[0][0], "ollie/measurements/MY1")
+        self.assertEqual(measure.cache.get((self.link, "CHANNEL1", "FREQUENCY")), 1000.0)
+
+    def testInterruptedBetweenRoundTrips(self):
+        s = self.makeStream(rigol, False, [
+            ("channel one", "frequency"), ("channel two", "period")])
+        self.device.readline.side_effect = ["1.0e+03\n"]
+        busy = iter([False, True])
+        self.assertIsNone(s.run(busy=lambda: next(busy)))
+        self.assertEqual(self.device.write.call_count, 1)
+        self.client.publish.assert_not_called()
+
+    def testUnsupportedMeasurementSkipped(self):
+        with self.assertLogs("ollie.stream", "WARNING"):
+            s = self.makeStream(keysight, True, [
+                ("channel nine", "frequency"), ("channel one", "frequency")])
+        self.assertEqual(s.names, ["channel one:frequency"])
+        self.assertEqual(s.measurements, [("CHANNEL1", "FREQUENCY")])
+
+    def testAdaptiveInterval(self):
+        s = self.makeStream(keysight, True, [("channel one", "frequency")])
+        s.touch()
+        s.touch()
+        self.assertEqual(s.interval, 4)
+        self.assertGreater(s.timeout(), 3)
+        self.device.readline.return_value = "+1.0E+03\n"
+        s.run(busy=lambda: False)
+        self.assertEqual(s.interval, 2)
+        s.run(busy=lambda: False)
+        s.run(busy=lambda: False)
+        self.assertEqual(s.interval, 1)
+        # A scope slower to answer is polled less often
+        def slowQuery(device, measurements):
+            time.sleep(0.02)
+            return [1000.]
+        s.scope = unittest.mock.Mock(queryMeasurements=slowQuery)
+        s.IDLE_RATIO = 100
+        s.run(busy=lambda: False)
+        self.assertGreaterEqual(s.interval, 2)
+
+    def testWorkerStreamsWhenIdle(self):
+        s = self.makeStream(keysight, True, [("channel one", "frequency")])
+        sampled = threading.Event()
+        self.client.publish.side_effect = lambda *args, **kwargs: sampled.set()
+        self.device.readline.return_value = "+1.0E+03\n"
+        scope = unittest.mock.Mock(wraps=keysight)
+        scope.__name__ = "ollie.keysight"
+        w = worker.DeviceWorker(self.client, scope, self.link, stream=s)
+        self.assertTrue(sampled.wait(1))
+        w.stop(timeout=1)
+
+    def testMeasureIntentShowsStreamedMeasurement(self):
+        for scope, compound, add in [
+                (keysight, True, ":MEASURE:FREQUENCY CHANNEL1"),
+                (rigol, False, ":MEASURE:ITEM FREQUENCY,CHANNEL1")]:
+            measure.cache.values.clear()
+            self.device.reset_mock()
+            s = self.makeStream(scope, compound, [("channel one", "frequency")])
+            self.device.readline.side_effect = ["+1.0E+03\n"]
+            s.run(busy=lambda: False)
+            payload = {"slots": [
+                {"slotName": "source", "value": {"value": "channel one"}},
+                {"slotName": "type", "value": {"value": "frequency"}},
+            ]}
+            self.link.begin()
+            scope.onMeasure(self.client, self.link, payload)
+            self.link.commit()
+            # Shown on screen, and spoken from the streamed value
+            self.device.write.assert_called_with(add + "\n")
+            self.assertEqual(self.device.readline.call_count, 1)
+            self.assertIn("1 kilohertz", self.client.publish.call_args[1]["payload"])
@@ -0,0 +1,83 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import threading
+import unittest
+import unittest.mock
+
+from .. import link
+from .. import shadow
+from .. import sync
+from .. import worker
+
+class StateSyncTest(unittest.TestCase):
+    def setUp(self):
+        self.device = unittest.mock.Mock()
+        self.link = link.Link(self.device, "keysight")
+
+    def testRefreshDetectsChanges(self):
+        print(":TIMEBASE:SCALE 0.001", file=self.link)
+        print(":CHANNEL1:SCALE 0.5", file=self.link)
+        self.device.readline.side_effect = ["+1.00000E-03\n", "+2.00000E-01\n"]
+        s = sync.StateSync(self.link, 1, "keysight")
+        with self.assertLogs("ollie.sync", "INFO"):
+            changed = s.refresh(busy=lambda: False)
+        self.assertEqual(changed, [":CHANNEL1:SCALE"])
+        self.device.write.assert_has_calls([
+            unittest.mock.call(":TIMEBASE:SCALE?\n"),
+            unittest.mock.call(":CHANNEL1:SCALE?\n"),
+        ])
+        self.assertEqual(self.link.shadow.get(":CHANNEL1:SCALE"), "+2.00000E-01")
+
+    def testRefreshAfterIdle(self):
+        # The shadow's entries have expired by the time sync runs
+        now = [0.]
+        self.link.shadow = shadow.Shadow(clock=lambda: now[0])
+        print(":CHANNEL1:SCALE 0.5", file=self.link)
+        now[0] = 10 * shadow.Shadow.MAX_AGE
+        self.device.readline.side_effect = ["+1.00000E-03\n", "+2.00000E-01\n"]
+        s = sync.StateSync(self.link, 60, "keysight")
+        with self.assertLogs("ollie.sync", "INFO"):
+            self.assertEqual(s.refresh(busy=lambda: False), [":CHANNEL1:SCALE"])
+        # Refreshed values are used until the next sync is due
+        now[0] += 59
+        self.assertEqual(self.link.shadow.get(":CHANNEL1:SCALE"), "+2.00000E-01")
+        now[0] += 2
+        self.assertIsNone(self.link.shadow.get(":CHANNEL1:SCALE"))
+
+    def testRefreshYields(self):
+        print(":CHANNEL1:SCALE 0.5", file=self.link)
+        self.device.readline.side_effect = ["+1.00000E-03\n"]
+        busy = iter([False, True])
+        s = sync.StateSync(self.link, 1, "keysight")
+        s.refresh(busy=lambda: next(busy))
+        self.assertEqual(self.device.readline.call_count, 1)
+        self.assertEqual(self.link.shadow.get(":CHANNEL1:SCALE"), "0.5")
+
+    def testWorkerSyncsWhenIdle(self):
+        scope = unittest.mock.Mock()
+        scope.__name__ = "ollie.keysight"
+        refreshed = threading.Event()
+        def readline():
+            refreshed.set()
+            return "+1.00000E-03\n"
+        self.device.readline.side_effect = readline
+        w = worker.DeviceWorker(unittest.mock.Mock(), scope, self.link, sync_interval=0.01)
+        self.assertTrue(refreshed.wait(1))
+        w.stop(timeout=1)
+        self.assertEqual(self.link.shadow.get(":TIMEBASE:SCALE"), "+1.00000E-03")
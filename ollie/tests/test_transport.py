@@ -0,0 +1,124 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import socket
+import struct
+import unittest
+import unittest.mock
+
+from .. import transport
+
+class TransportTest(unittest.TestCase):
+    def setUp(self):
+        # A socket pair stands in for the device node: one fd, read and write
+        ours, theirs = socket.socketpair()
+        self.scope = theirs
+        self.transport = transport.Transport(ours.detach(), timeout=0.05)
+
+    def tearDown(self):
+        self.transport.close()
+        self.scope.close()
+
+    def testWrite(self):
+        print(":TIMEBASE:SCALE 0.001", file=self.transport)
+        self.assertEqual(self.scope.recv(100), b":TIMEBASE:SCALE 0.001\n")
+
+    def testReadline(self):
+        self.scope.sendall(b"+1.0E-03\n+2.0E+00\n")
+        self.assertEqual(self.transport.readline(), "+1.0E-03\n")
+        self.assertEqual(self.transport.readline(), "+2.0E+00\n")
+
+    def testLongLine(self):
+        self.transport.buffer = bytearray(8)
+        self.scope.sendall(b"KEYSIGHT TECHNOLOGIES,DSO-X 3024T,MY12345678,07.20\n")
+        self.assertEqual(self.transport.readline(),
+                         "KEYSIGHT TECHNOLOGIES,DSO-X 3024T,MY12345678,07.20\n")
+
+    def testEndOfFile(self):
+        self.scope.sendall(b"1")
+        self.scope.shutdown(socket.SHUT_WR)
+        self.assertEqual(self.transport.readline(), "1")
+        self.assertEqual(self.transport.readline(), "")
+
+    def testReadinto(self):
+        # Part of the data arrives with the line before it and is already
+        # in the transport's buffer
+        self.scope.sendall(b"4000\n\x00\x01\x02\x03")
+        self.assertEqual(self.transport.readline(), "4000\n")
+        self.scope.sendall(b"\x00\x01\x02\x03" * 999 + b"\n")
+        buffer = bytearray(4000)
+        self.assertEqual(self.transport.readinto(buffer), 4000)
+        self.assertEqual(bytes(buffer), b"\x00\x01\x02\x03" * 1000)
+        self.assertEqual(self.transport.readline(), "\n")
+
+    def testTimeout(self):
+        with self.assertRaises(transport.DeviceTimeout):
+            self.transport.readline()
+        # A partial answer doesn't extend the deadline
+        self.scope.sendall(b"+1.0")
+        with self.assertRaises(transport.DeviceTimeout):
+            self.transport.readline()
+
+    def testClear(self):
+        self.scope.sendall(b"late answer\n")
+        self.transport.clear()
+        self.scope.sendall(b"+1.0E+00\n")
+        self.assertEqual(self.transport.readline(), "+1.0E+00\n")
+
+    def testDriverTimeout(self):
+        # usbtmc never reports a response as readable; once the driver
+        # takes the timeout, reads must not wait for poll()
+        self.assertTrue(self.transport.polled)
+        with unittest.mock.patch.object(transport.fcntl, "ioctl"):
+            self.transport.setTimeout(0.05)
+        self.assertFalse(self.transport.polled)
+        self.transport.poller = unittest.mock.Mock()
+        self.transport.poller.poll.return_value = []
+        self.scope.sendall(b"+1.0E+00\n")
+        self.assertEqual(self.transport.readline(), "+1.0E+00\n")
+
+    def testDriverTimeoutForTransfer(self):
+        # A slow transfer on a usbtmc node raises the driver's timeout for
+        # as long as it lasts
+        with unittest.mock.patch.object(transport.fcntl, "ioctl") as ioctl:
+            self.transport.setTimeout(2.)
+            self.assertFalse(self.transport.polled)
+            ioctl.reset_mock()
+            self.scope.sendall(b"\x01\x02\x03\x04")
+            buffer = bytearray(4)
+            self.assertEqual(self.transport.readinto(buffer, timeout=10.), 4)
+            self.assertEqual(ioctl.call_args_list, [
+                unittest.mock.call(self.transport.fileno(), transport.USBTMC_IOCTL_SET_TIMEOUT,
+                                   struct.pack("I", 10000)),
+                unittest.mock.call(self.transport.fileno(), transport.USBTMC_IOCTL_SET_TIMEOUT,
+                                   struct.pack("I", 2000)),
+            ])
+
+            # Restored even if the transfer fails
+            ioctl.reset_mock()
+            with unittest.mock.patch.object(self.transport, "readchunk",
+                                            side_effect=transport.DeviceTimeout()):
+                with self.assertRaises(transport.DeviceTimeout):
+                    self.transport.readinto(bytearray(4), timeout=10.)
+            self.assertEqual(ioctl.call_args_list[-1][0][2], struct.pack("I", 2000))
+
+            # Without a timeout of its own, a read keeps the usual one
+            ioctl.reset_mock()
+            self.scope.sendall(b"\x01")
+            self.transport.readinto(bytearray(1))
+            ioctl.assert_not_called()
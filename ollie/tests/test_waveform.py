@@ -0,0 +1,105 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import json
+import socket
+import unittest
+import unittest.mock
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .. import keysight
+from .. import link
+from .. import rigol
+from .. import transport
+from .. import waveform
+
+PREAMBLE = b"+0,+0,+4,+1,+1.0E-06,-2.0E-06,+0,+1.0E-02,+5.0E-01,+128\n"
+
+class WaveformTest(unittest.TestCase):
+    def setUp(self):
+        ours, theirs = socket.socketpair()
+        self.scope = theirs
+        self.link = link.Link(transport.Transport(ours.detach(), timeout=0.5), "keysight")
+
+    def tearDown(self):
+        self.link.close()
+        self.scope.close()
+
+    def testParsePreamble(self):
+        preamble = waveform.parsePreamble(PREAMBLE.decode())
+        self.assertEqual(preamble.points, 4)
+        self.assertEqual(preamble.xorigin, -2e-6)
+        self.assertEqual(preamble.yreference, 128.)
+        with self.assertRaises(RuntimeError):
+            waveform.parsePreamble("1,2,3\n")
+
+    def testReadBlock(self):
+        print(":WAVEFORM:DATA?", file=self.link)
+        self.scope.sendall(b"#210" + bytes(range(10)) + b"\n+1\n")
+        data = waveform.readBlock(self.link)
+        self.assertEqual(bytes(data), bytes(range(10)))
+        # The terminator was consumed, and the buffer is kept for next time
+        print("*OPC?", file=self.link)
+        self.assertEqual(self.link.readline(), "+1\n")
+        self.assertGreaterEqual(len(self.link.buffer), 10)
+
+    def testBadBlock(self):
+        self.scope.sendall(b"+1.0E+00\n")
+        with self.assertRaises(RuntimeError):
+            waveform.readBlock(self.link)
+
+    def testWaveformSource(self):
+        self.assertEqual(waveform.waveformSource(keysight.waveform_sources, "function"), "FUNCTION")
+        self.assertEqual(waveform.waveformSource(keysight.waveform_sources, "WMEMORY1"), "WMEMORY1")
+        self.assertEqual(waveform.waveformSource(rigol.waveform_sources, "function"), "MATH")
+        with self.assertRaises(RuntimeError):
+            waveform.waveformSource(keysight.waveform_sources, "digital one")
+
+    @unittest.skipIf(numpy is None, "needs NumPy")
+    def testCaptureWaveform(self):
+        self.scope.sendall(PREAMBLE + b"#14" + bytes([128, 138, 118, 228]) + b"\n")
+        capture = keysight.captureWaveform(None, self.link, "channel one")
+        self.assertEqual(capture.source, "CHANNEL1")
+        numpy.testing.assert_allclose(capture.values, [0.5, 0.6, 0.4, 1.5])
+        numpy.testing.assert_allclose(capture.times(), [-2e-6, -1e-6, 0, 1e-6])
+
+    def testPublishWaveform(self):
+        client = unittest.mock.Mock()
+        preamble = waveform.parsePreamble(PREAMBLE.decode())
+        capture = unittest.mock.Mock(
+            return_value=waveform.Waveform("CHANNEL1", preamble, [0.5, 0.6, 0.4, 1.5]))
+        waveform.publishWaveform(client, "ollie/waveform/MY1", capture, self.link,
+                                 {"source": "channel one", "id": 7})
+        capture.assert_called_once_with(client, self.link, "channel one")
+        topic, = client.publish.call_args[0]
+        reply = json.loads(client.publish.call_args[1]["payload"])
+        self.assertEqual(topic, "ollie/waveform/MY1")
+        self.assertEqual((reply["id"], reply["source"]), (7, "CHANNEL1"))
+        self.assertEqual((reply["x0"], reply["dx"]), (-2e-6, 1e-6))
+        self.assertEqual(reply["values"], [0.5, 0.6, 0.4, 1.5])
+
+        capture.side_effect = RuntimeError("Can't capture a waveform from D0")
+        with self.assertRaises(RuntimeError):
+            waveform.publishWaveform(client, "ollie/waveform/MY1", capture, self.link,
+                                     {"source": "digital zero"})
+        reply = json.loads(client.publish.call_args[1]["payload"])
+        self.assertEqual(reply, {"id": None, "error": "Can't capture a waveform from D0"})
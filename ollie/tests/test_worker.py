@@ -0,0 +1,115 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import threading
+import unittest
+import unittest.mock
+
+from .. import transport
+from .. import worker
+
+class DeviceWorkerTest(unittest.TestCase):
+    def setUp(self):
+        self.client = unittest.mock.Mock()
+        self.scope = unittest.mock.Mock()
+        self.scope.__name__ = "ollie.keysight"
+        self.device = unittest.mock.Mock()
+
+    def makeSnipsPayload(self, intent="none"):
+        return {
+            "intent": {
+                "intentName": intent,
+            },
+            "slots": [],
+        }
+
+    def testRunsOffThread(self):
+        threads = []
+        done = threading.Event()
+        def handler(client, device, payload):
+            threads.append(threading.current_thread())
+            self.assertIs(client, self.client)
+            self.assertIs(device, self.device)
+            done.set()
+
+        w = worker.DeviceWorker(self.client, self.scope, self.device)
+        w.submit(handler, self.makeSnipsPayload())
+        self.assertTrue(done.wait(1))
+        self.assertIsNot(threads[0], threading.current_thread())
+        w.stop(timeout=1)
+
+    def testHandlerErrorKeepsRunning(self):
+        done = threading.Event()
+        def fail(client, device, payload):
+            raise RuntimeError("Operation not supported")
+
+        w = worker.DeviceWorker(self.client, self.scope, self.device)
+        with self.assertLogs("ollie.worker", "ERROR"):
+            w.submit(fail, self.makeSnipsPayload())
+            w.submit(lambda *args: done.set(), self.makeSnipsPayload())
+            self.assertTrue(done.wait(1))
+        w.stop(timeout=1)
+
+    def testTimeoutKeepsRunning(self):
+        done = threading.Event()
+        def timeout(client, device, payload):
+            raise transport.DeviceTimeout(110, "No response")
+
+        w = worker.DeviceWorker(self.client, self.scope, self.device)
+        with self.assertLogs("ollie.worker", "WARNING"):
+            w.submit(timeout, self.makeSnipsPayload())
+            w.submit(lambda *args: done.set(), self.makeSnipsPayload())
+            self.assertTrue(done.wait(1))
+        w.stop(timeout=1)
+
+    def testCoalescedZoom(self):
+        release = threading.Event()
+        started = threading.Event()
+        def block(client, device, payload):
+            started.set()
+            release.wait(1)
+        def onIncreaseTimebase(client, device, payload):
+            self.fail("zoom intents should run through stepTimebase")
+
+        done = threading.Event()
+        self.scope.stepTimebase.side_effect = lambda *args: done.set()
+        w = worker.DeviceWorker(self.client, self.scope, self.device)
+        w.submit(block, self.makeSnipsPayload())
+        self.assertTrue(started.wait(1))
+        for _ in range(3):
+            w.submit(onIncreaseTimebase, self.makeSnipsPayload())
+        release.set()
+        self.assertTrue(done.wait(1))
+        self.scope.stepTimebase.assert_called_once_with(self.client, self.device, 3)
+        w.stop(timeout=1)
+
+    def testBusy(self):
+        release = threading.Event()
+        started = threading.Event()
+        def block(client, device, payload):
+            started.set()
+            release.wait(1)
+
+        w = worker.DeviceWorker(self.client, self.scope, self.device, maxsize=1)
+        w.submit(block, self.makeSnipsPayload())
+        self.assertTrue(started.wait(1))
+        w.submit(block, self.makeSnipsPayload())
+        with self.assertRaises(worker.DeviceBusy):
+            w.submit(block, self.makeSnipsPayload("runCapture"))
+        release.set()
+        w.stop(timeout=1)
@@ -0,0 +1,49 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import unittest
+
+from .. import zoom
+
+class ZoomTest(unittest.TestCase):
+    def setUp(self):
+        self.levels = zoom.ladder(1e-3, 1)
+
+    def testLadder(self):
+        self.assertEqual(self.levels, [
+            1e-3, 2e-3, 5e-3, 10e-3, 20e-3, 50e-3, 100e-3, 200e-3, 500e-3, 1])
+        self.assertEqual(zoom.ladder(2e-9, 5e-9), [2e-9, 5e-9])
+
+    def testZoomLevel(self):
+        self.assertEqual(zoom.zoomLevel(self.levels, 10e-3, 1), 20e-3)
+        self.assertEqual(zoom.zoomLevel(self.levels, 10e-3, 3), 100e-3)
+        self.assertEqual(zoom.zoomLevel(self.levels, 10e-3, -2), 2e-3)
+        # Between two levels, one step reaches the next level either way
+        self.assertEqual(zoom.zoomLevel(self.levels, 3e-3, 1), 5e-3)
+        self.assertEqual(zoom.zoomLevel(self.levels, 3e-3, -1), 2e-3)
+        # Stops at the ends, even from beyond them
+        self.assertEqual(zoom.zoomLevel(self.levels, 0.5, 10), 1)
+        self.assertEqual(zoom.zoomLevel(self.levels, 1e-6, -1), 1e-3)
+        self.assertEqual(zoom.zoomLevel(self.levels, 10, 1), 1)
+
+    def testSnapLevel(self):
+        self.assertEqual(zoom.snapLevel(self.levels, 3e-3), 2e-3)
+        self.assertEqual(zoom.snapLevel(self.levels, 4e-3), 5e-3)
+        self.assertEqual(zoom.snapLevel(self.levels, 20e-3), 20e-3)
+        self.assertEqual(zoom.snapLevel(self.levels, 1e-9), 1e-3)
+        self.assertEqual(zoom.snapLevel(self.levels, 1e3), 1)
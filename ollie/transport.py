@@ -0,0 +1,218 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import errno
+import fcntl
+import functools
+import io
+import os
+import select
+import struct
+import time
+
+# From linux/usb/tmc.h
+USBTMC_IOCTL_CLEAR = 0x5b02
+USBTMC_IOCTL_SET_TIMEOUT = 0x40045b0a
+
+
+class DeviceTimeout(TimeoutError):
+    """
+    The device did not answer or accept a message before the deadline.
+    """
+
+
+@functools.lru_cache(maxsize=512)
+def encode(command):
+    # Handlers send the same few commands over and over; keep them
+    # encoded rather than encoding every time.
+    return command.encode("ascii")
+
+
+class Transport:
+    """
+    Unbuffered byte-level access to a USBTMC device node.
+
+    Stands in for the line-buffered text file the device used to be
+    opened as: write() takes a complete command as text and sends it with
+    a single write(2), and readline() reads the response with readinto()
+    into a buffer that is reused for every read. readinto() hands large
+    responses such as waveforms and screenshots straight to the caller's
+    buffer.
+
+    Every read and write has to finish within `timeout` seconds or raises
+    DeviceTimeout, so a scope that never answers (e.g. a query it doesn't
+    support) can't hang the process. The usbtmc driver enforces the
+    timeout itself, and must not be polled: it only reports POLLIN for a
+    service request or an asynchronous read, never for a response to
+    read(2). poll() covers other file descriptors instead, such as the
+    simulator's pty.
+    """
+    BUFFER_SIZE = 4096
+    TIMEOUT = 2.
+
+    def __init__(self, fd, timeout=TIMEOUT):
+        self.file = io.FileIO(fd, "r+b", closefd=True)
+        self.buffer = bytearray(self.BUFFER_SIZE)
+        # Bytes read from the device but not yet returned
+        self.start = 0
+        self.end = 0
+        self.poller = select.poll()
+        self.poller.register(fd, select.POLLIN)
+        self.setTimeout(timeout)
+
+    @classmethod
+    def open(cls, path, timeout=TIMEOUT):
+        return cls(os.open(path, os.O_RDWR | os.O_CLOEXEC), timeout)
+
+    def setTimeout(self, timeout):
+        self.timeout = timeout
+        try:
+            self.setDriverTimeout(timeout)
+            self.polled = False
+        except OSError as e:
+            # ENOTTY: not a usbtmc device, so poll() it. A usbtmc driver
+            # before 4.19 rejects the ioctl with EBADRQC and keeps its
+            # default 5 s timeout.
+            self.polled = e.errno == errno.ENOTTY
+
+    def setDriverTimeout(self, timeout):
+        fcntl.ioctl(self.fileno(), USBTMC_IOCTL_SET_TIMEOUT,
+                    # The driver's minimum is 100 ms
+                    struct.pack("I", max(100, int(timeout * 1000))))
+
+    def deadline(self):
+        return time.monotonic() + self.timeout
+
+    def wait(self, deadline):
+        if not self.polled:
+            return  # the driver times the read out itself
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not self.poller.poll(remaining * 1000):
+            raise DeviceTimeout(errno.ETIMEDOUT, "No response within {timeout:g} s".format(
+                timeout=self.timeout))
+
+    def clear(self):
+        """
+        Discard any response still on its way, e.g. after a timeout, so
+        it isn't taken as the answer to the next query.
+        """
+        self.start = self.end = 0
+        try:
+            fcntl.ioctl(self.fileno(), USBTMC_IOCTL_CLEAR)
+            return
+        except OSError as e:
+            if e.errno != errno.ENOTTY:
+                raise
+        while self.poller.poll(0):
+            if not self.file.readinto(self.buffer):
+                break
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def write(self, s):
+        data = encode(s)
+        view = memoryview(data)
+        try:
+            while view:
+                view = view[self.file.write(view):]
+        except TimeoutError as e:
+            raise DeviceTimeout(errno.ETIMEDOUT, "Device did not accept {command!r}".format(
+                command=s.strip())) from e
+        return len(s)
+
+    def readchunk(self, view, deadline):
+        self.wait(deadline)
+        try:
+            return self.file.readinto(view) or 0
+        except TimeoutError as e:
+            raise DeviceTimeout(errno.ETIMEDOUT, "No response within {timeout:g} s".format(
+                timeout=self.timeout)) from e
+
+    def fill(self, deadline):
+        """
+        Read more of the response into the buffer; returns the number of
+        bytes read, 0 at end of file.
+        """
+        if self.start == self.end:
+            self.start = self.end = 0
+        elif self.end == len(self.buffer):
+            if self.start > 0:
+                self.buffer[:self.end - self.start] = self.buffer[self.start:self.end]
+                self.end -= self.start
+                self.start = 0
+            else:
+                self.buffer.extend(bytes(len(self.buffer)))
+        with memoryview(self.buffer) as view:
+            n = self.readchunk(view[self.end:], deadline)
+        self.end += n
+        return n
+
+    def readline(self):
+        deadline = self.deadline()
+        scanned = self.start
+        while True:
+            i = self.buffer.find(b"\n", scanned, self.end)
+            if i >= 0:
+                line = self.buffer[self.start:i + 1].decode("ascii", "replace")
+                self.start = i + 1
+                return line
+            # fill() may move the unread bytes to the start of the buffer
+            seen = self.end - self.start
+            if not self.fill(deadline):
+                line = self.buffer[self.start:self.end].decode("ascii", "replace")
+                self.start = self.end
+                return line
+            scanned = self.start + seen
+
+    def readinto(self, b, timeout=None):
+        """
+        Fill `b` completely from the device. Returns the number of bytes
+        read, less than len(b) only at end of file.
+
+        A transfer the scope is slow to start or finish, such as a
+        screenshot, can be given a `timeout` other than the usual one. A
+        polled device must finish the whole transfer within it. On a
+        usbtmc node the driver's timeout is set to it for the transfer,
+        and applies to each read(2).
+        """
+        driver = timeout is not None and not self.polled
+        if driver:
+            self.setDriverTimeout(timeout)
+        try:
+            with memoryview(b) as view:
+                view = view.cast("B")
+                n = min(len(view), self.end - self.start)
+                view[:n] = self.buffer[self.start:self.start + n]
+                self.start += n
+                deadline = time.monotonic() + (timeout or self.timeout)
+                while n < len(view):
+                    got = self.readchunk(view[n:], deadline)
+                    if not got:
+                        break
+                    n += got
+        finally:
+            if driver:
+                self.setDriverTimeout(self.timeout)
+        return n
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,143 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import collections
+import json
+import time
+
+# Publish {"source": "channel one"} here, with an optional "id" to match
+# the reply and a "scope" selector, to capture a waveform
+REQUEST_TOPIC = "ollie/waveform/request"
+# Captured waveforms for one instrument, named by serial number
+TOPIC = "ollie/waveform/{instrument}"
+
+# :WAVEFORM:PREAMBLE? fields, in order; the same on Keysight and Rigol
+Preamble = collections.namedtuple("Preamble", [
+    "format", "type", "points", "count",
+    "xincrement", "xorigin", "xreference",
+    "yincrement", "yorigin", "yreference",
+])
+
+
+class Waveform(collections.namedtuple("Waveform", ["source", "preamble", "values"])):
+    """
+    A captured waveform: `values` is a NumPy array in the source's
+    vertical units (volts or amps).
+    """
+    def times(self):
+        import numpy
+        p = self.preamble
+        return p.xorigin + (numpy.arange(len(self.values)) - p.xreference) * p.xincrement
+
+
+def parsePreamble(line):
+    fields = line.strip().split(",")
+    if len(fields) != len(Preamble._fields):
+        raise RuntimeError("Unexpected waveform preamble {line!r}".format(line=line))
+    return Preamble(*[int(float(field)) for field in fields[:4]],
+                    *[float(field) for field in fields[4:]])
+
+
+def readPreamble(device):
+    print(":WAVEFORM:PREAMBLE?", file=device)
+    return parsePreamble(device.readline())
+
+
+def readExactly(device, b, timeout=None):
+    if device.readinto(b, timeout) != len(b):
+        raise RuntimeError("Response ended in the middle of a block")
+
+
+def readBlockLength(device, timeout=None):
+    """
+    Read the header of an IEEE 488.2 definite length block,
+    #<n><length><data>, and return the length of the data that follows.
+    """
+    header = bytearray(2)
+    readExactly(device, header, timeout)
+    if header[0] != ord("#") or not ord("1") <= header[1] <= ord("9"):
+        raise RuntimeError("Expected a definite length block, got {header!r}".format(
+            header=bytes(header)))
+    digits = bytearray(header[1] - ord("0"))
+    readExactly(device, digits, timeout)
+    return int(digits)
+
+
+def readBlock(device, timeout=None):
+    """
+    Read an IEEE 488.2 definite length block into the device's reusable
+    buffer. Returns a memoryview of the data, which is only valid until
+    the next block is read.
+    """
+    length = readBlockLength(device, timeout)
+    buffer = device.buffer
+    if len(buffer) < length:
+        buffer.extend(bytes(length - len(buffer)))
+    data = memoryview(buffer)[:length]
+    readExactly(device, data, timeout)
+    # Followed by the message terminator
+    readExactly(device, bytearray(1), timeout)
+    return data
+
+
+def counts(data):
+    """
+    View BYTE format waveform data as an array of unsigned ADC counts,
+    without copying it.
+    """
+    try:
+        import numpy
+    except ImportError:
+        raise RuntimeError("Waveform capture needs NumPy")
+    return numpy.frombuffer(data, dtype=numpy.uint8)
+
+
+def waveformSource(sources, source):
+    """
+    Accept a spoken source name or the SCPI name of one of `sources`.
+    """
+    source = sources.get(source, source)
+    if source not in sources.values():
+        raise RuntimeError("Can't capture a waveform from {source}".format(source=source))
+    return source
+
+
+def publishWaveform(client, topic, capture, device, request):
+    """
+    Capture the waveform a request asks for with the vendor module's
+    `capture` function, and publish it on `topic` as JSON: the source,
+    the time of the first sample relative to the trigger and the time
+    between samples in seconds, and the values in volts (or amps). A
+    request that fails is answered with an error instead.
+    """
+    reply = {"id": request.get("id")}
+    try:
+        captured = capture(client, device, request["source"])
+    except Exception as e:
+        reply["error"] = str(e)
+        client.publish(topic, payload=json.dumps(reply))
+        raise
+    p = captured.preamble
+    reply.update(
+        source=captured.source,
+        t=time.time(),
+        x0=p.xorigin - p.xreference * p.xincrement,
+        dx=p.xincrement,
+        values=[float(value) for value in captured.values],
+    )
+    client.publish(topic, payload=json.dumps(reply, separators=(",", ":")))
@@ -0,0 +1,150 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+import queue
+import threading
+import time
+
+from .intentqueue import IntentQueue, Job
+from .metrics import metrics
+from .slots import SlotError
+from .sync import StateSync
+from .transport import DeviceTimeout
+
+log = logging.getLogger(__name__)
+
+
+class DeviceBusy(RuntimeError):
+    pass
+
+
+class DeviceWorker:
+    """
+    Runs intent handlers for one device on a dedicated thread.
+
+    Handlers block on instrument I/O, so they must not run on the paho
+    network thread: a slow or hung scope would stall keepalives and every
+    other topic. on_message only queues work here and returns.
+
+    Bursts of relative zoom intents are merged and duplicate sessions
+    dropped while they wait; see IntentQueue.
+
+    With a `sync_interval`, the scope settings are refreshed after that
+    many seconds without an intent; see StateSync. A `stream` is polled in
+    the same idle time; see MeasurementStream.
+    """
+    QUEUE_SIZE = 8
+
+    def __init__(self, client, scope, device, maxsize=QUEUE_SIZE, sync_interval=None,
+                 stream=None):
+        self.client = client
+        self.scope = scope
+        self.vendor = scope.__name__.rpartition(".")[2]
+        self.device = device
+        self.queue = IntentQueue(maxsize)
+        self.sync = None
+        if sync_interval:
+            self.sync = StateSync(device, sync_interval, self.vendor)
+        # Work done while no intent is waiting, in order of priority
+        self.idle = [task for task in (self.sync, stream) if task is not None]
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, handler, payload):
+        """
+        Queue a handler call without blocking. Returns False if the intent
+        duplicates one already seen. Raises DeviceBusy if the device is too
+        far behind to accept more work, and SlotError if the payload doesn't
+        match the intent's slots.
+        """
+        try:
+            job = Job(handler, payload)
+        except SlotError:
+            self.count(payload['intent']['intentName'].rpartition(":")[2], "invalid")
+            raise
+        try:
+            queued = self.queue.put_nowait(job)
+        except queue.Full:
+            self.count(job.name, "busy")
+            raise DeviceBusy(
+                "Device busy, dropping {intent}".format(
+                    intent=payload['intent']['intentName']))
+        if not queued:
+            self.count(job.name, "duplicate")
+        return queued
+
+    def observe(self, intent, stage, seconds):
+        metrics.observe("ollie_intent_stage_seconds",
+                        (("intent", intent), ("stage", stage), ("vendor", self.vendor)),
+                        seconds)
+
+    def count(self, intent, outcome):
+        metrics.increment("ollie_intents_total",
+                          (("intent", intent), ("outcome", outcome), ("vendor", self.vendor)))
+
+    def stop(self, timeout=None):
+        self.queue.close()
+        self.thread.join(timeout)
+
+    def _run(self):
+        while True:
+            try:
+                job = self.queue.get(
+                    min(task.timeout() for task in self.idle) if self.idle else None)
+            except queue.Empty:
+                self._idle()
+                continue
+            if job is None:
+                break
+            start = time.monotonic()
+            self.observe(job.name, "queue", start - job.queued)
+            self.device.setIntent(job.name)
+            try:
+                self.device.begin()
+                try:
+                    job.run(self.client, self.scope, self.device)
+                finally:
+                    self.device.commit()
+                outcome = "ok"
+            except DeviceTimeout as e:
+                log.warning("%s: %s", job.name, e)
+                outcome = "timeout"
+            except Exception:
+                log.exception("%s failed", job.name)
+                outcome = "error"
+            self.observe(job.name, "handler", time.monotonic() - start)
+            self.count(job.name, outcome)
+            for task in self.idle:
+                task.touch()
+
+    def _idle(self):
+        busy = lambda: len(self.queue) > 0
+        for task in self.idle:
+            if busy():
+                return
+            if task.timeout() > 0:
+                continue
+            try:
+                task.run(busy)
+            except OSError as e:
+                # The link is marked broken; the hotplug monitor reopens it
+                log.warning("%s failed: %s", type(task).__name__, e)
+            except Exception:
+                log.exception("%s failed", type(task).__name__)
@@ -0,0 +1,64 @@
+"""
+Copyright (c) 2019 James Wilson
+All rights reserved
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import bisect
+import math
+
+
+def ladder(low, high):
+    """
+    The 1-2-5 sequence of settings from `low` to `high` inclusive, as
+    stepped through by the scale knobs, e.g. 1 ms, 2 ms, 5 ms, 10 ms.
+    """
+    levels = []
+    for decade in range(math.floor(math.log10(low)), math.ceil(math.log10(high)) + 1):
+        for mantissa in (1, 2, 5):
+            # Parsed from text so that each level is exactly the float a
+            # literal like 20e-12 or a scope response would give
+            level = float("{m}e{e}".format(m=mantissa, e=decade))
+            if low <= level <= high:
+                levels.append(level)
+    return levels
+
+
+def zoomLevel(levels, current, steps):
+    """
+    Return the zoom level that is `steps` positions above (positive) or
+    below (negative) the current setting, stopping at the sentinel values
+    at either end of the list. A current setting between two levels
+    counts as one step away from each.
+    """
+    if steps > 0:
+        i = bisect.bisect_right(levels, current) + steps - 1
+    else:
+        i = bisect.bisect_left(levels, current) + steps
+    return levels[min(max(i, 0), len(levels) - 1)]
+
+
+def snapLevel(levels, value):
+    """
+    Return the level closest to `value` on a logarithmic scale, so a
+    spoken 3 ms or a 10x zoom lands on a setting the knob could reach.
+    """
+    i = bisect.bisect_left(levels, value)
+    if i == 0:
+        return levels[0]
+    if i == len(levels):
+        return levels[-1]
+    below, above = levels[i - 1], levels[i]
+    return below if value * value < below * above else above
@@ -5,7 +5,7 @@ with open("README.md", "r") as fd:
 
 setuptools.setup(
     name="ollie-assistant",
-    packages=setuptools.find_packages(),
+    packages=setuptools.find_packages(exclude=["benchmarks", "benchmarks.*"]),
     description="A Snips-based voice assistant for oscilloscopes",
     long_description=long_description,
     long_description_content_type="text/markdown",
@@ -14,6 +14,14 @@ setuptools.setup(
         "paho-mqtt",
         "spidev",
     ],
+    extras_require={
+        # Waveform capture returns NumPy arrays
+        "waveform": ["numpy"],
+        # Screenshot thumbnails
+        "screenshot": ["Pillow"],
+        # Faster decoding of intent payloads
+        "json": ["orjson"],
+    },
     entry_points={
         "console_scripts": ["ollie = ollie.__main__:main"],
     },